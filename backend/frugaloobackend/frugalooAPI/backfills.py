@@ -0,0 +1,95 @@
+"""
+Backfills of the rows the migrations derive from older data, for re-running
+after a deploy: rows written by the previous release between a migration and
+the deploy, with trip_info still null, are missed by the migration's backfill.
+
+Every function can be run again safely.
+"""
+
+import uuid
+
+from django.db import transaction
+
+from .models import TripProgress, UserTripInfo, UserTripProgressInfo
+
+
+def link_trip_info(model, batch_size=1000):
+    """
+    Sets trip_info from the string trip_id on the rows of model (a
+    UserTripProgressInfo or FinanceLog) that have none, in batches, one
+    transaction per batch. Rows whose trip_id is not a UUID of an existing
+    trip are left with a null trip_info.
+
+    Returns:
+    - Set of the trip_ids whose rows were linked
+    """
+    linked = set()
+    last_id = 0
+    while True:
+        batch = list(
+            model.objects.filter(id__gt=last_id, trip_info__isnull=True)
+            .order_by("id")
+            .values_list("id", "trip_id")[:batch_size]
+        )
+        if not batch:
+            return linked
+        last_id = batch[-1][0]
+
+        ids_by_trip = {}
+        for row_id, trip_id in batch:
+            try:
+                ids_by_trip.setdefault(uuid.UUID(trip_id), []).append(row_id)
+            except (TypeError, ValueError):
+                continue
+        existing = UserTripInfo.objects.filter(trip_id__in=ids_by_trip).values_list(
+            "trip_id", flat=True
+        )
+
+        with transaction.atomic():
+            for trip_id in existing:
+                model.objects.filter(id__in=ids_by_trip[trip_id]).update(
+                    trip_info_id=trip_id
+                )
+                linked.add(trip_id)
+
+
+def rebuild_progress(trip_ids=None, batch_size=1000):
+    """
+    Recomputes TripProgress from the UserTripProgressInfo history, for every
+    trip or only those of trip_ids.
+
+    Returns:
+    - Number of TripProgress rows written
+    """
+    history = UserTripProgressInfo.objects.filter(
+        trip_info__isnull=False, day__isnull=False
+    )
+    current = TripProgress.objects.all()
+    if trip_ids is not None:
+        history = history.filter(trip_info_id__in=trip_ids)
+        current = current.filter(trip_info_id__in=trip_ids)
+
+    # (trip, user) -> [completed days in order, last completed day]
+    progress = {}
+    rows = history.order_by("id").values_list("trip_info_id", "user_id", "day")
+    for trip_id, user_id, day in rows.iterator(chunk_size=batch_size):
+        state = progress.setdefault((trip_id, user_id), [[], None])
+        if day not in state[0]:
+            state[0].append(day)
+        state[1] = day
+
+    with transaction.atomic():
+        current.delete()
+        created = TripProgress.objects.bulk_create(
+            (
+                TripProgress(
+                    trip_info_id=trip_id,
+                    user_id=user_id,
+                    completed_days=completed_days,
+                    last_completed_day=last_day,
+                )
+                for (trip_id, user_id), (completed_days, last_day) in progress.items()
+            ),
+            batch_size=batch_size,
+        )
+    return len(created)
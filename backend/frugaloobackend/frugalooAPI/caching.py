@@ -0,0 +1,390 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = metrics.Counter(
+    "frugaloo_cache_requests_total",
+    "Cache lookups by namespace, tier (local, shared) and result "
+    "(hit, miss, or coalesced when another request loaded the value).",
+)
+CACHE_ERRORS = metrics.Counter(
+    "frugaloo_cache_errors_total",
+    "Shared tier operations that failed and were treated as a miss, by "
+    "namespace and operation.",
+)
+
+# Every namespace created in this process, by name
+NAMESPACES = {}
+
+# How long the request that loads a missing value holds its lock, and how long
+# other requests for the same key wait for it before loading it themselves
+LOCK_TTL = 10
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+
+# How long after a delete a loaded value is not cached, since it may have been
+# read from the database before the write that caused the delete
+INVALIDATED_TTL = 10
+
+# Returned by the tiers for a key that is not cached, since None can be cached
+MISSING = object()
+
+
+def _hit_ratios():
+    ratios = []
+    for name in NAMESPACES:
+        hits = sum(
+            CACHE_REQUESTS.value(namespace=name, tier=tier, result=result)
+            for tier in ("local", "shared")
+            for result in ("hit", "coalesced")
+        )
+        misses = CACHE_REQUESTS.value(namespace=name, tier="shared", result="miss")
+        if hits + misses:
+            ratios.append(({"namespace": name}, hits / (hits + misses)))
+    return ratios
+
+
+CACHE_HIT_RATIO = metrics.Gauge(
+    "frugaloo_cache_hit_ratio",
+    "Share of cache lookups answered by either tier, by namespace.",
+    callback=_hit_ratios,
+)
+CACHE_LOCAL_ENTRIES = metrics.Gauge(
+    "frugaloo_cache_local_entries",
+    "Entries held in the in-process tier, by namespace.",
+    callback=lambda: [
+        ({"namespace": name}, len(namespace.local))
+        for name, namespace in NAMESPACES.items()
+    ],
+)
+
+
+class LocalLRU:
+    """
+    Thread-safe in-process LRU with per-entry expiry.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Namespace:
+    """
+    A group of cached values sharing a TTL, kept in two tiers:
+
+    - local: an LRU inside the worker process, checked first. Other workers
+      never see its invalidations, so keep local_ttl short, or 0 for values
+      that change in place.
+    - shared: the Django cache named by alias (Redis, or a per-process
+      LocMemCache without REDIS_URL), shared by every worker.
+
+    Errors of the shared tier, such as Redis being down, are logged and
+    treated as a miss, so requests fall back to loading the value.
+    Namespaces created with needs_shared_tier are bypassed entirely when the
+    shared tier is per-process, since other workers would never see their
+    invalidations.
+
+    Keys are built from any parts that repr() stably and include the
+    namespace's version, so bumping the version when the cached format
+    changes orphans every old entry at once. TTLs can be overridden per
+    namespace with settings.CACHE_TTLS.
+
+    Usage:
+
+        PLACES = Namespace("places", ttl=86400, local_ttl=300)
+        data = await PLACES.aget_or_set(("textsearch", query), fetch)
+    """
+
+    def __init__(
+        self,
+        name,
+        ttl,
+        local_ttl=0,
+        max_local_entries=1000,
+        version=1,
+        alias="default",
+        needs_shared_tier=False,
+    ):
+        self.name = name
+        self.default_ttl = ttl
+        self.local_ttl = local_ttl
+        self.needs_shared_tier = needs_shared_tier
+        self.version = version
+        self.alias = alias
+        self.local = LocalLRU(max_local_entries)
+        NAMESPACES[name] = self
+
+    @property
+    def ttl(self):
+        return getattr(settings, "CACHE_TTLS", {}).get(self.name, self.default_ttl)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        return not self.needs_shared_tier or not isinstance(
+            self.shared, (LocMemCache, DummyCache)
+        )
+
+    def _shared_call(self, operation, *args, default=None):
+        try:
+            return getattr(self.shared, operation)(*args)
+        except Exception:
+            logger.warning(
+                "Cache %s failed for namespace %s", operation, self.name, exc_info=True
+            )
+            CACHE_ERRORS.inc(namespace=self.name, operation=operation)
+            return default
+
+    async def _ashared_call(self, operation, *args, default=None):
+        try:
+            return await getattr(self.shared, f"a{operation}")(*args)
+        except Exception:
+            logger.warning(
+                "Cache %s failed for namespace %s", operation, self.name, exc_info=True
+            )
+            CACHE_ERRORS.inc(namespace=self.name, operation=operation)
+            return default
+
+    def key(self, parts):
+        digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return f"{self.name}:v{self.version}:{digest}"
+
+    def _record(self, tier, result):
+        CACHE_REQUESTS.inc(namespace=self.name, tier=tier, result=result)
+
+    def _local_get(self, key):
+        if not self.local_ttl:
+            return MISSING
+        value = self.local.get(key)
+        if value is not MISSING:
+            self._record("local", "hit")
+        return value
+
+    def _local_set(self, key, value):
+        if self.local_ttl:
+            self.local.set(key, value, min(self.local_ttl, self.ttl))
+
+    def _shared_hit(self, key, value, result="hit"):
+        self._record("shared", result)
+        self._local_set(key, value)
+        return value
+
+    def _lookup(self, key):
+        # Hits are recorded here, misses by the caller, so a request that ends
+        # up waiting for another one's value is not also counted as a miss
+        value = self._local_get(key)
+        if value is MISSING:
+            value = self._shared_call("get", key, MISSING, default=MISSING)
+            if value is not MISSING:
+                self._shared_hit(key, value)
+        return value
+
+    async def _alookup(self, key):
+        value = self._local_get(key)
+        if value is MISSING:
+            value = await self._ashared_call("get", key, MISSING, default=MISSING)
+            if value is not MISSING:
+                self._shared_hit(key, value)
+        return value
+
+    def get(self, parts):
+        """
+        Returns:
+        - The cached value, or MISSING
+        """
+        if not self.enabled:
+            return MISSING
+        value = self._lookup(self.key(parts))
+        if value is MISSING:
+            self._record("shared", "miss")
+        return value
+
+    def set(self, parts, value):
+        if not self.enabled:
+            return
+        key = self.key(parts)
+        self._shared_call("set", key, value, self.ttl)
+        self._local_set(key, value)
+
+    def _invalidate(self, key):
+        # The marker is written first, so a loader either sees it or caches
+        # its value before the delete below
+        self._shared_call("set", f"{key}:invalidated", 1, INVALIDATED_TTL)
+        self.local.delete(key)
+        self._shared_call("delete", key)
+
+    def delete(self, parts):
+        """
+        Drops a value from the shared tier and this process's local tier.
+
+        Inside a transaction it is dropped again once the transaction commits.
+        For INVALIDATED_TTL afterwards, get_or_set does not cache what it
+        loads, so a value read from the old row by a request that was in
+        flight during the write does not outlive it.
+        """
+        if not self.enabled:
+            return
+        key = self.key(parts)
+        self._invalidate(key)
+        transaction.on_commit(lambda: self._invalidate(key))
+
+    def _set_loaded(self, parts, value):
+        key = self.key(parts)
+        marker = f"{key}:invalidated"
+        if self._shared_call("get", marker) is not None:
+            return
+        self.set(parts, value)
+        # Invalidated between the check and the set. The delete that follows
+        # the marker may have run before the set, so drop the value here.
+        if self._shared_call("get", marker) is not None:
+            self.local.delete(key)
+            self._shared_call("delete", key)
+
+    async def _aset_loaded(self, parts, value):
+        key = self.key(parts)
+        marker = f"{key}:invalidated"
+        if await self._ashared_call("get", marker) is not None:
+            return
+        await self.aset(parts, value)
+        if await self._ashared_call("get", marker) is not None:
+            self.local.delete(key)
+            await self._ashared_call("delete", key)
+
+    def get_or_set(self, parts, load):
+        """
+        Returns the cached value, or calls load() and caches its result unless
+        it is None or the key was deleted within INVALIDATED_TTL.
+
+        Only one caller per key loads at a time (guarded by a cache.add lock in
+        the shared tier); others wait up to LOCK_WAIT for its value instead of
+        all loading at once.
+        """
+        if not self.enabled:
+            return load()
+        key = self.key(parts)
+        value = self._lookup(key)
+        if value is not MISSING:
+            return value
+
+        lock_key = f"{key}:lock"
+        # None when the shared tier failed: load without waiting for a lock
+        locked = self._shared_call("add", lock_key, 1, LOCK_TTL)
+        if locked is False:
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                value = self._shared_call("get", key, MISSING, default=MISSING)
+                if value is not MISSING:
+                    return self._shared_hit(key, value, result="coalesced")
+
+        self._record("shared", "miss")
+        try:
+            value = load()
+            if value is not None:
+                self._set_loaded(parts, value)
+        finally:
+            if locked:
+                self._shared_call("delete", lock_key)
+        return value
+
+    async def aget(self, parts):
+        if not self.enabled:
+            return MISSING
+        value = await self._alookup(self.key(parts))
+        if value is MISSING:
+            self._record("shared", "miss")
+        return value
+
+    async def aset(self, parts, value):
+        if not self.enabled:
+            return
+        key = self.key(parts)
+        await self._ashared_call("set", key, value, self.ttl)
+        self._local_set(key, value)
+
+    async def aget_or_set(self, parts, load):
+        """
+        Async get_or_set; load is a coroutine function.
+        """
+        if not self.enabled:
+            return await load()
+        key = self.key(parts)
+        value = await self._alookup(key)
+        if value is not MISSING:
+            return value
+
+        lock_key = f"{key}:lock"
+        locked = await self._ashared_call("add", lock_key, 1, LOCK_TTL)
+        if locked is False:
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                value = await self._ashared_call("get", key, MISSING, default=MISSING)
+                if value is not MISSING:
+                    return self._shared_hit(key, value, result="coalesced")
+
+        self._record("shared", "miss")
+        try:
+            value = await load()
+            if value is not None:
+                await self._aset_loaded(parts, value)
+        finally:
+            if locked:
+                await self._ashared_call("delete", lock_key)
+        return value
+
+
+# Plans as JSON text by trip_id. Plans change in place, so they skip the local
+# tier and every worker sees an invalidation immediately. Without a shared
+# cache (REDIS_URL) they are always read from the database.
+PLANS = Namespace("plans", ttl=300, version=2, needs_shared_tier=True)
+# Places API responses by request
+PLACES = Namespace("places", ttl=24 * 3600, local_ttl=300)
+# Photo references by location name
+PHOTOS = Namespace("photos", ttl=7 * 24 * 3600, local_ttl=3600, max_local_entries=5000)
+# Outputs of deterministic Gemini calls by model and prompt
+GEMINI = Namespace("gemini", ttl=24 * 3600, local_ttl=300)
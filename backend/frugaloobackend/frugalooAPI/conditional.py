@@ -0,0 +1,92 @@
+import hashlib
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.regex_helper import _lazy_re_compile
+from rest_framework import status
+from rest_framework.response import Response
+
+try:
+    import brotli
+except ImportError:  # Responses are only gzipped without it
+    brotli = None
+
+# Clients revalidate with If-None-Match before reusing a cached plan
+CACHE_CONTROL = "private, no-cache"
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+def plan_etag(trip_id, plan_version, *variant):
+    """
+    Strong ETag of a trip's plan, e.g. '"<trip_id>.3"'. variant tells apart
+    different representations of the same version, such as a single day.
+    """
+    return '"' + ".".join(str(part) for part in (trip_id, plan_version, *variant)) + '"'
+
+
+def list_etag(rows, *variant):
+    """
+    Strong ETag of a list of trips, from their (id, plan_version) rows.
+    """
+    digest = hashlib.sha1(repr((list(rows), variant)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def is_fresh(request, etag):
+    """
+    Returns:
+    - True when If-None-Match names etag. Weak validators match too, since
+      compressed responses carry the weak form of the ETag.
+    """
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
+def not_modified(etag):
+    return Response(
+        status=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
+
+
+def with_etag(response, etag):
+    response["ETag"] = etag
+    response["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses with brotli when the client accepts it and the
+    brotli package is installed, and with gzip otherwise.
+
+    Like GZipMiddleware, a strong ETag is weakened on compressed responses.
+    """
+
+    def process_response(self, request, response):
+        if (
+            brotli is None
+            or response.streaming
+            or len(response.content) < 200
+            or response.has_header("Content-Encoding")
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            return super().process_response(request, response)
+
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        if (etag := response.get("ETag")) and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
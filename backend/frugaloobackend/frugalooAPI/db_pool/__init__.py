@@ -0,0 +1,205 @@
+"""
+A per-process pool of PostgreSQL connections, used through the
+frugalooAPI.db_pool database engine (see base.py).
+
+Django 4.2 has no connection pool of its own and psycopg2's pools fail
+instead of waiting when they are exhausted, so this one blocks for up to
+TIMEOUT seconds for a free connection. It pools client connections to the
+Supabase transaction-mode pooler, which does the server-side pooling; every
+connection is handed back outside a transaction, with nothing
+session-specific left on it.
+"""
+
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+from psycopg2 import extensions
+
+from .. import metrics
+
+# Every pool created in this process, by database alias
+POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+DEFAULT_POOL = {
+    # Connections this process keeps open at most; size it to the threads
+    # serving requests in one worker
+    "MAX_SIZE": 10,
+    # Seconds to wait for a free connection before failing the query
+    "TIMEOUT": 10,
+    # Idle connections older than this are closed instead of reused
+    "MAX_IDLE": 300,
+    # Idle connections older than this are pinged before being reused
+    "CHECK_AFTER": 30,
+}
+
+POOL_WAIT = metrics.Histogram(
+    "frugaloo_db_pool_wait_seconds",
+    "Time spent waiting for a pooled database connection, by alias.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+POOL_EVENTS = metrics.Counter(
+    "frugaloo_db_pool_events_total",
+    "Pooled connections opened, reused, discarded (closed or failing their "
+    "health check) and checkouts that timed out, by alias.",
+)
+POOL_CONNECTIONS = metrics.Gauge(
+    "frugaloo_db_pool_connections",
+    "Connections held by the pool, by alias and state (idle, in_use), and "
+    "its max size.",
+    callback=lambda: [
+        sample for pool in list(POOLS.values()) for sample in pool.samples()
+    ],
+)
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, alias, max_size, timeout, max_idle, check_after):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # (connection, time it was returned), most recently returned last
+        self._idle = deque()
+        self._in_use = 0
+
+    def _record(self, event):
+        POOL_EVENTS.inc(alias=self.alias, event=event)
+
+    def _discard(self, connection):
+        self._record("discarded")
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _usable(self, connection, idle_since):
+        if connection.closed:
+            return False
+        idle = time.monotonic() - idle_since
+        if idle > self.max_idle:
+            return False
+        if idle > self.check_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+            except Exception:
+                return False
+        return True
+
+    def getconn(self, connect):
+        """
+        Returns:
+        - An idle connection that passes its health check, or a new one from
+          connect() while the pool has room
+
+        Raises:
+        - PoolTimeout when every connection stays in use for timeout seconds
+        """
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        POOL_WAIT.observe(time.monotonic() - started, alias=self.alias)
+        if not acquired:
+            self._record("timeout")
+            raise PoolTimeout(
+                f"No database connection free in the {self.alias!r} pool "
+                f"after {self.timeout}s (max size {self.max_size})"
+            )
+
+        try:
+            while True:
+                with self._lock:
+                    connection, idle_since = (
+                        self._idle.pop() if self._idle else (None, None)
+                    )
+                if connection is None:
+                    connection = connect()
+                    self._record("opened")
+                    break
+                if self._usable(connection, idle_since):
+                    self._record("reused")
+                    break
+                self._discard(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        return connection
+
+    def putconn(self, connection):
+        """
+        Hands a connection back, rolling back whatever it left open. Broken
+        connections are closed instead.
+        """
+        try:
+            status = (
+                extensions.TRANSACTION_STATUS_UNKNOWN
+                if connection.closed
+                else connection.get_transaction_status()
+            )
+            if status in (
+                extensions.TRANSACTION_STATUS_INTRANS,
+                extensions.TRANSACTION_STATUS_INERROR,
+            ):
+                try:
+                    connection.rollback()
+                    status = connection.get_transaction_status()
+                except Exception:
+                    status = extensions.TRANSACTION_STATUS_UNKNOWN
+
+            if status == extensions.TRANSACTION_STATUS_IDLE:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+            else:
+                self._discard(connection)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def samples(self):
+        labels = {"alias": self.alias}
+        return [
+            ({**labels, "state": "idle"}, len(self._idle)),
+            ({**labels, "state": "in_use"}, self._in_use),
+            ({**labels, "state": "max"}, self.max_size),
+        ]
+
+
+def get_pool(alias, settings_dict):
+    """
+    Returns:
+    - The pool of alias, created from settings_dict["POOL"] on first use
+    """
+    pool = POOLS.get(alias)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = POOLS.get(alias)
+            if pool is None:
+                options = {**DEFAULT_POOL, **(settings_dict.get("POOL") or {})}
+                pool = POOLS[alias] = ConnectionPool(
+                    alias,
+                    max_size=int(options["MAX_SIZE"]),
+                    timeout=float(options["TIMEOUT"]),
+                    max_idle=float(options["MAX_IDLE"]),
+                    check_after=float(options["CHECK_AFTER"]),
+                )
+    return pool
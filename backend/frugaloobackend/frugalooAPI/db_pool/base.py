@@ -0,0 +1,37 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from . import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The PostgreSQL backend, taking its connections from a per-process
+    ConnectionPool instead of opening one per request.
+
+    Closing the connection, which Django does at the end of every request
+    when CONN_MAX_AGE is 0, hands it back to the pool. Configure the pool
+    with the database's "POOL" settings (see DEFAULT_POOL).
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.getconn(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        # Set by the parent only for connections it opens; pooled connections
+        # keep the isolation level they were opened with
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get(
+                "isolation_level", IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
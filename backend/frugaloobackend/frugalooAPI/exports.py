@@ -0,0 +1,157 @@
+"""
+Bulk exports of trips and expenses as NDJSON or CSV, written incrementally so
+memory stays constant whatever the size of the table.
+
+Rows have the same fields and values as the API's responses (see
+ValuesSerializer). They are read chunk_size at a time: through a server-side
+cursor when the database allows one, otherwise one keyset-paginated query per
+chunk, since the transaction-mode pooler cannot keep a cursor open across
+queries and a client-side cursor would fetch the whole result at once.
+
+Under ASGI, responses must be given astream(): Django reads a synchronous
+iterator into a list before sending any of it.
+"""
+
+import csv
+import io
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import fastjson
+from .serializers import FastFinanceLogSerializer, FastUserTripInfoSerializer
+
+# Export name -> serializer whose fields are exported
+EXPORTS = {
+    "trips": FastUserTripInfoSerializer,
+    "finance-logs": FastFinanceLogSerializer,
+}
+
+FORMATS = ("ndjson", "csv")
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def queryset(name, user_id=None, using=None):
+    """
+    Returns:
+    - Every row of the export name, or only those of user_id
+    """
+    model = EXPORTS[name].model_serializer.Meta.model
+    rows = model.objects.all()
+    if using is not None:
+        rows = rows.using(using)
+    if user_id is not None:
+        rows = rows.filter(user_id=user_id)
+    return rows
+
+
+def chunked_values(rows, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields lists of up to chunk_size tuples of columns, for every row of the
+    queryset rows, in primary key order.
+    """
+    rows = rows.order_by("pk")
+    if not connections[rows.db].settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        values = rows.values_list(*columns).iterator(chunk_size=chunk_size)
+        while chunk := list(islice(values, chunk_size)):
+            yield chunk
+        return
+
+    # pk is read as an extra last column to start the next chunk after it
+    last_pk = None
+    while True:
+        page = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+        chunk = list(page.values_list(*columns, "pk")[:chunk_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1][-1]
+        yield [row[:-1] for row in chunk]
+        if len(chunk) < chunk_size:
+            return
+
+
+def ndjson(serializer, chunks):
+    """
+    Yields the rows of chunks as NDJSON, one bytes block per chunk.
+    """
+    default = JSONEncoder().default
+    for chunk in chunks:
+        yield b"".join(
+            fastjson.dumps_bytes(row, default=default) + b"\n"
+            for row in serializer.represent(chunk)
+        )
+
+
+def csv_cell(value):
+    # Nested values, such as generated_plan or nearby_restaurants, as JSON
+    if isinstance(value, (dict, list)):
+        return fastjson.dumps(value)
+    return value
+
+
+def csv_rows(serializer, chunks):
+    """
+    Yields the rows of chunks as CSV with a header line, one bytes block per
+    chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        block = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return block
+
+    writer.writerow(serializer.names)
+    yield flush()
+    for chunk in chunks:
+        writer.writerows(
+            [csv_cell(value) for value in row.values()]
+            for row in serializer.represent(chunk)
+        )
+        yield flush()
+
+
+def stream(name, output, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Usage:
+
+        for block in exports.stream("trips", "csv", exports.queryset("trips")):
+            file.write(block)
+
+    Parameters:
+    - name: Export name, a key of EXPORTS
+    - output: "ndjson" or "csv"
+    - rows: Queryset of the rows to export, from queryset()
+
+    Returns:
+    - Iterator of bytes blocks, reading the rows as it is consumed
+    """
+    serializer = EXPORTS[name](rows)
+    chunks = chunked_values(rows, serializer.columns, chunk_size)
+    if output == "csv":
+        return csv_rows(serializer, chunks)
+    return ndjson(serializer, chunks)
+
+
+async def astream(name, output, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Async stream(), for StreamingHttpResponse under ASGI. Each chunk is read
+    in a thread when the response asks for the next block.
+    """
+    blocks = stream(name, output, rows, chunk_size)
+    next_block = sync_to_async(next)
+    try:
+        while (block := await next_block(blocks, None)) is not None:
+            yield block
+    finally:
+        await sync_to_async(blocks.close)()
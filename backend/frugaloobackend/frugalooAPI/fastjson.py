@@ -0,0 +1,149 @@
+"""
+JSON encoding and decoding through orjson, with the standard library as the
+fallback when orjson is not installed or cannot handle a value exactly the
+way the standard library would.
+
+Finite values parse back to the same values as the standard library's. The
+text differs in formatting: no spaces after separators, non-ASCII text kept
+as UTF-8 instead of \\u escapes, and floats written the way orjson writes
+them (1e16 for 1e+16, 0.00001 for 1e-05, 1e-7 for 1e-07). NaN and Infinity
+are written as null, where the standard library writes NaN or raises.
+"""
+
+import io
+import json
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Everything goes through the json module without it
+    orjson = None
+
+if orjson is not None:
+    # Keys like plan day numbers may be ints; dates go through the DRF encoder
+    # so they are formatted the same way as before
+    DUMPS_OPTIONS = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+# orjson reads integers beyond 64 bits as floats, so text that may contain one
+# is left to the json module. Digits are mapped to "0" and everything else to a
+# space, which finds runs of 19 digits far faster than a regular expression.
+DIGITS = bytes(48 if 48 <= byte <= 57 else 32 for byte in range(256))
+LONG_NUMBER = b"0" * 19
+
+# U+2028 and U+2029 are valid in JSON but not in JavaScript source
+LINE_SEPARATORS = ("\u2028".encode(), "\u2029".encode())
+
+
+def may_hold_long_int(raw):
+    return LONG_NUMBER in raw.translate(DIGITS)
+
+
+def dumps_bytes(obj, default=None):
+    """
+    Returns:
+    - obj as compact UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=DUMPS_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(
+        obj, default=default, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def dumps(obj):
+    """
+    Drop-in for json.dumps(obj).
+
+    Returns:
+    - obj as compact JSON text
+    """
+    return dumps_bytes(obj).decode()
+
+
+def loads(data):
+    """
+    Drop-in for json.loads(data), for str or UTF-8 bytes.
+
+    Raises:
+    - ValueError (json.JSONDecodeError) for invalid JSON
+    """
+    if orjson is not None and isinstance(data, (str, bytes, bytearray)):
+        try:
+            raw = data.encode() if isinstance(data, str) else data
+            if not may_hold_long_int(raw):
+                return orjson.loads(raw)
+        except (UnicodeEncodeError, orjson.JSONDecodeError):
+            # Let the json module raise its own error, or accept what it
+            # accepts, such as NaN
+            pass
+    return json.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer rendering through orjson, for compact, UTF-8 rendering
+    (DRF's defaults). Indented rendering, such as the browsable API's, is
+    left to JSONRenderer.
+
+    The output parses to the same data as JSONRenderer's, except that NaN
+    and Infinity are rendered as null where JSONRenderer raises ValueError.
+    Floats are formatted as described in the module docstring, so the bytes
+    can differ from JSONRenderer's.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=DUMPS_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if LINE_SEPARATORS[0] in ret or LINE_SEPARATORS[1] in ret:
+            ret = ret.replace(LINE_SEPARATORS[0], b"\\u2028").replace(
+                LINE_SEPARATORS[1], b"\\u2029"
+            )
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser parsing UTF-8 bodies through orjson.
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace("_", "-") != "utf-8":
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if not may_hold_long_int(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+
+        # Invalid or unusual input gets JSONParser's handling and errors
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import FinanceLog, FinanceRollup
+
+ROLLUP_KEY = ("user_id", "trip_info_id", "day", "category")
+
+
+def rollup_key(log):
+    return tuple(getattr(log, field) for field in ROLLUP_KEY)
+
+
+def add_to_rollup(key, amount, count):
+    """
+    Adds amount and count to the rollup row of key, creating it if needed.
+
+    The row is incremented in place with F() so concurrent expenses for the
+    same key never overwrite each other; when two requests create the same
+    row at once, the loser of the unique constraint falls back to the update.
+    """
+    rollups = FinanceRollup.objects.filter(**dict(zip(ROLLUP_KEY, key)))
+    increment = {
+        "total_amount": F("total_amount") + amount,
+        "entry_count": F("entry_count") + count,
+    }
+    if rollups.update(**increment):
+        return
+    try:
+        with transaction.atomic():
+            FinanceRollup.objects.create(
+                **dict(zip(ROLLUP_KEY, key)), total_amount=amount, entry_count=count
+            )
+    except IntegrityError:
+        rollups.update(**increment)
+
+
+def record_expenses(logs):
+    """
+    Adds newly saved FinanceLog rows to their rollups.
+
+    Call it in the same transaction that saved the logs, so the rollups never
+    count an expense that was rolled back.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for log in logs:
+        if log.trip_info_id is None:
+            continue
+        total = totals[rollup_key(log)]
+        total[0] += log.amount
+        total[1] += 1
+
+    with transaction.atomic():
+        # Sorted so concurrent batches lock shared rows in the same order
+        for key, (amount, count) in sorted(totals.items()):
+            add_to_rollup(key, amount, count)
+
+
+def rebuild(trip_ids=None, user_id=None, batch_size=1000):
+    """
+    Recomputes the rollups from FinanceLog, for every trip or only those of
+    trip_ids and/or user_id.
+
+    Returns:
+    - Number of rollup rows written
+    """
+    logs = FinanceLog.objects.filter(trip_info__isnull=False)
+    rollups = FinanceRollup.objects.all()
+    if trip_ids is not None:
+        logs = logs.filter(trip_info_id__in=trip_ids)
+        rollups = rollups.filter(trip_info_id__in=trip_ids)
+    if user_id is not None:
+        logs = logs.filter(user_id=user_id)
+        rollups = rollups.filter(user_id=user_id)
+
+    totals = (
+        logs.values(*ROLLUP_KEY)
+        .annotate(total_amount=Sum("amount"), entry_count=Count("id"))
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = FinanceRollup.objects.bulk_create(
+            (FinanceRollup(**row) for row in totals.iterator(chunk_size=batch_size)),
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def summary(user_id, trip_id=None):
+    """
+    Totals and breakdowns of a user's expenses, read from the rollups.
+
+    Returns:
+    - {"total_amount", "entry_count", "by_day", "by_category", "breakdown"}
+      where breakdown has one entry per (trip, day, category). by_day is only
+      meaningful within one trip, since day numbers restart on every trip.
+    """
+    rollups = FinanceRollup.objects.filter(user_id=user_id)
+    if trip_id is not None:
+        rollups = rollups.filter(trip_info_id=trip_id)
+    rows = list(
+        rollups.order_by("trip_info_id", "day", "category").values(
+            "trip_info_id", "day", "category", "total_amount", "entry_count"
+        )
+    )
+
+    def group(field):
+        totals = defaultdict(lambda: {"total_amount": 0, "entry_count": 0})
+        for row in rows:
+            total = totals[row[field]]
+            total["total_amount"] += row["total_amount"]
+            total["entry_count"] += row["entry_count"]
+        return [{field: value, **total} for value, total in sorted(totals.items())]
+
+    return {
+        "total_amount": sum(row["total_amount"] for row in rows),
+        "entry_count": sum(row["entry_count"] for row in rows),
+        "by_day": group("day"),
+        "by_category": group("category"),
+        "breakdown": [
+            {
+                "trip_id": str(row["trip_info_id"]),
+                "day": row["day"],
+                "category": row["category"],
+                "total_amount": row["total_amount"],
+                "entry_count": row["entry_count"],
+            }
+            for row in rows
+        ],
+    }
@@ -0,0 +1,195 @@
+import json
+import logging
+import random
+import time
+
+import google.generativeai as genai
+import httpx
+from django.conf import settings
+from google.generativeai import client as genai_client
+from google.generativeai import protos
+from google.generativeai.types import GenerateContentResponse
+
+from . import caching, metrics, timing
+
+logger = logging.getLogger(__name__)
+
+LLM_REQUESTS = metrics.Counter(
+    "frugaloo_llm_requests_total",
+    "Gemini calls by endpoint, operation, model and outcome.",
+)
+LLM_RETRIES = metrics.Counter(
+    "frugaloo_llm_retries_total",
+    "Gemini calls repeated because the previous output was unusable.",
+)
+LLM_PROMPT_TOKENS = metrics.Counter(
+    "frugaloo_llm_prompt_tokens_total", "Prompt tokens sent to Gemini."
+)
+LLM_OUTPUT_TOKENS = metrics.Counter(
+    "frugaloo_llm_output_tokens_total", "Output tokens generated by Gemini."
+)
+LLM_LATENCY = metrics.Histogram(
+    "frugaloo_llm_latency_seconds", "Wall-clock latency of Gemini calls."
+)
+
+GEMINI_TIMEOUT = 300
+
+
+class InstrumentedModel(genai.GenerativeModel):
+    """
+    GenerativeModel that records metrics and sampled logs for every async call.
+
+    Each call is also recorded as a "gemini.<operation>" Server-Timing stage.
+    Chat sessions created with start_chat() send their messages through
+    generate_content_async, so they are covered as well.
+
+    With cached=True, responses are kept in the GEMINI cache namespace, keyed
+    by the model, its configuration and the prompt. Only use it for calls
+    whose output should be the same for the same input.
+    """
+
+    def __init__(self, endpoint, operation, cached=False, **kwargs):
+        super().__init__(**kwargs)
+        self.cached = cached
+        self.labels = {
+            "endpoint": endpoint,
+            "operation": operation,
+            "model": self.model_name.removeprefix("models/"),
+        }
+
+    async def generate_content_async(self, *args, **kwargs):
+        if not self.cached or kwargs.get("stream"):
+            return await self._generate_content_async(*args, **kwargs)
+
+        parts = (
+            self.model_name,
+            str(self._system_instruction),
+            repr(self._generation_config),
+            repr(args),
+            repr(sorted(kwargs.items())),
+        )
+        generated = None
+
+        async def load():
+            nonlocal generated
+            generated = await self._generate_content_async(*args, **kwargs)
+            try:
+                generated.text
+            except ValueError:
+                # Blocked or empty responses are not cached
+                return None
+            return protos.GenerateContentResponse.to_json(generated._result)
+
+        payload = await caching.GEMINI.aget_or_set(parts, load)
+        if generated is not None:
+            return generated
+        LLM_REQUESTS.inc(outcome="cached", **self.labels)
+        return GenerateContentResponse.from_response(
+            protos.GenerateContentResponse.from_json(payload)
+        )
+
+    async def _generate_content_async(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with timing.span(f"gemini.{self.labels['operation']}"):
+                response = await super().generate_content_async(*args, **kwargs)
+        except Exception as e:
+            self.record(time.perf_counter() - start, error=e)
+            raise
+        self.record(time.perf_counter() - start, response=response)
+        return response
+
+    def record(self, latency, response=None, error=None):
+        prompt_tokens = output_tokens = 0
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = usage.prompt_token_count
+            output_tokens = usage.candidates_token_count
+
+        LLM_REQUESTS.inc(outcome="error" if error else "ok", **self.labels)
+        LLM_LATENCY.observe(latency, **self.labels)
+        LLM_PROMPT_TOKENS.inc(prompt_tokens, **self.labels)
+        LLM_OUTPUT_TOKENS.inc(output_tokens, **self.labels)
+
+        sample_rate = getattr(settings, "LLM_LOG_SAMPLE_RATE", 0.1)
+        if error is not None or random.random() < sample_rate:
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "llm_call",
+                        **self.labels,
+                        "latency_ms": round(latency * 1000, 1),
+                        "prompt_tokens": prompt_tokens,
+                        "output_tokens": output_tokens,
+                        "error": repr(error) if error else None,
+                    }
+                )
+            )
+
+
+class RestGenerativeClient:
+    """
+    Async stand-in for the SDK's GenerativeService client that speaks the REST API.
+
+    The SDK's async client only supports gRPC, so this is used when GEMINI_URL
+    points Gemini calls at another host, such as the replay server. The
+    operation is sent in a header so recordings can be kept per operation.
+    """
+
+    def __init__(self, base_url, api_key, operation):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.operation = operation
+
+    async def generate_content(self, request, **request_options):
+        async with httpx.AsyncClient(timeout=GEMINI_TIMEOUT) as client:
+            response = await client.post(
+                f"{self.base_url}/v1beta/{request.model}:generateContent",
+                params={"key": self.api_key},
+                headers={
+                    "Content-Type": "application/json",
+                    "x-frugaloo-operation": self.operation,
+                },
+                content=protos.GenerateContentRequest.to_json(
+                    request, including_default_value_fields=False
+                ),
+            )
+        response.raise_for_status()
+        return protos.GenerateContentResponse.from_json(
+            response.text, ignore_unknown_fields=True
+        )
+
+
+def generative_model(api_key, endpoint, operation, **kwargs):
+    """
+    Create an instrumented Gemini model whose async client is bound to the given API key.
+
+    The SDK keeps the configured API key in module-level state, and the async
+    views await between configuring it and calling the model, so another request
+    could swap the key underneath them. Binding the async client here pins each
+    model to the key it was created with. When GEMINI_URL is set the model is
+    bound to a RestGenerativeClient for that host instead.
+
+    Parameters:
+    - api_key: Gemini API key to use for every call made through this model
+    - endpoint: API route the model serves, used as a metrics label
+    - operation: What the model is asked to do, used as a metrics label
+    - kwargs: Arguments forwarded to InstrumentedModel, e.g. cached=True
+
+    Returns:
+    - InstrumentedModel ready for generate_content_async/start_chat
+    """
+    genai.configure(api_key=api_key)
+    model = InstrumentedModel(endpoint, operation, **kwargs)
+    if getattr(settings, "GEMINI_URL", None):
+        model._async_client = RestGenerativeClient(settings.GEMINI_URL, api_key, operation)
+    else:
+        model._async_client = genai_client.get_default_generative_async_client()
+    return model
+
+
+def record_retry(model):
+    """
+    Counts a repeated call made because the model's previous output was unusable.
+    """
+    LLM_RETRIES.inc(**model.labels)
@@ -0,0 +1,129 @@
+import re
+
+from django.db import transaction
+
+from .models import TripDay, TripStop
+
+# Name key of each kind of stop in a plan
+NAME_FIELDS = [
+    ("place_name", TripStop.PLACE),
+    ("restaurant_name", TripStop.RESTAURANT),
+    ("night_club_name", TripStop.NIGHT_CLUB),
+]
+
+TOE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(h|m)", re.IGNORECASE)
+
+
+def parse_toe(value):
+    """
+    Parses a time of exploration such as "2 hours", "1.5 hrs" or
+    "1 hour 30 minutes".
+
+    Returns:
+    - Minutes as an int, or None if the value has no duration in it
+    """
+    matches = TOE_PATTERN.findall(str(value or ""))
+    if not matches:
+        return None
+    return round(
+        sum(float(amount) * (60 if unit.lower() == "h" else 1) for amount, unit in matches)
+    )
+
+
+def parse_lat_long(value):
+    """
+    Parses a "lat, long" string.
+
+    Returns:
+    - (lat, lng) floats, or (None, None) if the value is not a coordinate pair
+    """
+    try:
+        lat, lng = (float(part) for part in str(value).split(","))
+    except (TypeError, ValueError):
+        return None, None
+    return lat, lng
+
+
+def parse_stop(stop):
+    """
+    Returns:
+    - Dict of TripStop fields for one stop of a plan, or None if it is not a stop
+    """
+    if not isinstance(stop, dict):
+        return None
+    kind, name = TripStop.PLACE, ""
+    for field, field_kind in NAME_FIELDS:
+        if stop.get(field):
+            kind, name = field_kind, str(stop[field])
+            break
+    lat, lng = parse_lat_long(stop.get("lat_long"))
+    return {
+        "kind": kind,
+        "name": name[:255],
+        "description": str(stop.get("description") or ""),
+        "toe_minutes": parse_toe(stop.get("TOE")),
+        "lat": lat,
+        "lng": lng,
+    }
+
+
+def parse_plan(plan):
+    """
+    Splits a generated plan, keyed by day or a list of days, into its days.
+
+    Returns:
+    - List of (key, list of TripStop field dicts) in plan order
+    """
+    if isinstance(plan, dict):
+        days = [(str(key), stops) for key, stops in plan.items()]
+    elif isinstance(plan, list):
+        days = [(str(index), stops) for index, stops in enumerate(plan)]
+    else:
+        return []
+    return [
+        (key, [fields for fields in map(parse_stop, stops) if fields])
+        for key, stops in days
+        if isinstance(stops, list)
+    ]
+
+
+def create_stops(day, stops):
+    TripStop.objects.bulk_create(
+        TripStop(trip_info_id=day.trip_info_id, day=day, order=order, **fields)
+        for order, fields in enumerate(stops)
+    )
+
+
+def sync_plan(trip_id, plan):
+    """
+    Replaces the TripDay and TripStop rows of a trip with those of plan.
+
+    Called wherever generated_plan is written as a whole, in the same
+    transaction as that write.
+    """
+    with transaction.atomic():
+        TripStop.objects.filter(trip_info_id=trip_id).delete()
+        TripDay.objects.filter(trip_info_id=trip_id).delete()
+        parsed = parse_plan(plan)
+        days = TripDay.objects.bulk_create(
+            TripDay(trip_info_id=trip_id, key=key, order=order)
+            for order, (key, _) in enumerate(parsed)
+        )
+        TripStop.objects.bulk_create(
+            TripStop(trip_info_id=trip_id, day=day, order=order, **fields)
+            for day, (_, stops) in zip(days, parsed)
+            for order, fields in enumerate(stops)
+        )
+
+
+def sync_plan_day(trip_id, key, stops):
+    """
+    Replaces the TripStop rows of one day of a trip, after that day alone was
+    updated in generated_plan.
+    """
+    with transaction.atomic():
+        day = TripDay.objects.filter(trip_info_id=trip_id, key=str(key)).first()
+        if day is None:
+            return
+        day.stops.all().delete()
+        create_stops(day, [fields for fields in map(parse_stop, stops) if fields])
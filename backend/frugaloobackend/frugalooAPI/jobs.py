@@ -0,0 +1,99 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TripGenerationJob
+from .views import GenerateFinalPlan
+
+# Claims a job gets before it is failed instead of claimed again, so a job
+# that kills or hangs its worker every time is not retried forever
+MAX_ATTEMPTS = 3
+
+# Seconds between heartbeats of a running job. A single stage can run longer
+# than --stale-after (several Gemini calls of up to GEMINI_TIMEOUT each), so
+# stage changes alone cannot show that the job is still alive.
+HEARTBEAT_INTERVAL = 30
+
+
+def claim_next_job(stale_after, max_attempts=MAX_ATTEMPTS):
+    """
+    Claims the oldest queued job for this worker.
+
+    Jobs left "running" for longer than stale_after seconds belong to a worker
+    that died mid-pipeline and are claimed again, unless they were already
+    claimed max_attempts times: those are marked failed. SKIP LOCKED lets
+    several workers poll the same table without blocking on each other.
+
+    Returns:
+    - TripGenerationJob or None when the queue is empty
+    """
+    stale_before = timezone.now() - timedelta(seconds=stale_after)
+    abandoned = Q(status=TripGenerationJob.RUNNING, updated_at__lt=stale_before)
+    with transaction.atomic():
+        TripGenerationJob.objects.filter(
+            abandoned, attempts__gte=max_attempts
+        ).update(
+            status=TripGenerationJob.FAILED,
+            error=f"Abandoned by its worker {max_attempts} times",
+            updated_at=timezone.now(),
+        )
+        job = (
+            TripGenerationJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=TripGenerationJob.QUEUED) | abandoned)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = TripGenerationJob.RUNNING
+        job.stage = "claimed"
+        job.attempts += 1
+        job.save(update_fields=["status", "stage", "attempts", "updated_at"])
+        return job
+
+
+def update_job(job, **fields):
+    """
+    Saves the given fields on the job, bumping updated_at as a heartbeat.
+    """
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=[*fields, "updated_at"])
+
+
+async def run_job(job, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """
+    Runs the generate-trip pipeline for a claimed job and records the outcome.
+
+    updated_at is bumped every heartbeat_interval seconds while it runs, so
+    other workers do not take the job for abandoned; keep it well below their
+    stale_after.
+    """
+
+    async def on_stage(stage):
+        await sync_to_async(update_job)(job, stage=stage)
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(heartbeat_interval)
+            await sync_to_async(update_job)(job)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        result = await GenerateFinalPlan().generate_plan(job.payload, on_stage)
+    except Exception as e:
+        outcome = {"status": TripGenerationJob.FAILED, "error": str(e)}
+    else:
+        outcome = {
+            "status": TripGenerationJob.SUCCEEDED,
+            "stage": "done",
+            "result": result,
+        }
+    finally:
+        heartbeat_task.cancel()
+    await sync_to_async(update_job)(job, **outcome)
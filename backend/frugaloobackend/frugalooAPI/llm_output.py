@@ -0,0 +1,276 @@
+import ast
+import json
+import re
+
+# Declared shapes of the JSON each Gemini prompt is asked to produce. A schema is
+# a dict with a "type" of object, days, array, string or any:
+# - object: "properties" maps keys to schemas, "required" lists mandatory keys and
+#   "any_of" lists keys of which at least one must be present
+# - days: itinerary mapping of day key -> list of "items"
+# - string: optional "pattern" the value must match; numbers are coerced to str
+STRING = {"type": "string"}
+ANY = {"type": "any"}
+LAT_LONG = {
+    "type": "string",
+    "pattern": re.compile(r"^\s*-?\d+(\.\d+)?\s*,\s*-?\d+(\.\d+)?\s*$"),
+}
+
+PLACE = {
+    "type": "object",
+    "properties": {
+        "place_name": STRING,
+        "description": STRING,
+        "TOE": STRING,
+        "lat_long": LAT_LONG,
+    },
+    "required": ["place_name", "description", "TOE", "lat_long"],
+}
+
+MERGED_STOP = {
+    "type": "object",
+    "properties": {
+        "place_name": STRING,
+        "restaurant_name": STRING,
+        "night_club_name": STRING,
+        "description": STRING,
+        "TOE": STRING,
+        "lat_long": LAT_LONG,
+    },
+    "required": ["description", "TOE", "lat_long"],
+    "any_of": ["place_name", "restaurant_name", "night_club_name"],
+}
+
+# Pre-plan itinerary (Preplan)
+ITINERARY = {"type": "days", "items": PLACE}
+
+# Itinerary with restaurants merged in (GenerateFinalPlan)
+MERGED_PLAN = {"type": "days", "items": MERGED_STOP}
+
+# Edited itinerary plus a summary of the edits (GeminiSuggestions). The plan being
+# edited already has restaurants merged in, so stops follow MERGED_STOP.
+SUGGESTIONS = {
+    "type": "object",
+    "properties": {"generated_plan": MERGED_PLAN, "changes": STRING},
+    "required": ["generated_plan", "changes"],
+}
+
+# Finance chat intent classifier (GenerateMessageView)
+FINANCE_INTENT = {
+    "type": "object",
+    "properties": {"information_needed": STRING, "visual_type": STRING},
+    "required": ["information_needed"],
+}
+
+# Finance chat insights (GenerateMessageView)
+FINANCE_INSIGHTS = {
+    "type": "object",
+    "properties": {"insights": STRING, "extracted_data": ANY},
+    "required": ["insights"],
+}
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+# String literals are matched first and kept as they are, so only commas
+# outside strings are dropped. Strings may be single quoted (Python-literal
+# output) or cut off at the end of a truncated response.
+_TRAILING_COMMA = re.compile(
+    r"""("(?:[^"\\]|\\.)*(?:"|$)|'(?:[^'\\]|\\.)*(?:'|$))|,\s*([}\]])""",
+    re.DOTALL,
+)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class LLMOutputError(ValueError):
+    """
+    Raised when Gemini output cannot be parsed or does not match its schema.
+    """
+
+    def __init__(self, message, errors=()):
+        self.errors = list(errors)
+        if self.errors:
+            message = f"{message}: {'; '.join(self.errors[:5])}"
+        super().__init__(message)
+
+
+def loads(text):
+    """
+    Decodes JSON from a Gemini response, repairing common defects locally.
+
+    Markdown fences are stripped first. If decoding fails, a fixed sequence of
+    repairs is tried, each at most once: trimming prose around the outermost
+    braces, dropping trailing commas, closing unterminated brackets, and finally
+    reading Python-literal dicts (single-quoted keys and values).
+
+    Returns:
+    - The decoded value
+
+    Raises:
+    - LLMOutputError when no repair produces valid JSON
+    """
+    if not isinstance(text, str):
+        raise LLMOutputError("Expected text output from Gemini")
+
+    match = _FENCE.search(text)
+    candidate = match.group(1) if match else text.strip()
+    try:
+        return json.loads(candidate)
+    except ValueError as e:
+        error = e
+
+    start = min(
+        (i for i in (candidate.find("{"), candidate.find("[")) if i != -1), default=-1
+    )
+    if start != -1:
+        end = max(candidate.rfind("}"), candidate.rfind("]"))
+        candidate = candidate[start : end + 1] if end > start else candidate[start:]
+
+    for repair in (lambda s: s, _drop_trailing_commas, _close_brackets):
+        candidate = repair(candidate)
+        try:
+            return json.loads(candidate)
+        except ValueError as e:
+            error = e
+
+    try:
+        value = ast.literal_eval(candidate)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise LLMOutputError("Gemini returned malformed JSON", [str(error)])
+    if not isinstance(value, (dict, list)):
+        raise LLMOutputError("Gemini returned malformed JSON", [str(error)])
+    return value
+
+
+def parse(text, schema):
+    """
+    Decodes a Gemini response and validates it against a schema in one pass.
+
+    Returns:
+    - The validated value, with numbers in string fields coerced to str
+
+    Raises:
+    - LLMOutputError listing every schema violation found
+    """
+    errors = []
+    value = validate(loads(text), schema, "$", errors)
+    if errors:
+        raise LLMOutputError("Gemini output does not match the expected schema", errors)
+    return value
+
+
+def parse_days(text, item_schema):
+    """
+    Decodes an itinerary and validates it day by day.
+
+    A wrapping {"response_data": {...}} object, which the merge prompt's examples
+    sometimes lead Gemini to emit, is unwrapped first.
+
+    Returns:
+    - (days, failed): days maps each valid day to its stops, failed maps each
+      invalid day to its list of errors so callers can retry just those days
+
+    Raises:
+    - LLMOutputError when the output is not an itinerary at all
+    """
+    value = loads(text)
+    if isinstance(value, dict) and set(value) == {"response_data"}:
+        value = value["response_data"]
+    if not isinstance(value, dict):
+        raise LLMOutputError("Expected an itinerary object keyed by day")
+
+    days, failed = {}, {}
+    for day, stops in value.items():
+        errors = []
+        stops = validate(
+            stops, {"type": "array", "items": item_schema}, f"$.{day}", errors
+        )
+        if errors:
+            failed[day] = errors
+        else:
+            days[day] = stops
+    return days, failed
+
+
+def validate(value, schema, path, errors):
+    """
+    Validates value against schema, appending "path: problem" strings to errors.
+
+    Returns:
+    - The value with string coercions applied
+    """
+    kind = schema["type"]
+
+    if kind == "any":
+        return value
+
+    if kind == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            errors.append(f"{path}: expected a string")
+        elif "pattern" in schema and not schema["pattern"].match(value):
+            errors.append(f"{path}: {value!r} is not in the expected format")
+        return value
+
+    if kind == "array":
+        if not isinstance(value, list):
+            errors.append(f"{path}: expected a list")
+            return value
+        return [
+            validate(item, schema["items"], f"{path}[{i}]", errors)
+            for i, item in enumerate(value)
+        ]
+
+    if kind == "days":
+        if not isinstance(value, dict):
+            errors.append(f"{path}: expected an object keyed by day")
+            return value
+        item_schema = {"type": "array", "items": schema["items"]}
+        return {
+            day: validate(stops, item_schema, f"{path}.{day}", errors)
+            for day, stops in value.items()
+        }
+
+    if not isinstance(value, dict):
+        errors.append(f"{path}: expected an object")
+        return value
+    for key in schema.get("required", ()):
+        if key not in value:
+            errors.append(f"{path}: missing {key!r}")
+    any_of = schema.get("any_of")
+    if any_of and not any(key in value for key in any_of):
+        errors.append(f"{path}: needs one of {', '.join(any_of)}")
+    properties = schema.get("properties", {})
+    return {
+        key: validate(item, properties[key], f"{path}.{key}", errors)
+        if key in properties
+        else item
+        for key, item in value.items()
+    }
+
+
+def _drop_trailing_commas(text):
+    return _TRAILING_COMMA.sub(lambda match: match.group(1) or match.group(2), text)
+
+
+def _close_brackets(text):
+    """
+    Appends the closers missing from a truncated JSON document.
+    """
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in "}]" and stack and stack[-1] == char:
+            stack.pop()
+
+    suffix = '"' if in_string else ""
+    return _drop_trailing_commas(text.rstrip().rstrip(",") + suffix + "".join(reversed(stack)))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from frugalooAPI import backfills, finance
+from frugalooAPI.models import FinanceLog, UserTripProgressInfo
+
+
+class Command(BaseCommand):
+    help = (
+        "Link the progress and finance rows that still have no trip_info to "
+        "their trip, then rebuild the TripProgress and FinanceRollup rows of "
+        "those trips. Run it once after deploying the release with migration "
+        "0019, for the rows the previous release wrote after the migration's "
+        "backfill. It can be run again safely; updates made to those trips "
+        "while it runs may be missed, so run it again if any were."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows read and written per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        trip_ids = backfills.link_trip_info(UserTripProgressInfo, batch_size)
+        written = backfills.rebuild_progress(trip_ids, batch_size) if trip_ids else 0
+        self.stdout.write(
+            f"Linked progress of {len(trip_ids)} trips, wrote {written} trip progress rows"
+        )
+
+        trip_ids = backfills.link_trip_info(FinanceLog, batch_size)
+        written = (
+            finance.rebuild(trip_ids=trip_ids, batch_size=batch_size) if trip_ids else 0
+        )
+        self.stdout.write(
+            f"Linked expenses of {len(trip_ids)} trips, wrote {written} finance rollups"
+        )
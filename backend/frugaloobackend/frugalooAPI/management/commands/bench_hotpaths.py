@@ -0,0 +1,136 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+
+from frugalooAPI.microbench import BASELINE_PATH, calibrate, cases, measure
+
+# Extra measurements of a case that looks slower than its baseline before it
+# is reported as a regression
+CONFIRM_RUNS = 2
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the CPU-bound hot paths of the API on a synthetic 30-day trip and "
+        "fail when any of them is slower than the committed baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.3,
+            help="Allowed slowdown relative to the baseline, e.g. 0.3 for 30%%.",
+        )
+        parser.add_argument(
+            "--case",
+            action="append",
+            default=[],
+            help="Only run cases whose name starts with this prefix. May be repeated.",
+        )
+        parser.add_argument("--baseline", default=str(BASELINE_PATH))
+        parser.add_argument(
+            "--update-baseline",
+            action="store_true",
+            help="Record the results as the new baseline instead of comparing.",
+        )
+
+    def handle(self, *args, **options):
+        selected = {
+            name: fn
+            for name, fn in cases().items()
+            if not options["case"] or name.startswith(tuple(options["case"]))
+        }
+        if not selected:
+            raise CommandError("No benchmark cases selected")
+
+        # Each case is compared as a multiple of a fixed calibration workload timed
+        # right around it, so neither a faster machine nor a burst of background
+        # load reads as a change in the code
+        results = {
+            name: self.run_case(fn, options["rounds"]) for name, fn in selected.items()
+        }
+
+        if options["update_baseline"]:
+            # A baseline gets the same number of attempts a comparison may use
+            for name, fn in selected.items():
+                for _ in range(CONFIRM_RUNS):
+                    retry = self.run_case(fn, options["rounds"])
+                    if retry["relative"] < results[name]["relative"]:
+                        results[name] = retry
+            self.write_baseline(options["baseline"], results)
+            return
+
+        try:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(
+                f"No baseline at {options['baseline']}; run with --update-baseline first"
+            )
+
+        # Re-run apparent regressions before failing, since one noisy
+        # measurement is far more likely than a real slowdown
+        for name, result in results.items():
+            expected = baseline["cases"].get(name)
+            for _ in range(CONFIRM_RUNS):
+                if expected is None or result["relative"] <= expected["relative"] * (
+                    1 + options["tolerance"]
+                ):
+                    break
+                retry = self.run_case(selected[name], options["rounds"])
+                if retry["relative"] < result["relative"]:
+                    results[name] = result = retry
+
+        regressions = []
+        self.stdout.write(
+            f"{'case':<30}{'best us':>12}{'relative':>10}{'baseline':>10}{'change':>10}"
+        )
+        for name, result in results.items():
+            expected = baseline["cases"].get(name)
+            row = f"{name:<30}{result['best_us']:>12.2f}{result['relative']:>10.3f}"
+            if expected is None:
+                self.stdout.write(f"{row}{'new':>10}")
+                continue
+            change = result["relative"] / expected["relative"] - 1
+            flag = ""
+            if change > options["tolerance"]:
+                regressions.append(name)
+                flag = "  REGRESSION"
+            self.stdout.write(
+                f"{row}{expected['relative']:>10.3f}{change:>+10.0%}{flag}"
+            )
+
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} hot path(s) regressed by more than "
+                f"{options['tolerance']:.0%}: {', '.join(regressions)}"
+            )
+
+    def run_case(self, fn, rounds):
+        calibration = calibrate(rounds)
+        best, median = measure(fn, rounds)
+        calibration = min(calibration, calibrate(rounds))
+        return {
+            "best_us": round(best * 1e6, 2),
+            "median_us": round(median * 1e6, 2),
+            "relative": round(best / calibration, 4),
+        }
+
+    def write_baseline(self, path, results):
+        # Keep the baselines of cases that were not run this time
+        try:
+            with open(path) as f:
+                existing = json.load(f)["cases"]
+        except FileNotFoundError:
+            existing = {}
+        baseline = {
+            "python": platform.python_version(),
+            "cases": {**existing, **results},
+        }
+        with open(path, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        self.stdout.write(f"Wrote baseline for {len(results)} case(s) to {path}")
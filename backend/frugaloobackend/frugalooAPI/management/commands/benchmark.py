@@ -0,0 +1,203 @@
+import asyncio
+import json
+import math
+import time
+import uuid
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+# Endpoints of one user flow, in the order the frontend calls them
+STEPS = [
+    "pre-plan-trip",
+    "generate-trip",
+    "fetch-trip-details",
+    "gemini-suggestions",
+    "generate-message",
+]
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive pre-plan -> generate-trip -> suggestions -> finance chat against a "
+        "running server at a fixed concurrency and report latency percentiles. "
+        "Run the server against `manage.py replay_server` for reproducible numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Number of user flows in flight at once.",
+        )
+        parser.add_argument(
+            "--flows", type=int, default=32, help="Total number of user flows to run."
+        )
+        parser.add_argument("--stay-details", default="Goa")
+        parser.add_argument("--days", type=int, default=3)
+        parser.add_argument("--budget", type=int, default=1)
+        parser.add_argument(
+            "--timeout", type=float, default=600, help="Per-request timeout in seconds."
+        )
+        parser.add_argument(
+            "--output", help="Also write the report as JSON to this path."
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["flows"] < 1:
+            raise CommandError("--concurrency and --flows must be positive")
+
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.completed = 0
+
+        start = time.perf_counter()
+        asyncio.run(self.run(options))
+        elapsed = time.perf_counter() - start
+
+        report = self.build_report(options, elapsed)
+        self.print_report(report)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+
+    async def run(self, options):
+        remaining = iter(range(options["flows"]))
+
+        async def worker(client):
+            for _ in remaining:
+                try:
+                    await self.run_flow(client, options)
+                    self.completed += 1
+                except StepFailed:
+                    pass
+
+        limits = httpx.Limits(max_connections=options["concurrency"] * 2)
+        async with httpx.AsyncClient(
+            base_url=options["base_url"], timeout=options["timeout"], limits=limits
+        ) as client:
+            await asyncio.gather(
+                *(worker(client) for _ in range(options["concurrency"]))
+            )
+
+    async def call(self, client, step, payload):
+        """
+        Posts one step of the flow and records its latency.
+
+        Returns:
+        - Decoded JSON response
+
+        Raises:
+        - StepFailed when the request errors or returns a non-2xx status
+        """
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"/{step}/", json=payload)
+        except httpx.HTTPError as e:
+            self.errors[step] += 1
+            self.stderr.write(f"{step}: {e!r}")
+            raise StepFailed(step)
+        self.latencies[step].append(time.perf_counter() - start)
+
+        if not response.is_success:
+            self.errors[step] += 1
+            self.stderr.write(f"{step}: HTTP {response.status_code} {response.text[:200]}")
+            raise StepFailed(step)
+        return response.json()
+
+    async def run_flow(self, client, options):
+        user_id = f"benchmark-{uuid.uuid4()}"
+        trip = {
+            "user_id": user_id,
+            "stay_details": options["stay_details"],
+            "number_of_days": options["days"],
+            "budget": options["budget"],
+            "additional_preferences": "",
+        }
+
+        preplan = await self.call(client, "pre-plan-trip", trip)
+        plan = await self.call(
+            client,
+            "generate-trip",
+            {**trip, "response_data": preplan["response_data"]},
+        )
+        trips = await self.call(client, "fetch-trip-details", {"user_id": user_id})
+        await self.call(
+            client,
+            "gemini-suggestions",
+            {
+                "trip_id": trips[0]["trip_id"],
+                "current_day": 1,
+                "original_plan": list(json.loads(plan).values()),
+                "user_changes": "Add a cafe near the first place of each day",
+                "budget": options["budget"],
+            },
+        )
+        await self.call(
+            client,
+            "generate-message",
+            {
+                "user_id": user_id,
+                "message": "How much did I spend on each category?",
+                "chat_history": "[]",
+            },
+        )
+
+    def build_report(self, options, elapsed):
+        steps = {}
+        for step in STEPS:
+            values = self.latencies[step]
+            steps[step] = {
+                "requests": len(values),
+                "errors": self.errors[step],
+                **{
+                    f"p{p}_ms": round(percentile(values, p) * 1000, 1) if values else None
+                    for p in (50, 95, 99)
+                },
+            }
+        requests = sum(len(values) for values in self.latencies.values())
+        return {
+            "concurrency": options["concurrency"],
+            "flows": options["flows"],
+            "completed_flows": self.completed,
+            "elapsed_s": round(elapsed, 2),
+            "requests_per_s": round(requests / elapsed, 2),
+            "flows_per_s": round(self.completed / elapsed, 3),
+            "steps": steps,
+        }
+
+    def print_report(self, report):
+        header = f"{'step':<20}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for step, row in report["steps"].items():
+            cells = [
+                "-" if row[key] is None else f"{row[key]:.1f}"
+                for key in ("p50_ms", "p95_ms", "p99_ms")
+            ]
+            self.stdout.write(
+                f"{step:<20}{row['requests']:>9}{row['errors']:>8}"
+                f"{cells[0]:>10}{cells[1]:>10}{cells[2]:>10}"
+            )
+        self.stdout.write("")
+        self.stdout.write(
+            f"{report['completed_flows']}/{report['flows']} flows in "
+            f"{report['elapsed_s']}s at concurrency {report['concurrency']}: "
+            f"{report['requests_per_s']} requests/s, {report['flows_per_s']} flows/s"
+        )
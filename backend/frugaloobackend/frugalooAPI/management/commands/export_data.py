@@ -0,0 +1,66 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from frugalooAPI import exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Write every trip or finance log, or only those of one user, to a "
+        "file as NDJSON or CSV. Rows are read and written a chunk at a time, "
+        "so memory stays constant whatever the size of the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("export", choices=sorted(exports.EXPORTS))
+        parser.add_argument(
+            "--format",
+            dest="output",
+            choices=exports.FORMATS,
+            default="ndjson",
+        )
+        parser.add_argument(
+            "--file",
+            default="-",
+            help="File to write, or - for standard output.",
+        )
+        parser.add_argument(
+            "--user",
+            dest="user_id",
+            help="Only export the rows of this user.",
+        )
+        parser.add_argument(
+            "--database",
+            help="Database alias to read from, such as a replica.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=exports.DEFAULT_CHUNK_SIZE,
+            help="Rows read per query or cursor fetch.",
+        )
+
+    def handle(self, *args, **options):
+        rows = exports.queryset(
+            options["export"], user_id=options["user_id"], using=options["database"]
+        )
+        blocks = exports.stream(
+            options["export"],
+            options["output"],
+            rows,
+            chunk_size=options["chunk_size"],
+        )
+
+        if options["file"] == "-":
+            for block in blocks:
+                sys.stdout.buffer.write(block)
+            sys.stdout.buffer.flush()
+            return
+
+        written = 0
+        with open(options["file"], "wb") as file:
+            for block in blocks:
+                file.write(block)
+                written += len(block)
+        self.stderr.write(f"Wrote {written} bytes to {options['file']}")
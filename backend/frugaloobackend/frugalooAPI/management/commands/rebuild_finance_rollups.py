@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from frugalooAPI import finance
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the FinanceRollup rows from FinanceLog, for every trip or "
+        "only the given trips and/or user. Expenses added to those trips while "
+        "it runs may be missed, so run it again if any were."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--trip",
+            dest="trip_ids",
+            action="append",
+            help="Only rebuild this trip. Can be given several times.",
+        )
+        parser.add_argument(
+            "--user",
+            dest="user_id",
+            help="Only rebuild the rollups of this user.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows read and written per query.",
+        )
+
+    def handle(self, *args, **options):
+        written = finance.rebuild(
+            trip_ids=options["trip_ids"],
+            user_id=options["user_id"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(f"Wrote {written} finance rollups")
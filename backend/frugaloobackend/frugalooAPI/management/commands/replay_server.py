@@ -0,0 +1,79 @@
+import os
+
+from aiohttp import web
+from django.core.management.base import BaseCommand, CommandError
+
+from frugalooAPI.replay import (
+    DEFAULT_LATENCY,
+    DEFAULT_UPSTREAMS,
+    FIXTURE_DIR,
+    FixtureStore,
+    Latency,
+    build_app,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve recorded Places, Gemini and Supabase responses so the API can run "
+        "offline. Point GOOGLE_PLACES_URL, GOOGLE_PLACES_NEW_URL, GEMINI_URL and "
+        "SUPABASE_URL at this server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--fixtures",
+            default=str(FIXTURE_DIR),
+            help="Directory the recordings are read from and written to.",
+        )
+        parser.add_argument(
+            "--latency",
+            action="append",
+            default=[],
+            metavar="SERVICE=SPEC",
+            help=(
+                "Latency added to replayed responses, e.g. gemini=lognormal:2500:0.5, "
+                "places=uniform:50:300 or supabase=fixed:40. Services: "
+                f"{', '.join(DEFAULT_LATENCY)}. May be repeated."
+            ),
+        )
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Forward requests to the real services and record the responses.",
+        )
+        parser.add_argument(
+            "--supabase-upstream",
+            default=os.environ.get("SUPABASE_UPSTREAM_URL"),
+            help="Supabase project URL to record from.",
+        )
+
+    def handle(self, *args, **options):
+        latency = {
+            service: Latency(spec) for service, spec in DEFAULT_LATENCY.items()
+        }
+        for value in options["latency"]:
+            service, _, spec = value.partition("=")
+            if service not in DEFAULT_LATENCY:
+                raise CommandError(f"Unknown service {service!r}")
+            try:
+                latency[service] = Latency(spec)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        upstreams = dict(DEFAULT_UPSTREAMS, supabase=options["supabase_upstream"])
+        app = build_app(
+            FixtureStore(options["fixtures"]),
+            latency,
+            record=options["record"],
+            upstreams=upstreams,
+        )
+
+        mode = "Recording" if options["record"] else "Replaying"
+        self.stdout.write(
+            f"{mode} on http://{options['host']}:{options['port']} "
+            f"({', '.join(f'{s}={l.spec}' for s, l in latency.items())})"
+        )
+        web.run_app(app, host=options["host"], port=options["port"], print=None)
@@ -0,0 +1,79 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from frugalooAPI.jobs import (
+    HEARTBEAT_INTERVAL,
+    MAX_ATTEMPTS,
+    claim_next_job,
+    run_job,
+)
+
+
+class Command(BaseCommand):
+    help = "Run queued generate-trip jobs from the database-backed queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=16,
+            help="Number of jobs run concurrently by this worker.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help=(
+                "Seconds without a heartbeat after which a running job is "
+                "considered abandoned."
+            ),
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=MAX_ATTEMPTS,
+            help="Times an abandoned job is claimed before it is marked failed.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run_workers(options))
+
+    async def run_workers(self, options):
+        await asyncio.gather(
+            *(self.worker(options) for _ in range(options["concurrency"]))
+        )
+
+    async def worker(self, options):
+        while True:
+            # Outside of requests nothing else closes connections that the
+            # pooler or server dropped, or that outlived CONN_MAX_AGE
+            await sync_to_async(close_old_connections)()
+            job = await sync_to_async(claim_next_job)(
+                options["stale_after"], options["max_attempts"]
+            )
+            if job is None:
+                if options["burst"]:
+                    return
+                await asyncio.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Running job {job.job_id}")
+            await sync_to_async(close_old_connections)()
+            await run_job(
+                job, min(HEARTBEAT_INTERVAL, options["stale_after"] / 4)
+            )
+            self.stdout.write(f"Finished job {job.job_id}: {job.status}")
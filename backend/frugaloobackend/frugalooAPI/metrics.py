@@ -0,0 +1,135 @@
+import threading
+from collections import defaultdict
+
+# Every metric registered in this process, rendered in order by render()
+REGISTRY = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """
+    Base class for process-local metrics exposed in the Prometheus text format.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in values]
+
+
+class Gauge(Metric):
+    """
+    Gauge whose values are either set directly or read from a callback at render
+    time. The callback returns a list of (labels dict, value) pairs.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback=None):
+        super().__init__(name, documentation)
+        self._values = {}
+        self._callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        if self._callback is not None:
+            values.extend(
+                (tuple(sorted(labels.items())), value)
+                for labels, value in self._callback()
+            )
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            series = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            ]
+        for key, counts, total, count in series:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = key + (("le", f"{bound:g}"),)
+                lines.append(f"{self.name}_bucket{_format_labels(labels)} {bucket_count}")
+            labels = key + (("le", "+Inf"),)
+            lines.append(f"{self.name}_bucket{_format_labels(labels)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def render():
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
@@ -0,0 +1,237 @@
+import io
+import json
+import random
+import statistics
+import timeit
+import uuid
+from pathlib import Path
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from . import fastjson, llm_output
+from .models import FinanceLog, UserTripInfo
+from .serializers import (
+    FastFinanceLogSerializer,
+    FastTripSummarySerializer,
+    FastUserTripInfoSerializer,
+    FinanceLogSerializer,
+    GeneratedPlanSerializer,
+    TripSummarySerializer,
+    UserTripInfoSerializer,
+)
+from .views import GenerateFinalPlan, GenerateMessageView, GeminiSuggestions
+
+BASELINE_PATH = Path(__file__).resolve().parent / "microbench_baseline.json"
+
+# Shape of the synthetic trip: a long trip with a full restaurant list per stop
+DAYS = 30
+STOPS_PER_DAY = 4
+RESTAURANTS_PER_STOP = 20
+TRIPS_PER_USER = 20
+FINANCE_LOGS_PER_TRIP = 300
+
+
+def synthetic_itinerary(days=DAYS, stops_per_day=STOPS_PER_DAY):
+    """
+    Pre-plan itinerary in the shape Gemini returns for pre-plan-trip.
+    """
+    rng = random.Random(1)
+    return {
+        str(day): [
+            {
+                "place_name": f"Place {day}-{stop}",
+                "description": "A well known landmark, best visited in the morning. " * 2,
+                "TOE": f"{rng.randint(1, 4)} hours",
+                "lat_long": f"{15 + rng.random():.4f}, {73 + rng.random():.4f}",
+            }
+            for stop in range(stops_per_day)
+        ]
+        for day in range(1, days + 1)
+    }
+
+
+def synthetic_merged_plan(itinerary):
+    """
+    Itinerary with a restaurant after every place, as returned by generate-trip.
+    """
+    return {
+        day: [
+            entry
+            for stop in stops
+            for entry in (
+                stop,
+                {
+                    "restaurant_name": f"Restaurant near {stop['place_name']}",
+                    "description": "Seafood and local dishes at a fair price.",
+                    "TOE": "1 hour",
+                    "lat_long": stop["lat_long"],
+                },
+            )
+        ]
+        for day, stops in itinerary.items()
+    }
+
+
+def synthetic_nearby_results(count=RESTAURANTS_PER_STOP):
+    """
+    "results" list of a Places nearbysearch response with mixed price levels.
+    """
+    rng = random.Random(2)
+    results = []
+    for i in range(count):
+        result = {
+            "name": f"Restaurant {i}",
+            "geometry": {"location": {"lat": 15 + rng.random(), "lng": 73 + rng.random()}},
+            "rating": round(rng.uniform(3, 5), 1),
+            "types": ["restaurant", "food", "point_of_interest"],
+            "vicinity": f"{i} Beach Road, Goa",
+        }
+        if i % 3:
+            result["price_level"] = i % 5
+        results.append(result)
+    return results
+
+
+def cases():
+    """
+    Builds the synthetic inputs and returns the hot paths to time.
+
+    Returns:
+    - Dict of case name -> zero-argument callable
+    """
+    planner = GenerateFinalPlan()
+    suggestions = GeminiSuggestions()
+    # Skip __init__, which connects to Supabase
+    message_view = GenerateMessageView.__new__(GenerateMessageView)
+
+    itinerary = synthetic_itinerary()
+    merged_plan = synthetic_merged_plan(itinerary)
+    merged_plan_list = list(merged_plan.values())
+    merged_text = json.dumps(merged_plan)
+    gemini_merged_text = "```json\n" + json.dumps(merged_plan, indent=2) + "\n```"
+    gemini_truncated_text = json.dumps(merged_plan, indent=2)[:-3] + ",\n"
+
+    nearby_results = synthetic_nearby_results()
+    lat_long_values = planner.extract_lat_long(itinerary)
+    nearby_restaurants = {}
+    for place in lat_long_values:
+        nearby_restaurants.setdefault(place["day_index"], {})[
+            place["place_name"]
+        ] = planner.filter_restaurants(nearby_results, 1)
+
+    react_raw = (
+        "Here is the chart for your spending.\n```jsx\n"
+        + "\n".join(
+            f'  <Bar dataKey="amount" name="Day {day}" fill="#8884d8" />'
+            for day in range(DAYS * 4)
+        )
+        + "\n```\nLet me know if you need anything else."
+    )
+
+    trip = UserTripInfo(
+        trip_id=uuid.uuid4(),
+        user_id="benchmark",
+        stay_details="Goa",
+        number_of_days=DAYS,
+        budget=1,
+        additional_preferences="",
+        generated_plan=merged_plan,
+        nearby_restaurants=nearby_restaurants,
+        places_descriptions="Goa is a coastal state known for its beaches.",
+    )
+    trips = [trip] * TRIPS_PER_USER
+    finance_logs = [
+        FinanceLog(
+            id=i,
+            user_id="benchmark",
+            trip_id=str(trip.trip_id),
+            trip_info=trip,
+            amount=i % 97,
+            place=f"Place {i}",
+            category=("Food", "Taxi", "Stay")[i % 3],
+            day=i % DAYS + 1,
+            trip_location="Goa",
+        )
+        for i in range(FINANCE_LOGS_PER_TRIP)
+    ]
+    trip_details = UserTripInfoSerializer(trips, many=True).data
+    update_plan_body = json.dumps(
+        {"trip_id": str(trip.trip_id), "new_plan": merged_plan_list}
+    ).encode()
+
+    return {
+        "extract_lat_long": lambda: planner.extract_lat_long(itinerary),
+        "suggestions.extract_lat_long": lambda: suggestions.extract_lat_long(
+            merged_plan_list
+        ),
+        "filter_restaurants": lambda: [
+            planner.filter_restaurants(nearby_results, 1) for _ in lat_long_values
+        ],
+        "plan.json_dumps": lambda: json.dumps(merged_plan),
+        "plan.json_loads": lambda: json.loads(merged_text),
+        # The same work through fastjson, and the renderer and parser pairs
+        "plan.fastjson_dumps": lambda: fastjson.dumps(merged_plan),
+        "plan.fastjson_loads": lambda: fastjson.loads(merged_text),
+        "render.trip_details.stdlib": lambda: JSONRenderer().render(trip_details),
+        "render.trip_details.fastjson": lambda: fastjson.FastJSONRenderer().render(
+            trip_details
+        ),
+        "parse.update_plan.stdlib": lambda: JSONParser().parse(
+            io.BytesIO(update_plan_body)
+        ),
+        "parse.update_plan.fastjson": lambda: fastjson.FastJSONParser().parse(
+            io.BytesIO(update_plan_body)
+        ),
+        "merge_prompt.str": lambda: str(
+            {"nearby_restaurants": nearby_restaurants, "response_data": itinerary}
+        ),
+        "llm_output.parse_days": lambda: llm_output.parse_days(
+            gemini_merged_text, llm_output.MERGED_STOP
+        ),
+        "llm_output.parse_repaired": lambda: llm_output.parse(
+            gemini_truncated_text, llm_output.MERGED_PLAN
+        ),
+        "extract_chart_data": lambda: message_view.extract_chart_data(react_raw),
+        "serialize.trip_details": lambda: UserTripInfoSerializer(trips, many=True).data,
+        # The fast serializers read the same instances here; in the views they
+        # read values_list() rows and skip building the instances too
+        "serialize.trip_details.fast": lambda: FastUserTripInfoSerializer(trips).data,
+        "serialize.trip_summaries": lambda: TripSummarySerializer(
+            trips, many=True
+        ).data,
+        "serialize.trip_summaries.fast": lambda: FastTripSummarySerializer(
+            trips, fields=TripSummarySerializer.SUMMARY_FIELDS
+        ).data,
+        "serialize.finance_logs": lambda: FinanceLogSerializer(
+            finance_logs, many=True
+        ).data,
+        "serialize.finance_logs.fast": lambda: FastFinanceLogSerializer(
+            finance_logs
+        ).data,
+        "serialize.plan": lambda: GeneratedPlanSerializer(trip).data,
+    }
+
+
+def calibrate(rounds):
+    """
+    Times a fixed pure-Python workload so results can be compared across machines.
+
+    Returns:
+    - float: Best time of the workload in seconds
+    """
+    timer = timeit.Timer(lambda: sorted(str(i) for i in range(2000)))
+    return min(timer.repeat(rounds, 200)) / 200
+
+
+def measure(fn, rounds):
+    """
+    Times fn, picking a loop count that runs for at least 0.2s per round.
+
+    Returns:
+    - (best, median) seconds per call
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(rounds, number)]
+    return min(times), statistics.median(times)
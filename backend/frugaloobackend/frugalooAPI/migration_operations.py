@@ -0,0 +1,75 @@
+from django.contrib.postgres.operations import AddIndexConcurrently as PgAddIndexConcurrently
+from django.db import migrations
+
+# Migrations on populated tables run outside a single transaction. Each
+# statement waits at most this long for its lock instead of queueing every
+# other query on the table behind a long-running transaction.
+LOCK_TIMEOUT = "5s"
+
+
+class AddIndexConcurrently(PgAddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, a plain AddIndex elsewhere.
+
+    Builds the index without blocking writes to the table. Must be used in a
+    migration with atomic = False.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+
+def postgres_sql(forwards, backwards=None):
+    """
+    RunPython operation that executes raw SQL on PostgreSQL only.
+
+    Used for statements with no portable equivalent, such as adding a foreign
+    key NOT VALID and validating it separately.
+    """
+
+    def run(statements):
+        def execute(apps, schema_editor):
+            if schema_editor.connection.vendor != "postgresql":
+                return
+            for statement in statements:
+                schema_editor.execute(statement)
+
+        return execute
+
+    return migrations.RunPython(
+        run(forwards), run(backwards) if backwards else migrations.RunPython.noop
+    )
+
+
+def set_lock_timeout():
+    return postgres_sql(
+        [f"SET lock_timeout = '{LOCK_TIMEOUT}'"], ["RESET lock_timeout"]
+    )
+
+
+def set_local_lock_timeout():
+    """
+    LOCK_TIMEOUT for an atomic migration, lasting until its transaction
+    commits or rolls back.
+    """
+    return postgres_sql(
+        [f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"],
+        [f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"],
+    )
+
+
+def reset_lock_timeout():
+    return postgres_sql(
+        ["RESET lock_timeout"], [f"SET lock_timeout = '{LOCK_TIMEOUT}'"]
+    )
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.13 on 2026-10-19 04:32
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frugalooAPI', '0016_usertripinfo_places_descriptions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('user_id', models.CharField(max_length=255)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('stage', models.CharField(default='', max_length=64)),
+                ('attempts', models.IntegerField(default=0)),
+                ('result', models.TextField(default='')),
+                ('error', models.TextField(default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='frugalooAPI_status_1854e9_idx')],
+            },
+        ),
+    ]
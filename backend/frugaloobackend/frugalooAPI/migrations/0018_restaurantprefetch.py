@@ -0,0 +1,26 @@
+# Generated by Django 4.2.13 on 2026-10-19 04:33
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frugalooAPI', '0017_tripgenerationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantPrefetch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('budget', models.IntegerField(null=True)),
+                ('lat_long_values', models.JSONField()),
+                ('nearby_restaurants', models.JSONField(null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
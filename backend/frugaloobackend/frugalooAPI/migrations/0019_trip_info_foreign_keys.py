@@ -0,0 +1,140 @@
+import uuid
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+from frugalooAPI.migration_operations import (
+    postgres_sql,
+    reset_lock_timeout,
+    set_lock_timeout,
+)
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Foreign keys are added NOT VALID, which only takes a brief lock, and then
+# validated, which scans the table without blocking reads or writes.
+ADD_CONSTRAINTS = [
+    'ALTER TABLE "frugalooAPI_usertripprogressinfo" ADD CONSTRAINT "progress_trip_info_fk" '
+    'FOREIGN KEY ("trip_info_id") REFERENCES "frugalooAPI_usertripinfo" ("trip_id") '
+    "DEFERRABLE INITIALLY DEFERRED NOT VALID",
+    'ALTER TABLE "frugalooAPI_usertripprogressinfo" VALIDATE CONSTRAINT "progress_trip_info_fk"',
+    'ALTER TABLE "frugalooAPI_financelog" ADD CONSTRAINT "financelog_trip_info_fk" '
+    'FOREIGN KEY ("trip_info_id") REFERENCES "frugalooAPI_usertripinfo" ("trip_id") '
+    "DEFERRABLE INITIALLY DEFERRED NOT VALID",
+    'ALTER TABLE "frugalooAPI_financelog" VALIDATE CONSTRAINT "financelog_trip_info_fk"',
+]
+DROP_CONSTRAINTS = [
+    'ALTER TABLE "frugalooAPI_usertripprogressinfo" DROP CONSTRAINT "progress_trip_info_fk"',
+    'ALTER TABLE "frugalooAPI_financelog" DROP CONSTRAINT "financelog_trip_info_fk"',
+]
+
+
+def backfill_trip_info(apps, schema_editor):
+    """
+    Copies the string trip_id into trip_info in batches, one transaction per batch.
+
+    Rows whose trip_id is not a UUID of an existing trip are left with a null
+    trip_info.
+    """
+    UserTripInfo = apps.get_model("frugalooAPI", "UserTripInfo")
+    for model_name in ("UserTripProgressInfo", "FinanceLog"):
+        model = apps.get_model("frugalooAPI", model_name)
+        last_id = 0
+        while True:
+            batch = list(
+                model.objects.filter(id__gt=last_id, trip_info__isnull=True)
+                .order_by("id")
+                .values_list("id", "trip_id")[:BACKFILL_BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            ids_by_trip = {}
+            for row_id, trip_id in batch:
+                try:
+                    ids_by_trip.setdefault(uuid.UUID(trip_id), []).append(row_id)
+                except (TypeError, ValueError):
+                    continue
+            existing = UserTripInfo.objects.filter(
+                trip_id__in=ids_by_trip
+            ).values_list("trip_id", flat=True)
+
+            with transaction.atomic():
+                for trip_id in existing:
+                    model.objects.filter(id__in=ids_by_trip[trip_id]).update(
+                        trip_info_id=trip_id
+                    )
+
+
+class Migration(migrations.Migration):
+    # Runs outside one big transaction so the backfill commits batch by batch
+    # and no lock is held for the length of the migration.
+    atomic = False
+
+    dependencies = [
+        ("frugalooAPI", "0018_restaurantprefetch"),
+    ]
+
+    operations = [
+        set_lock_timeout(),
+        # Nullable columns without a default or constraint are added without
+        # rewriting the table
+        migrations.AddField(
+            model_name="usertripprogressinfo",
+            name="trip_info",
+            field=models.ForeignKey(
+                db_constraint=False,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="progress",
+                to="frugalooAPI.usertripinfo",
+                to_field="trip_id",
+            ),
+        ),
+        migrations.AddField(
+            model_name="financelog",
+            name="trip_info",
+            field=models.ForeignKey(
+                db_constraint=False,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="finance_logs",
+                to="frugalooAPI.usertripinfo",
+                to_field="trip_id",
+            ),
+        ),
+        migrations.RunPython(backfill_trip_info, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[postgres_sql(ADD_CONSTRAINTS, DROP_CONSTRAINTS)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="usertripprogressinfo",
+                    name="trip_info",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress",
+                        to="frugalooAPI.usertripinfo",
+                        to_field="trip_id",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="financelog",
+                    name="trip_info",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="finance_logs",
+                        to="frugalooAPI.usertripinfo",
+                        to_field="trip_id",
+                    ),
+                ),
+            ],
+        ),
+        reset_lock_timeout(),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+from frugalooAPI.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("frugalooAPI", "0019_trip_info_foreign_keys"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="usertripinfo",
+            index=models.Index(fields=["user_id", "id"], name="tripinfo_user_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="usertripprogressinfo",
+            index=models.Index(fields=["trip_info", "id"], name="progress_trip_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="financelog",
+            index=models.Index(
+                fields=["user_id", "trip_info"], name="financelog_user_trip_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="financelog",
+            index=models.Index(fields=["trip_info", "day"], name="financelog_trip_day_idx"),
+        ),
+    ]
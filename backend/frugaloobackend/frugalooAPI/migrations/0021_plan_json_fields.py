@@ -0,0 +1,132 @@
+import ast
+import json
+
+from django.db import migrations, models
+
+from frugalooAPI.migration_operations import set_local_lock_timeout
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def parse_stored(value):
+    """
+    Parses a text column into JSON: generated_plan holds a JSON string and
+    nearby_restaurants the str() of a Python dict.
+
+    Values that are neither are kept as a JSON string so nothing is lost.
+    """
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        return json.loads(json.dumps(ast.literal_eval(value)))
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return value
+
+
+def copy_in_batches(apps, convert, source, target):
+    UserTripInfo = apps.get_model("frugalooAPI", "UserTripInfo")
+    last_id = 0
+    while True:
+        batch = list(
+            UserTripInfo.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", *source)[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        for trip in batch:
+            for source_field, target_field in zip(source, target):
+                setattr(trip, target_field, convert(getattr(trip, source_field)))
+            trip.save(update_fields=target)
+
+
+def backfill_json(apps, schema_editor):
+    copy_in_batches(
+        apps,
+        parse_stored,
+        ["generated_plan", "nearby_restaurants"],
+        ["generated_plan_json", "nearby_restaurants_json"],
+    )
+
+
+def backfill_text(apps, schema_editor):
+    copy_in_batches(
+        apps,
+        lambda value: value if isinstance(value, str) else json.dumps(value),
+        ["generated_plan_json", "nearby_restaurants_json"],
+        ["generated_plan", "nearby_restaurants"],
+    )
+
+
+class Migration(migrations.Migration):
+    # Runs in one transaction so a failure, such as a lock timeout, leaves the
+    # text columns untouched and the migration can simply be run again. The
+    # columns change type under code that reads and writes them and the table
+    # stays locked until the backfill commits, so apply it with the app
+    # stopped (maintenance window) and deploy the JSONField code with it.
+    # Batches only bound the memory used by the backfill.
+
+    dependencies = [
+        ("frugalooAPI", "0020_trip_lookup_indexes"),
+    ]
+
+    operations = [
+        set_local_lock_timeout(),
+        migrations.AddField(
+            model_name="usertripinfo",
+            name="generated_plan_json",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name="usertripinfo",
+            name="nearby_restaurants_json",
+            field=models.JSONField(null=True),
+        ),
+        # Lets the text columns be added back empty when migrating backwards,
+        # before backfill_text fills them in
+        migrations.AlterField(
+            model_name="usertripinfo",
+            name="generated_plan",
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="usertripinfo",
+            name="nearby_restaurants",
+            field=models.TextField(default="", null=True),
+        ),
+        migrations.RunPython(backfill_json, backfill_text),
+        migrations.RemoveField(
+            model_name="usertripinfo",
+            name="generated_plan",
+        ),
+        migrations.RemoveField(
+            model_name="usertripinfo",
+            name="nearby_restaurants",
+        ),
+        migrations.RenameField(
+            model_name="usertripinfo",
+            old_name="generated_plan_json",
+            new_name="generated_plan",
+        ),
+        migrations.RenameField(
+            model_name="usertripinfo",
+            old_name="nearby_restaurants_json",
+            new_name="nearby_restaurants",
+        ),
+        migrations.AlterField(
+            model_name="usertripinfo",
+            name="generated_plan",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AlterField(
+            model_name="usertripinfo",
+            name="nearby_restaurants",
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.13 on 2026-10-19 05:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frugalooAPI', '0021_plan_json_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32)),
+                ('order', models.IntegerField()),
+                ('trip_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='frugalooAPI.usertripinfo', to_field='trip_id')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TripStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.IntegerField()),
+                ('kind', models.CharField(choices=[('place', 'Place'), ('restaurant', 'Restaurant'), ('night_club', 'Night club')], max_length=16)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(default='')),
+                ('toe_minutes', models.IntegerField(null=True)),
+                ('lat', models.FloatField(null=True)),
+                ('lng', models.FloatField(null=True)),
+                ('day', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stops', to='frugalooAPI.tripday')),
+                ('trip_info', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stops', to='frugalooAPI.usertripinfo', to_field='trip_id')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trip_info', 'kind'], name='tripstop_trip_kind_idx'), models.Index(fields=['lat', 'lng'], name='tripstop_lat_lng_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tripstop',
+            constraint=models.UniqueConstraint(fields=('day', 'order'), name='tripstop_day_order_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tripday',
+            constraint=models.UniqueConstraint(fields=('trip_info', 'order'), name='tripday_trip_order_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tripday',
+            constraint=models.UniqueConstraint(fields=('trip_info', 'key'), name='tripday_trip_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-19 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frugalooAPI', '0022_trip_days_and_stops'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usertripinfo',
+            name='plan_version',
+            field=models.IntegerField(default=1),
+        ),
+    ]
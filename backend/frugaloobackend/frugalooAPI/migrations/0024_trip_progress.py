@@ -0,0 +1,64 @@
+# Generated by Django 4.2.13 on 2026-10-19 05:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_trip_progress(apps, schema_editor):
+    """
+    Builds the current progress of every (trip, user) from the history rows,
+    replacing any already there so it can be run again.
+    """
+    UserTripProgressInfo = apps.get_model("frugalooAPI", "UserTripProgressInfo")
+    TripProgress = apps.get_model("frugalooAPI", "TripProgress")
+
+    progress = {}
+    history = (
+        UserTripProgressInfo.objects.filter(trip_info__isnull=False, day__isnull=False)
+        .order_by("id")
+        .values_list("trip_info_id", "user_id", "day")
+    )
+    for trip_id, user_id, day in history.iterator(chunk_size=2000):
+        completed_days = progress.setdefault((trip_id, user_id), [])
+        if day not in completed_days:
+            completed_days.append(day)
+
+    TripProgress.objects.all().delete()
+    TripProgress.objects.bulk_create(
+        (
+            TripProgress(
+                trip_info_id=trip_id,
+                user_id=user_id,
+                completed_days=completed_days,
+                last_completed_day=completed_days[-1],
+            )
+            for (trip_id, user_id), completed_days in progress.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frugalooAPI', '0023_trip_plan_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=255)),
+                ('completed_days', models.JSONField(default=list)),
+                ('last_completed_day', models.IntegerField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trip_info', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='current_progress', to='frugalooAPI.usertripinfo', to_field='trip_id')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tripprogress',
+            constraint=models.UniqueConstraint(fields=('trip_info', 'user_id'), name='tripprogress_trip_user_uniq'),
+        ),
+        migrations.RunPython(backfill_trip_progress, migrations.RunPython.noop),
+    ]
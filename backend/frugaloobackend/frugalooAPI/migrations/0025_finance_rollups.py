@@ -0,0 +1,52 @@
+# Generated by Django 4.2.13 on 2026-10-19 05:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_finance_rollups(apps, schema_editor):
+    """
+    Sums every FinanceLog with a trip into its (user, trip, day, category)
+    rollup, replacing any already there so it can be run again.
+    """
+    FinanceLog = apps.get_model("frugalooAPI", "FinanceLog")
+    FinanceRollup = apps.get_model("frugalooAPI", "FinanceRollup")
+
+    totals = (
+        FinanceLog.objects.filter(trip_info__isnull=False)
+        .values("user_id", "trip_info_id", "day", "category")
+        .annotate(total_amount=models.Sum("amount"), entry_count=models.Count("id"))
+        .order_by()
+    )
+    FinanceRollup.objects.all().delete()
+    FinanceRollup.objects.bulk_create(
+        (FinanceRollup(**row) for row in totals.iterator(chunk_size=2000)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('frugalooAPI', '0024_trip_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=255)),
+                ('day', models.IntegerField()),
+                ('category', models.CharField(max_length=255)),
+                ('total_amount', models.BigIntegerField(default=0)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('trip_info', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='finance_rollups', to='frugalooAPI.usertripinfo', to_field='trip_id')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='financerollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'trip_info', 'day', 'category'), name='financerollup_key_uniq'),
+        ),
+        migrations.RunPython(backfill_finance_rollups, migrations.RunPython.noop),
+    ]
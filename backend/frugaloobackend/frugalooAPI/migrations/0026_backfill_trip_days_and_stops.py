@@ -0,0 +1,125 @@
+import re
+
+from django.db import migrations, transaction
+
+BACKFILL_BATCH_SIZE = 200
+
+# A copy of frugalooAPI.itinerary's parsing as of this migration, so later
+# changes to it do not change what the backfill does
+
+NAME_FIELDS = [
+    ("place_name", "place"),
+    ("restaurant_name", "restaurant"),
+    ("night_club_name", "night_club"),
+]
+
+TOE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(h|m)", re.IGNORECASE)
+
+
+def parse_toe(value):
+    matches = TOE_PATTERN.findall(str(value or ""))
+    if not matches:
+        return None
+    return round(
+        sum(float(amount) * (60 if unit.lower() == "h" else 1) for amount, unit in matches)
+    )
+
+
+def parse_lat_long(value):
+    try:
+        lat, lng = (float(part) for part in str(value).split(","))
+    except (TypeError, ValueError):
+        return None, None
+    return lat, lng
+
+
+def parse_stop(stop):
+    if not isinstance(stop, dict):
+        return None
+    kind, name = "place", ""
+    for field, field_kind in NAME_FIELDS:
+        if stop.get(field):
+            kind, name = field_kind, str(stop[field])
+            break
+    lat, lng = parse_lat_long(stop.get("lat_long"))
+    return {
+        "kind": kind,
+        "name": name[:255],
+        "description": str(stop.get("description") or ""),
+        "toe_minutes": parse_toe(stop.get("TOE")),
+        "lat": lat,
+        "lng": lng,
+    }
+
+
+def parse_plan(plan):
+    """
+    Returns:
+    - List of (day key, list of TripStop field dicts) in plan order
+    """
+    if isinstance(plan, dict):
+        days = [(str(key), stops) for key, stops in plan.items()]
+    elif isinstance(plan, list):
+        days = [(str(index), stops) for index, stops in enumerate(plan)]
+    else:
+        return []
+    return [
+        (key, [fields for fields in map(parse_stop, stops) if fields])
+        for key, stops in days
+        if isinstance(stops, list)
+    ]
+
+
+def backfill_days_and_stops(apps, schema_editor):
+    """
+    Creates the TripDay and TripStop rows of existing trips from their
+    generated_plan, one transaction per batch of trips. Trips that already
+    have days are skipped, so it can be run again after a partial failure.
+    """
+    UserTripInfo = apps.get_model("frugalooAPI", "UserTripInfo")
+    TripDay = apps.get_model("frugalooAPI", "TripDay")
+    TripStop = apps.get_model("frugalooAPI", "TripStop")
+    last_id = 0
+    while True:
+        batch = list(
+            UserTripInfo.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "trip_id", "generated_plan")[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        with transaction.atomic():
+            done = set(
+                TripDay.objects.filter(
+                    trip_info_id__in=[trip_id for _, trip_id, _ in batch]
+                ).values_list("trip_info_id", flat=True)
+            )
+            for _, trip_id, plan in batch:
+                if trip_id in done:
+                    continue
+                parsed = parse_plan(plan)
+                days = TripDay.objects.bulk_create(
+                    TripDay(trip_info_id=trip_id, key=key, order=order)
+                    for order, (key, _) in enumerate(parsed)
+                )
+                TripStop.objects.bulk_create(
+                    TripStop(trip_info_id=trip_id, day=day, order=order, **fields)
+                    for day, (_, stops) in zip(days, parsed)
+                    for order, fields in enumerate(stops)
+                )
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch. It is kept apart from the tables'
+    # creation in 0022, which is atomic, so a failed run can simply be re-run.
+    atomic = False
+
+    dependencies = [
+        ('frugalooAPI', '0025_finance_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_days_and_stops, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,128 @@
-from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.db import connections, models, transaction
+import math
 import uuid
 
-#User's trip information model
+
+class JSONBSet(models.Func):
+    """
+    jsonb_set(target, path, new_value, create_missing)
+    """
+
+    function = "jsonb_set"
+    output_field = models.JSONField()
+
+
+class JSONBPath(models.Func):
+    """
+    target #> path: the JSON value at path, or NULL when it does not exist.
+
+    Unlike a KeyTransform, the path is matched as an object key or an array
+    index depending on the value, so it works for plans stored either way.
+    """
+
+    template = "(%(expressions)s)"
+    arg_joiner = " #> "
+    output_field = models.JSONField()
+
+
+def json_path(*keys):
+    return models.Value([str(key) for key in keys], output_field=ArrayField(models.TextField()))
+
+
+class UserTripInfoQuerySet(models.QuerySet):
+    def metadata(self):
+        """
+        Trips without their large payload columns (UserTripInfo.PAYLOAD_FIELDS),
+        for reads that only need the trip's details. The payloads are still
+        loaded on access, one query per trip.
+        """
+        return self.defer(*UserTripInfo.PAYLOAD_FIELDS)
+
+    def stay_details(self):
+        """
+        Returns:
+        - {trip_id: stay_details} of the trips, read in one narrow query
+        """
+        return dict(self.values_list("trip_id", "stay_details"))
+
+    def set_plan_day(self, day, stops):
+        """
+        Replaces a single day of generated_plan in place.
+
+        On PostgreSQL this is one UPDATE using jsonb_set, so the rest of the
+        plan never leaves the database. The day is the plan's own key, or its
+        index when the plan is stored as a list.
+
+        Advances plan_version like any other write of the plan.
+
+        Returns:
+        - Number of trips updated; trips without that day are left untouched
+        """
+        if connections[self.db].vendor != "postgresql":
+            return self._set_plan_day_in_python(day, stops)
+
+        path = json_path(day)
+        return (
+            self.annotate(current_day=JSONBPath(models.F("generated_plan"), path))
+            .filter(current_day__isnull=False)
+            .update(
+                generated_plan=JSONBSet(
+                    models.F("generated_plan"),
+                    path,
+                    models.Value(stops, output_field=models.JSONField()),
+                    models.Value(False),
+                ),
+                plan_version=models.F("plan_version") + 1,
+            )
+        )
+
+    def _set_plan_day_in_python(self, day, stops):
+        # Read-modify-write fallback for databases without jsonb_set
+        updated = 0
+        with transaction.atomic(using=self.db):
+            for trip in self.select_for_update().only("id", "generated_plan", "plan_version"):
+                plan = trip.generated_plan
+                if isinstance(plan, dict) and str(day) in plan:
+                    plan[str(day)] = stops
+                elif isinstance(plan, list) and str(day).isdigit() and int(day) < len(plan):
+                    plan[int(day)] = stops
+                else:
+                    continue
+                trip.plan_version = models.F("plan_version") + 1
+                trip.save(update_fields=["generated_plan", "plan_version"])
+                updated += 1
+        return updated
+
+    def plan_day(self, day):
+        """
+        Returns:
+        - (stops, plan_version) for one day of the trip's plan, read from the
+          database without loading the rest of the plan, or None
+        """
+        if connections[self.db].vendor != "postgresql":
+            trip = self.only("generated_plan", "plan_version").first()
+            if trip is None:
+                return None
+            plan, stops = trip.generated_plan, None
+            if isinstance(plan, list):
+                if str(day).isdigit() and int(day) < len(plan):
+                    stops = plan[int(day)]
+            elif isinstance(plan, dict):
+                stops = plan.get(str(day))
+            return None if stops is None else (stops, trip.plan_version)
+
+        row = (
+            self.annotate(day_plan=JSONBPath(models.F("generated_plan"), json_path(day)))
+            .values_list("day_plan", "plan_version")
+            .first()
+        )
+        return None if row is None or row[0] is None else row
+
+
+#User's trip information model. generated_plan is the itinerary keyed by day
+#(or a list of days once edited), nearby_restaurants the Places results it was
+#built from.
 class UserTripInfo(models.Model):
     trip_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     user_id = models.CharField(max_length=255)
@@ -9,31 +130,237 @@ class UserTripInfo(models.Model):
     number_of_days = models.IntegerField()
     budget = models.IntegerField()
     additional_preferences = models.CharField(max_length=255)
-    generated_plan = models.TextField()
-    nearby_restaurants = models.TextField(default="")
+    generated_plan = models.JSONField(default=dict)
+    nearby_restaurants = models.JSONField(default=dict)
     places_descriptions = models.TextField(default="")
+    # Advanced on every write of generated_plan; part of the plan's ETag
+    plan_version = models.IntegerField(default=1)
 
+    # Columns that can run to megabytes; deferred by objects.metadata()
+    PAYLOAD_FIELDS = ("generated_plan", "nearby_restaurants", "places_descriptions")
 
-#User's progress information model
+    objects = UserTripInfoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["user_id", "id"], name="tripinfo_user_idx")]
+
+
+#User's progress history: one row per progress update, never changed
+#afterwards. trip_id is the legacy string copy of the trip's UUID, kept for
+#older clients; lookups go through trip_info. The current state is kept in
+#TripProgress.
 class UserTripProgressInfo(models.Model):
     progress_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     user_id = models.CharField(max_length=255)
     trip_id = models.CharField(max_length=255)
+    trip_info = models.ForeignKey(
+        UserTripInfo,
+        to_field="trip_id",
+        on_delete=models.CASCADE,
+        null=True,
+        db_index=False,
+        related_name="progress",
+    )
     day = models.IntegerField(null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["trip_info", "id"], name="progress_trip_idx")]
+
+
+#Current progress of a user through a trip, upserted alongside every
+#UserTripProgressInfo row so reads are a single-row lookup
+class TripProgress(models.Model):
+    user_id = models.CharField(max_length=255)
+    trip_info = models.ForeignKey(
+        UserTripInfo,
+        to_field="trip_id",
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="current_progress",
+    )
+    # Days marked complete, in the order they were completed
+    completed_days = models.JSONField(default=list)
+    last_completed_day = models.IntegerField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["trip_info", "user_id"], name="tripprogress_trip_user_uniq"
+            )
+        ]
 
+
+#User's expense model. trip_id is the legacy string copy of trip_info's UUID.
 class FinanceLog(models.Model):
     user_id = models.CharField(max_length=255)
     trip_id = models.CharField(max_length=255)
+    trip_info = models.ForeignKey(
+        UserTripInfo,
+        to_field="trip_id",
+        on_delete=models.CASCADE,
+        null=True,
+        db_index=False,
+        related_name="finance_logs",
+    )
     amount = models.IntegerField()
     place = models.CharField(max_length=255)
     category = models.CharField(max_length=255)
     day = models.IntegerField()
     trip_location = models.CharField(max_length=255, default="")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_id", "trip_info"], name="financelog_user_trip_idx"),
+            models.Index(fields=["trip_info", "day"], name="financelog_trip_day_idx"),
+        ]
+
+
+#Running totals of FinanceLog per (user, trip, day, category), incremented by
+#finance.record_expenses in the same transaction as the logs themselves and
+#recomputed from them by the rebuild_finance_rollups command
+class FinanceRollup(models.Model):
+    user_id = models.CharField(max_length=255)
+    trip_info = models.ForeignKey(
+        UserTripInfo,
+        to_field="trip_id",
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="finance_rollups",
+    )
+    day = models.IntegerField()
+    category = models.CharField(max_length=255)
+    total_amount = models.BigIntegerField(default=0)
+    entry_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_id", "trip_info", "day", "category"],
+                name="financerollup_key_uniq",
+            )
+        ]
+
+
+class TripStopQuerySet(models.QuerySet):
+    def within(self, lat, lng, km):
+        """
+        Stops inside the bounding box of a circle of km around (lat, lng).
+
+        The box is a close enough approximation at the distances a trip spans
+        and lets the lat/lng index do the work.
+        """
+        lat_delta = km / 111.32
+        lng_delta = km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+        return self.filter(
+            lat__range=(lat - lat_delta, lat + lat_delta),
+            lng__range=(lng - lng_delta, lng + lng_delta),
+        )
+
+
+#One day of a trip's itinerary, mirrored from generated_plan by itinerary.sync_plan.
+#key is the day's key in the plan (its index when the plan is a list).
+class TripDay(models.Model):
+    trip_info = models.ForeignKey(
+        UserTripInfo, to_field="trip_id", on_delete=models.CASCADE, related_name="days"
+    )
+    key = models.CharField(max_length=32)
+    order = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["trip_info", "order"], name="tripday_trip_order_uniq"),
+            models.UniqueConstraint(fields=["trip_info", "key"], name="tripday_trip_key_uniq"),
+        ]
+
+
+#One stop of a day. trip_info is repeated from the day so a trip's stops can be
+#queried without a join.
+class TripStop(models.Model):
+    PLACE = "place"
+    RESTAURANT = "restaurant"
+    NIGHT_CLUB = "night_club"
+    KIND_CHOICES = [
+        (PLACE, "Place"),
+        (RESTAURANT, "Restaurant"),
+        (NIGHT_CLUB, "Night club"),
+    ]
+
+    trip_info = models.ForeignKey(
+        UserTripInfo,
+        to_field="trip_id",
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="stops",
+    )
+    day = models.ForeignKey(
+        TripDay, on_delete=models.CASCADE, db_index=False, related_name="stops"
+    )
+    order = models.IntegerField()
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255)
+    description = models.TextField(default="")
+    toe_minutes = models.IntegerField(null=True)
+    lat = models.FloatField(null=True)
+    lng = models.FloatField(null=True)
+
+    objects = TripStopQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "order"], name="tripstop_day_order_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["trip_info", "kind"], name="tripstop_trip_kind_idx"),
+            models.Index(fields=["lat", "lng"], name="tripstop_lat_lng_idx"),
+        ]
+
 
 class MessageLog(models.Model):
     user_id = models.CharField(max_length=255)
     question = models.CharField(max_length=255)
     sql_query = models.TextField()
 
+
+
+#Background generate-trip job, queued in the database and run by run_generation_jobs
+class TripGenerationJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    user_id = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    stage = models.CharField(max_length=64, default="")
+    attempts = models.IntegerField(default=0)
+    result = models.TextField(default="")
+    error = models.TextField(default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+
+#Restaurants fetched speculatively after a pre-plan, consumed by generate-trip
+class RestaurantPrefetch(models.Model):
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (READY, "Ready"), (FAILED, "Failed")]
+
+    token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    budget = models.IntegerField(null=True)
+    lat_long_values = models.JSONField()
+    nearby_restaurants = models.JSONField(null=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    expires_at = models.DateTimeField(db_index=True)
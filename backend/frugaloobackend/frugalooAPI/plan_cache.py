@@ -0,0 +1,57 @@
+import uuid
+
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from . import fastjson, timing
+from .caching import PLANS
+from .models import UserTripInfo
+
+
+def _parts(trip_id):
+    return (str(uuid.UUID(str(trip_id))),)
+
+
+def _load(trip_id):
+    # Cast to text in the database, so the plan is never parsed on the way out
+    with timing.span("db.fetch"):
+        row = (
+            UserTripInfo.objects.filter(trip_id=trip_id)
+            .annotate(plan_json=Cast("generated_plan", TextField()))
+            .values_list("plan_json", "plan_version")
+            .first()
+        )
+    if row is None:
+        return None
+    plan_json, plan_version = row
+    return {"plan_json": plan_json, "plan_version": plan_version}
+
+
+def get_plan(trip_id):
+    """
+    Read-through lookup of a trip's plan in the PLANS cache namespace, loaded
+    from the database by one request at a time on a miss.
+
+    Returns:
+    - {"plan_json": <the plan as JSON text>, "plan_version": int}, or None if
+      the trip does not exist
+    """
+    return PLANS.get_or_set(_parts(trip_id), lambda: _load(trip_id))
+
+
+def generated_plan(plan):
+    """
+    Returns:
+    - The generated_plan string sent to clients (see JSONStringField) for a
+      plan from get_plan(): its JSON text, or the string itself for plans
+      stored as a JSON string
+    """
+    plan_json = plan["plan_json"]
+    return fastjson.loads(plan_json) if plan_json.startswith('"') else plan_json
+
+
+def invalidate(trip_id):
+    """
+    Drops the cached plan of a trip. Call it after every write of the plan.
+    """
+    PLANS.delete(_parts(trip_id))
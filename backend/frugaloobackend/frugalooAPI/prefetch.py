@@ -0,0 +1,85 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import RestaurantPrefetch
+
+# How long (seconds) warm restaurant results stay usable by generate-trip.
+PREFETCH_TTL = 600
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="restaurant-prefetch")
+
+
+def start_restaurant_prefetch(fetch, lat_long_values, budget):
+    """
+    Starts fetching nearby restaurants in the background for a pre-plan.
+
+    Parameters:
+    - fetch: Coroutine function taking (lat_long_values, budget), normally
+      GenerateFinalPlan.fetch_nearby_restaurants
+    - lat_long_values: Stops extracted from the pre-plan
+    - budget: Budget type used to filter the restaurants
+
+    Returns:
+    - str: Token that generate-trip can pass as prefetch_token
+    """
+    now = timezone.now()
+    RestaurantPrefetch.objects.filter(expires_at__lt=now).delete()
+    prefetch = RestaurantPrefetch.objects.create(
+        budget=budget,
+        lat_long_values=lat_long_values,
+        expires_at=now + timedelta(seconds=PREFETCH_TTL),
+    )
+    _executor.submit(_run_prefetch, prefetch.token, fetch, lat_long_values, budget)
+    return str(prefetch.token)
+
+
+def _run_prefetch(token, fetch, lat_long_values, budget):
+    try:
+        nearby_restaurants = asyncio.run(fetch(lat_long_values, budget))
+        RestaurantPrefetch.objects.filter(token=token).update(
+            status=RestaurantPrefetch.READY, nearby_restaurants=nearby_restaurants
+        )
+    except Exception:
+        RestaurantPrefetch.objects.filter(token=token).update(
+            status=RestaurantPrefetch.FAILED
+        )
+    finally:
+        close_old_connections()
+
+
+def take_prefetched_restaurants(token, lat_long_values, budget):
+    """
+    Returns the warm restaurant results for a prefetch token, if usable.
+
+    Results are only reused when the prefetch finished, has not expired, and was
+    made for the same stops and budget; otherwise the caller fetches live.
+
+    Returns:
+    - dict of nearby restaurants, or None
+    """
+    if not token:
+        return None
+    try:
+        token = uuid.UUID(str(token))
+    except ValueError:
+        return None
+
+    prefetch = RestaurantPrefetch.objects.filter(
+        token=token,
+        status=RestaurantPrefetch.READY,
+        expires_at__gte=timezone.now(),
+    ).first()
+    if (
+        prefetch is None
+        or prefetch.budget != budget
+        or prefetch.lat_long_values != lat_long_values
+    ):
+        return None
+
+    prefetch.delete()
+    return prefetch.nearby_restaurants
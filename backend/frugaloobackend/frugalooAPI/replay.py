@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from pathlib import Path
+from urllib.parse import urlencode
+
+import httpx
+from aiohttp import web
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "replay_fixtures"
+
+# Header the Gemini REST client sends so recordings can be told apart by operation
+OPERATION_HEADER = "x-frugaloo-operation"
+
+# (method, path pattern, upstream service, fixture name). Fixture names may use
+# the pattern's groups, so every Gemini operation gets its own recordings.
+ROUTES = [
+    ("GET", r"/maps/api/place/textsearch/json", "places", "places_textsearch"),
+    ("GET", r"/maps/api/place/nearbysearch/json", "places", "places_nearbysearch"),
+    ("POST", r"/v1/places:searchNearby", "places_new", "places_search_nearby"),
+    ("POST", r"/v1/places:searchText", "places_new", "places_search_text"),
+    ("POST", r"/v1beta/models/[^/:]+:generateContent", "gemini", "gemini_{operation}"),
+    ("POST", r"/rest/v1/rpc/(?P<function>\w+)", "supabase", "supabase_{function}"),
+]
+
+DEFAULT_UPSTREAMS = {
+    "places": "https://maps.googleapis.com",
+    "places_new": "https://places.googleapis.com",
+    "gemini": "https://generativelanguage.googleapis.com",
+    "supabase": None,
+}
+
+DEFAULT_LATENCY = {
+    "places": "lognormal:150:0.4",
+    "places_new": "lognormal:150:0.4",
+    "gemini": "lognormal:2500:0.5",
+    "supabase": "lognormal:40:0.3",
+}
+
+# Query parameters and headers that carry credentials and are never recorded
+SECRET_PARAMS = {"key"}
+FORWARDED_HEADERS = {
+    "content-type",
+    "x-goog-api-key",
+    "x-goog-fieldmask",
+    "apikey",
+    "authorization",
+    "prefer",
+}
+
+
+class Latency:
+    """
+    Latency distribution parsed from a "kind:args" spec, all values in milliseconds:
+
+    - fixed:MS
+    - uniform:LOW:HIGH
+    - lognormal:MEDIAN:SIGMA
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, *args = spec.split(":")
+        try:
+            args = [float(arg) for arg in args]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec {spec!r}")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if expected.get(kind) != len(args):
+            raise ValueError(f"Invalid latency spec {spec!r}")
+        self.kind = kind
+        self.args = args
+
+    def sample(self):
+        """
+        Returns:
+        - float: A latency in seconds
+        """
+        if self.kind == "fixed":
+            ms = self.args[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(*self.args)
+        else:
+            median, sigma = self.args
+            ms = random.lognormvariate(math.log(median), sigma)
+        return ms / 1000
+
+
+class FixtureStore:
+    """
+    Recorded upstream responses, one JSON file per fixture name.
+
+    Each file holds a list of {"request", "status", "body"} entries. A request
+    replays the entry recorded for the same request key when there is one and
+    otherwise cycles through the recordings, so a handful of fixtures can serve
+    a benchmark of any size.
+    """
+
+    def __init__(self, directory=FIXTURE_DIR):
+        self.directory = Path(directory)
+        self._entries = {}
+        self._cursors = {}
+
+    def entries(self, name):
+        if name not in self._entries:
+            path = self.directory / f"{name}.json"
+            self._entries[name] = (
+                json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+            )
+        return self._entries[name]
+
+    def find(self, name, request_key):
+        entries = self.entries(name)
+        if not entries:
+            return None
+        for entry in entries:
+            if entry["request"] == request_key:
+                return entry
+        cursor = self._cursors.get(name, 0)
+        self._cursors[name] = cursor + 1
+        return entries[cursor % len(entries)]
+
+    def add(self, name, entry):
+        entries = self.entries(name)
+        entries[:] = [e for e in entries if e["request"] != entry["request"]]
+        entries.append(entry)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{name}.json").write_text(
+            json.dumps(entries, indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+
+
+def match_route(method, path, headers):
+    """
+    Returns:
+    - (service, fixture name) for the request, or None when it is not stubbed
+    """
+    for route_method, pattern, service, fixture in ROUTES:
+        match = re.fullmatch(pattern, path)
+        if route_method == method and match:
+            operation = headers.get(OPERATION_HEADER, "default")
+            return service, fixture.format(operation=operation, **match.groupdict())
+    return None
+
+
+def request_key(query, body):
+    """
+    Key identifying a request in recordings, with credentials left out.
+    """
+    params = sorted((k, v) for k, v in query.items() if k not in SECRET_PARAMS)
+    digest = hashlib.sha256(body).hexdigest()[:16] if body else ""
+    return f"{urlencode(params)}#{digest}"
+
+
+def build_app(store, latency, record=False, upstreams=None):
+    """
+    Builds the stand-in server for Places, Gemini and the Supabase RPC endpoint.
+
+    Parameters:
+    - store: FixtureStore responses are replayed from and recorded to
+    - latency: Dict of service -> Latency added before each replayed response
+    - record: When true, requests are forwarded upstream and the responses recorded
+    - upstreams: Dict of service -> base URL used when recording
+
+    Returns:
+    - aiohttp web.Application
+    """
+    upstreams = {**DEFAULT_UPSTREAMS, **(upstreams or {})}
+    lock = asyncio.Lock()
+
+    async def handle(request):
+        route = match_route(request.method, request.path, request.headers)
+        if route is None:
+            return web.json_response(
+                {"error": f"No stand-in for {request.method} {request.path}"},
+                status=404,
+            )
+        service, name = route
+        body = await request.read()
+        key = request_key(request.query, body)
+
+        if record:
+            if not upstreams.get(service):
+                return web.json_response(
+                    {"error": f"No upstream configured for {service}"}, status=502
+                )
+            headers = {
+                k: v for k, v in request.headers.items() if k.lower() in FORWARDED_HEADERS
+            }
+            async with httpx.AsyncClient(timeout=120) as client:
+                upstream = await client.request(
+                    request.method,
+                    upstreams[service] + request.path,
+                    params=list(request.query.items()),
+                    headers=headers,
+                    content=body,
+                )
+            entry = {
+                "request": key,
+                "status": upstream.status_code,
+                "body": upstream.json(),
+            }
+            async with lock:
+                store.add(name, entry)
+        else:
+            entry = store.find(name, key)
+            if entry is None:
+                return web.json_response(
+                    {"error": f"No recordings for {name}"}, status=404
+                )
+            if service in latency:
+                await asyncio.sleep(latency[service].sample())
+
+        return web.json_response(entry["body"], status=entry["status"])
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_route("*", "/{tail:.*}", handle)
+    return app
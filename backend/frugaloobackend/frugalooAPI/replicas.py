@@ -0,0 +1,109 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import metrics
+
+REPLICA_READS = metrics.Counter(
+    "frugaloo_db_replica_reads_total",
+    "Read paths that may use a replica, by where they were sent (replica, "
+    "primary when no replica is configured, or sticky when the user or trip "
+    "was written recently).",
+)
+
+# Set while a read path that tolerates replication lag is running
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+
+
+def _write_keys(user_id=None, trip_id=None):
+    keys = []
+    if user_id:
+        keys.append(f"recent-write:user:{user_id}")
+    if trip_id:
+        keys.append(f"recent-write:trip:{trip_id}")
+    return keys
+
+
+def mark_written(user_id=None, trip_id=None):
+    """
+    Sends the reads of this user and trip to the primary for
+    REPLICA_STICKY_SECONDS, so their own writes are visible to them while the
+    replicas catch up. Call it next to every write of their data.
+
+    Inside a transaction the window starts once it commits.
+    """
+    keys = _write_keys(user_id, trip_id)
+    if not keys or not replica_aliases():
+        return
+
+    transaction.on_commit(
+        lambda: caches["default"].set_many(dict.fromkeys(keys, 1), sticky_seconds())
+    )
+
+
+@contextmanager
+def reads(user_id=None, trip_id=None):
+    """
+    Runs the block's frugalooAPI queries on a replica, unless the user or
+    trip was written within the sticky window or no replica is configured.
+
+    Usage:
+
+        with replicas.reads(user_id=user_id):
+            trips = list(UserTripInfo.objects.filter(user_id=user_id))
+    """
+    if not replica_aliases():
+        route = "primary"
+    elif caches["default"].get_many(_write_keys(user_id, trip_id)):
+        route = "sticky"
+    else:
+        route = "replica"
+    REPLICA_READS.inc(route=route)
+
+    token = _replica_reads.set(route == "replica")
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends frugalooAPI reads made inside replicas.reads() to a random alias
+    of settings.DATABASE_REPLICAS. Everything else, including all writes,
+    uses the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != "frugalooAPI" or not _replica_reads.get():
+            return None
+        aliases = replica_aliases()
+        return random.choice(aliases) if aliases else None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {"default", *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication
+        if db in replica_aliases():
+            return False
+        return None
@@ -1,16 +1,71 @@
 # serializers.py (or any appropriate file in your Django app)
 
+import json
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import QuerySet
 from rest_framework import serializers
-from .models import UserTripInfo, UserTripProgressInfo, FinanceLog
+from .models import UserTripInfo, UserTripProgressInfo, FinanceLog, TripGenerationJob
+
+
+class JSONStringField(serializers.JSONField):
+    """
+    Stored as JSON, but sent to clients as a JSON-encoded string, which is what
+    the frontend parses generated_plan from.
+    """
+
+    def to_representation(self, value):
+        return value if isinstance(value, str) else json.dumps(value)
 
 
 class UserTripInfoSerializer(serializers.ModelSerializer):
+    generated_plan = JSONStringField()
+
     class Meta:
         model = UserTripInfo
         fields = "__all__"  # Serialize all fields in the UserTripInfo model
 
 
+class TripSummarySerializer(serializers.ModelSerializer):
+    """
+    Summary of a trip for trip lists. Other columns are only included when
+    named in extra_fields.
+    """
+
+    SUMMARY_FIELDS = ["trip_id", "stay_details", "number_of_days", "budget"]
+    EXTRA_FIELDS = [
+        "additional_preferences",
+        "places_descriptions",
+        "generated_plan",
+        "nearby_restaurants",
+    ]
+
+    generated_plan = JSONStringField()
+
+    class Meta:
+        model = UserTripInfo
+        fields = [
+            "trip_id",
+            "stay_details",
+            "number_of_days",
+            "budget",
+            "additional_preferences",
+            "places_descriptions",
+            "generated_plan",
+            "nearby_restaurants",
+        ]
+
+    def __init__(self, *args, extra_fields=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.EXTRA_FIELDS:
+            if name not in extra_fields:
+                self.fields.pop(name)
+
+
 class GeneratedPlanSerializer(serializers.ModelSerializer):
+    generated_plan = JSONStringField()
+
     class Meta:
         model = UserTripInfo
         fields = ['generated_plan']
@@ -25,3 +80,163 @@ class FinanceLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = FinanceLog
         fields = '__all__'
+        read_only_fields = ["trip_info"]
+
+
+class TripGenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripGenerationJob
+        fields = ["job_id", "status", "stage", "result", "error", "updated_at"]
+
+
+# Fields whose to_representation returns the database value unchanged
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ValuesSerializer:
+    """
+    Read-only serializer for list responses producing the same data as
+    model_serializer, from .values_list() rows instead of model instances.
+
+    The model_serializer's fields are mapped once to their columns and to a
+    conversion, skipped for fields that return the database value unchanged,
+    instead of going through DRF's per-field machinery for every row.
+
+    Usage:
+
+        FastFinanceLogSerializer(FinanceLog.objects.filter(user_id=user_id)).data
+    """
+
+    model_serializer = None
+    # Keyword arguments model_serializer is built with for the field map
+    model_serializer_kwargs = {}
+
+    def __init__(self, rows, fields=None):
+        """
+        Parameters:
+        - rows: QuerySet, read with values_list(), or model instances
+        - fields (optional): Only include these fields of model_serializer
+        """
+        self.rows = rows
+        self.fields = frozenset(fields) if fields is not None else None
+
+    @classmethod
+    def column(cls, model, name, field):
+        """
+        Returns:
+        - (column, whether field returns that column's value unchanged)
+        """
+        unreadable = ImproperlyConfigured(
+            f"{cls.__name__} cannot read {name!r} from a column"
+        )
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise unreadable
+        if isinstance(field, serializers.ManyRelatedField):
+            raise unreadable
+        if isinstance(field, serializers.SlugRelatedField):
+            # The column holds the related model's to_field
+            if field.slug_field != model_field.target_field.name:
+                raise unreadable
+            return model_field.attname, True
+        if isinstance(field, serializers.JSONField):
+            return model_field.attname, (
+                type(field) is serializers.JSONField and not field.binary
+            )
+        return model_field.attname, isinstance(field, IDENTITY_FIELDS)
+
+    @classmethod
+    def field_map(cls):
+        """
+        Returns:
+        - [(name, column, conversion or None)] of every readable field,
+          computed once per class
+        """
+        if "_field_map" not in cls.__dict__:
+            serializer = cls.model_serializer(**cls.model_serializer_kwargs)
+            model = serializer.Meta.model
+            field_map = []
+            for name, field in serializer.fields.items():
+                if field.write_only:
+                    continue
+                column, identity = cls.column(model, name, field)
+                conversion = None if identity else field.to_representation
+                field_map.append((name, column, conversion))
+            cls._field_map = field_map
+        return cls._field_map
+
+    def selected_fields(self):
+        return [
+            entry
+            for entry in self.field_map()
+            if self.fields is None or entry[0] in self.fields
+        ]
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.selected_fields()]
+
+    @property
+    def columns(self):
+        return [column for _, column, _ in self.selected_fields()]
+
+    def represent(self, rows):
+        """
+        Yields the representation of each tuple of column values in rows.
+        """
+        field_map = self.selected_fields()
+        names = [name for name, _, _ in field_map]
+        conversions = [
+            (index, conversion)
+            for index, (_, _, conversion) in enumerate(field_map)
+            if conversion is not None
+        ]
+
+        if not conversions:
+            for row in rows:
+                yield dict(zip(names, row))
+            return
+        for row in rows:
+            row = list(row)
+            for index, conversion in conversions:
+                # DRF leaves None as is rather than converting it
+                if row[index] is not None:
+                    row[index] = conversion(row[index])
+            yield dict(zip(names, row))
+
+    @property
+    def data(self):
+        columns = self.columns
+        if isinstance(self.rows, QuerySet):
+            rows = self.rows.values_list(*columns)
+        else:
+            get = attrgetter(*columns)
+            rows = (get(row) for row in self.rows)
+            if len(columns) == 1:
+                rows = ((value,) for value in rows)
+        return list(self.represent(rows))
+
+
+class FastUserTripInfoSerializer(ValuesSerializer):
+    model_serializer = UserTripInfoSerializer
+
+
+class FastTripSummarySerializer(ValuesSerializer):
+    """
+    Pass the summary fields plus any extra fields as fields.
+    """
+
+    model_serializer = TripSummarySerializer
+    model_serializer_kwargs = {"extra_fields": TripSummarySerializer.EXTRA_FIELDS}
+
+
+class FastFinanceLogSerializer(ValuesSerializer):
+    model_serializer = FinanceLogSerializer
@@ -1,3 +1,483 @@
-from django.test import TestCase
+import base64
+import io
+import json
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import caching, exports, finance, jobs, llm_output, microbench
+from .llm_output import LLMOutputError
+from .models import (
+    FinanceLog,
+    FinanceRollup,
+    TripGenerationJob,
+    TripProgress,
+    UserTripInfo,
+    UserTripProgressInfo,
+)
+
+
+def create_trip(user_id="user-1", plan=None, **fields):
+    return UserTripInfo.objects.create(
+        user_id=user_id,
+        stay_details=fields.pop("stay_details", "Goa"),
+        number_of_days=fields.pop("number_of_days", 2),
+        budget=fields.pop("budget", 1),
+        additional_preferences=fields.pop("additional_preferences", ""),
+        generated_plan=plan if plan is not None else {"1": [], "2": []},
+        **fields,
+    )
+
+
+STOP = {
+    "place_name": "Baga Beach",
+    "description": "Sand and sea",
+    "TOE": "2 hours",
+    "lat_long": "15.55, 73.75",
+}
+
+
+class LLMOutputLoadsTests(TestCase):
+    def test_plain_and_fenced_json(self):
+        self.assertEqual(llm_output.loads('{"a": 1}'), {"a": 1})
+        self.assertEqual(llm_output.loads('```json\n{"a": 1}\n```'), {"a": 1})
+
+    def test_prose_around_json_is_trimmed(self):
+        self.assertEqual(
+            llm_output.loads('Here is your plan: {"a": [1]} Enjoy!'), {"a": [1]}
+        )
+
+    def test_trailing_commas_are_dropped(self):
+        self.assertEqual(
+            llm_output.loads('{"a": [1, 2,], "b": {"c": 1,},}'),
+            {"a": [1, 2], "b": {"c": 1}},
+        )
+
+    def test_commas_inside_strings_are_kept(self):
+        self.assertEqual(
+            llm_output.loads('{"a": "x ,}", "b": [1,2,]}'), {"a": "x ,}", "b": [1, 2]}
+        )
+        self.assertEqual(
+            llm_output.loads('{"a": "quote \\" ,]", "b": [1,]}'),
+            {"a": 'quote " ,]', "b": [1]},
+        )
+
+    def test_truncated_output_is_closed(self):
+        self.assertEqual(
+            llm_output.loads('{"1": [{"place_name": "A"}, {"place_name": "B"},\n'),
+            {"1": [{"place_name": "A"}, {"place_name": "B"}]},
+        )
+        # A stop cut off midway is dropped rather than completed
+        self.assertEqual(
+            llm_output.loads('{"1": [{"place_name": "A"}, {"place_name": "B'),
+            {"1": [{"place_name": "A"}]},
+        )
+
+    def test_python_literal_dicts(self):
+        self.assertEqual(
+            llm_output.loads("{'a': 'x ,}', 'b': [1, 2,]}"), {"a": "x ,}", "b": [1, 2]}
+        )
+
+    def test_malformed_output_raises(self):
+        with self.assertRaises(LLMOutputError):
+            llm_output.loads("no json here")
+        with self.assertRaises(LLMOutputError):
+            llm_output.loads(None)
+
+
+class LLMOutputSchemaTests(TestCase):
+    def test_valid_itinerary_with_coercion(self):
+        text = json.dumps({"1": [{**STOP, "TOE": 2}]})
+        self.assertEqual(
+            llm_output.parse(text, llm_output.ITINERARY),
+            {"1": [{**STOP, "TOE": "2"}]},
+        )
+
+    def test_violations_are_listed(self):
+        bad = {"place_name": "A", "description": "d", "TOE": "1 hour", "lat_long": "here"}
+        with self.assertRaises(LLMOutputError) as raised:
+            llm_output.parse(
+                json.dumps({"1": [bad, {"place_name": "B"}]}),
+                llm_output.ITINERARY,
+            )
+        errors = raised.exception.errors
+        self.assertTrue(any("$.1[0].lat_long" in error for error in errors), errors)
+        self.assertTrue(any("missing 'description'" in error for error in errors), errors)
+
+    def test_merged_stop_needs_a_name(self):
+        stop = {key: value for key, value in STOP.items() if key != "place_name"}
+        with self.assertRaises(LLMOutputError):
+            llm_output.parse(
+                json.dumps({"1": [stop]}), llm_output.MERGED_PLAN
+            )
+        llm_output.parse(
+            json.dumps({"1": [{**stop, "restaurant_name": "R"}]}),
+            llm_output.MERGED_PLAN,
+        )
+
+    def test_parse_days_separates_failed_days(self):
+        text = json.dumps(
+            {"response_data": {"1": [STOP], "2": [{"place_name": "B"}]}}
+        )
+        days, failed = llm_output.parse_days(text, llm_output.PLACE)
+        self.assertEqual(days, {"1": [STOP]})
+        self.assertEqual(list(failed), ["2"])
+
+
+class TripListCursorTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trips = [create_trip(stay_details=f"Stay {i}") for i in range(5)]
+        create_trip(user_id="someone-else")
+
+    def fetch(self, **params):
+        return self.client.get(
+            "/fetch-trip-details/", {"user_id": "user-1", "list": 1, **params}
+        )
+
+    def test_pages_follow_the_cursor(self):
+        seen, cursor = [], None
+        while True:
+            response = self.fetch(limit=2, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body["results"]), 2)
+            seen += [trip["trip_id"] for trip in body["results"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+            self.assertEqual(
+                int(base64.urlsafe_b64decode(cursor)),
+                UserTripInfo.objects.get(trip_id=seen[-1]).id,
+            )
+
+        self.assertEqual(seen, [str(trip.trip_id) for trip in reversed(self.trips)])
+
+    def test_invalid_cursor_or_limit(self):
+        self.assertEqual(self.fetch(cursor="not-a-cursor").status_code, 400)
+        self.assertEqual(self.fetch(limit=0).status_code, 400)
+        self.assertEqual(self.fetch(limit="many").status_code, 400)
+
+    def test_list_flag(self):
+        # "false" used to be truthy and switched list mode on
+        self.assertIsInstance(self.fetch(list="false").json(), list)
+        self.assertEqual(self.fetch(list="yes").status_code, 400)
+
+
+class SetPlanDayTests(TestCase):
+    def check_set_plan_day(self, set_plan_day):
+        trip = create_trip(plan={"1": [STOP], "2": []})
+        trips = UserTripInfo.objects.filter(trip_id=trip.trip_id)
+
+        self.assertEqual(set_plan_day(trips, "2", [STOP, STOP]), 1)
+        trip.refresh_from_db()
+        self.assertEqual(trip.generated_plan, {"1": [STOP], "2": [STOP, STOP]})
+        self.assertEqual(trip.plan_version, 2)
+
+        # Days that do not exist are left alone
+        self.assertEqual(set_plan_day(trips, "3", []), 0)
+        trip.refresh_from_db()
+        self.assertEqual(trip.plan_version, 2)
+
+        listed = create_trip(plan=[[STOP], []])
+        listed_trips = UserTripInfo.objects.filter(trip_id=listed.trip_id)
+        self.assertEqual(set_plan_day(listed_trips, "1", [STOP]), 1)
+        listed.refresh_from_db()
+        self.assertEqual(listed.generated_plan, [[STOP], [STOP]])
+
+    @skipUnless(connection.vendor == "postgresql", "jsonb_set needs PostgreSQL")
+    def test_jsonb_set(self):
+        self.check_set_plan_day(lambda trips, day, stops: trips.set_plan_day(day, stops))
+
+    def test_python_fallback(self):
+        # Called directly so it is covered on PostgreSQL too
+        self.check_set_plan_day(
+            lambda trips, day, stops: trips._set_plan_day_in_python(day, stops)
+        )
+
+
+class FinanceRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trip = create_trip()
+        self.other_trip = create_trip()
+
+    def add_log(self, trip, amount, day=1, category="Food"):
+        log = FinanceLog.objects.create(
+            user_id="user-1",
+            trip_id=str(trip.trip_id),
+            trip_info=trip,
+            amount=amount,
+            place="Cafe",
+            category=category,
+            day=day,
+        )
+        finance.record_expenses([log])
+        return log
+
+    def rollups(self):
+        return sorted(
+            FinanceRollup.objects.values_list(
+                "user_id", "trip_info_id", "day", "category", "total_amount", "entry_count"
+            )
+        )
+
+    def test_record_expenses_matches_rebuild(self):
+        self.add_log(self.trip, 10)
+        self.add_log(self.trip, 5)
+        self.add_log(self.trip, 7, day=2)
+        self.add_log(self.trip, 3, category="Taxi")
+        self.add_log(self.other_trip, 20)
+        incremental = self.rollups()
+
+        self.assertEqual(finance.rebuild(), len(incremental))
+        self.assertEqual(self.rollups(), incremental)
+
+        summary = finance.summary("user-1", self.trip.trip_id)
+        self.assertEqual(summary["total_amount"], 25)
+        self.assertEqual(summary["entry_count"], 4)
+
+    def test_bulk_endpoint_partial_success(self):
+        response = self.client.post(
+            "/add-finance-logs/",
+            {
+                "user_id": "user-1",
+                "trip_id": str(self.trip.trip_id),
+                "entries": [
+                    {"amount": 10, "place": "a", "category": "Food", "day": 1},
+                    {"amount": "ten", "place": "b", "category": "Food", "day": 1},
+                    {"amount": 5, "place": "c", "category": "Food", "day": 1, "trip_id": "nope"},
+                    {"amount": 7, "place": "d", "category": "Taxi", "day": 2},
+                ],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual(body["created"], 2)
+        self.assertEqual(
+            [result["status"] for result in body["results"]], [201, 400, 404, 201]
+        )
+        self.assertEqual(body["results"][0]["data"]["trip_location"], "Goa")
+        self.assertIn("errors", body["results"][1])
+        self.assertEqual(FinanceLog.objects.count(), 2)
+
+        incremental = self.rollups()
+        finance.rebuild()
+        self.assertEqual(self.rollups(), incremental)
+
+
+class FetchPlanConditionalTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trip = create_trip(plan={"1": [STOP]})
+
+    def fetch(self, etag=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(
+            "/fetch-plan/", {"trip_id": str(self.trip.trip_id), **params}, **headers
+        )
+
+    def test_not_modified_until_the_plan_changes(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        self.assertEqual(self.fetch(etag).status_code, 304)
+        self.assertEqual(self.fetch("W/" + etag).status_code, 304)
+
+        response = self.client.post(
+            "/update-plan/",
+            {"trip_id": str(self.trip.trip_id), "day": "1", "stops": []},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.fetch(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_raw_has_its_own_etag(self):
+        etag = self.fetch()["ETag"]
+        response = self.fetch(etag, raw="true")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"generated_plan": {"1": [STOP]}})
+        self.assertEqual(self.fetch(response["ETag"], raw="1").status_code, 304)
+
+    def test_raw_must_be_a_boolean(self):
+        self.assertIsInstance(self.fetch(raw="0").json()["generated_plan"], str)
+        self.assertEqual(self.fetch(raw="yes").status_code, 400)
+
+    def test_unknown_trip(self):
+        self.trip.delete()
+        self.assertEqual(self.fetch().status_code, 404)
+
+
+class FlagParameterTests(TestCase):
+    def test_invalid_flags_are_rejected_before_any_work(self):
+        client = APIClient()
+        for path, flag in (("/pre-plan-trip/", "prefetch"), ("/generate-trip/", "job")):
+            response = client.post(path, {flag: "yes"}, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(flag, response.json()["error"])
+        self.assertFalse(TripGenerationJob.objects.exists())
+
+
+class UpdateTripProgressTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def update(self, trip_id, day=1):
+        return self.client.post(
+            "/update-progress/",
+            {"trip_id": trip_id, "user_id": "user-1", "day": day},
+            format="json",
+        )
+
+    def test_progress_is_recorded(self):
+        trip = create_trip()
+        self.assertEqual(self.update(str(trip.trip_id)).status_code, 201)
+        self.assertEqual(self.update(str(trip.trip_id), day=2).status_code, 201)
+        self.assertEqual(TripProgress.objects.get().completed_days, [1, 2])
+
+    def test_unknown_trip(self):
+        response = self.update("6f1c7a52-3f5e-4f27-9d7e-0a5b3c2d1e4f")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(UserTripProgressInfo.objects.exists())
+
+    def test_malformed_trip_id(self):
+        self.assertEqual(self.update("not-a-uuid").status_code, 400)
+        self.assertEqual(self.update(None).status_code, 400)
+        self.assertFalse(UserTripProgressInfo.objects.exists())
+
+
+class CacheInvalidationTests(TestCase):
+    def setUp(self):
+        self.namespace = caching.Namespace("tests", ttl=300)
+        self.addCleanup(caching.NAMESPACES.pop, "tests")
+        self.addCleanup(cache.clear)
+
+    def test_value_loaded_before_a_write_is_not_cached(self):
+        def load():
+            # A write commits while the old value is being loaded
+            with self.captureOnCommitCallbacks(execute=True):
+                self.namespace.delete(("trip",))
+            return "old"
+
+        self.assertEqual(self.namespace.get_or_set(("trip",), load), "old")
+        self.assertIs(self.namespace.get(("trip",)), caching.MISSING)
+
+    def test_values_are_cached_again_once_the_marker_expires(self):
+        self.namespace.delete(("trip",))
+        cache.delete(self.namespace.key(("trip",)) + ":invalidated")
+
+        self.namespace.get_or_set(("trip",), lambda: "new")
+        self.assertEqual(self.namespace.get(("trip",)), "new")
+
+
+class BackfillTripInfoTests(TestCase):
+    def test_unlinked_rows_are_linked_and_rolled_up(self):
+        trip = create_trip()
+        # Rows written by the release before trip_info existed
+        for day in (1, 2, 1):
+            UserTripProgressInfo.objects.create(
+                user_id="user-1", trip_id=str(trip.trip_id), day=day
+            )
+        UserTripProgressInfo.objects.create(user_id="user-1", trip_id="nope", day=1)
+        FinanceLog.objects.create(
+            user_id="user-1",
+            trip_id=str(trip.trip_id),
+            amount=10,
+            place="Cafe",
+            category="Food",
+            day=1,
+        )
+
+        for _ in range(2):
+            call_command("backfill_trip_info", stdout=io.StringIO())
+
+            progress = TripProgress.objects.get()
+            self.assertEqual(progress.trip_info_id, trip.trip_id)
+            self.assertEqual(progress.completed_days, [1, 2])
+            self.assertEqual(progress.last_completed_day, 1)
+            rollup = FinanceRollup.objects.get()
+            self.assertEqual((rollup.total_amount, rollup.entry_count), (10, 1))
+        self.assertTrue(
+            UserTripProgressInfo.objects.filter(
+                trip_id="nope", trip_info__isnull=True
+            ).exists()
+        )
+
+
+class ExportStreamingTests(TestCase):
+    async def test_asgi_response_reads_chunks_as_it_is_sent(self):
+        for i in range(3):
+            await sync_to_async(create_trip)(stay_details=f"Stay {i}")
+
+        chunks_read = []
+        chunked_values = exports.chunked_values
+
+        def one_row_chunks(rows, columns, chunk_size):
+            for chunk in chunked_values(rows, columns, chunk_size=1):
+                chunks_read.append(chunk)
+                yield chunk
+
+        with mock.patch.object(exports, "chunked_values", one_row_chunks):
+            response = await AsyncClient().get(
+                "/export-trips/", {"user_id": "user-1"}
+            )
+            self.assertTrue(response.is_async)
+            blocks = aiter(response.streaming_content)
+            first = await anext(blocks)
+            self.assertEqual(len(chunks_read), 1)
+            rest = [block async for block in blocks]
+
+        lines = b"".join([first, *rest]).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(len(chunks_read), 3)
+
+
+class ClaimJobTests(TestCase):
+    def create_job(self, **fields):
+        job = TripGenerationJob.objects.create(user_id="user-1", payload={}, **fields)
+        # Last heartbeat an hour ago
+        TripGenerationJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        return job
+
+    def test_abandoned_jobs_are_reclaimed_up_to_max_attempts(self):
+        spent = self.create_job(status=TripGenerationJob.RUNNING, attempts=3)
+        retried = self.create_job(status=TripGenerationJob.RUNNING, attempts=1)
+
+        claimed = jobs.claim_next_job(stale_after=600, max_attempts=3)
+        self.assertEqual(claimed.pk, retried.pk)
+        self.assertEqual(claimed.attempts, 2)
+
+        spent.refresh_from_db()
+        self.assertEqual(spent.status, TripGenerationJob.FAILED)
+        self.assertTrue(spent.error)
+        self.assertIsNone(jobs.claim_next_job(stale_after=600, max_attempts=3))
+
+    def test_running_jobs_with_a_recent_heartbeat_are_left_alone(self):
+        TripGenerationJob.objects.create(
+            user_id="user-1", payload={}, status=TripGenerationJob.RUNNING, attempts=1
+        )
+        self.assertIsNone(jobs.claim_next_job(stale_after=600))
+
+
+class MicrobenchCasesTests(TestCase):
+    def test_every_case_runs(self):
+        # Timing is left to bench_hotpaths; this only keeps the cases working
+        for name, case in microbench.cases().items():
+            with self.subTest(case=name):
+                case()
@@ -0,0 +1,108 @@
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Spans recorded for the request being handled, or None outside a request.
+# The list is shared by reference, so spans recorded in sync_to_async threads
+# and asyncio.gather tasks spawned by the view land in the same request.
+_spans = contextvars.ContextVar("server_timing_spans", default=None)
+
+
+@contextmanager
+def span(name):
+    """
+    Records how long the wrapped block takes as a named stage of the request.
+
+    Stages show up in the Server-Timing response header, e.g.:
+
+        with timing.span("places.nearby"):
+            ...
+
+    Outside a request (management commands, background threads) this is a no-op.
+    """
+    spans = _spans.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if spans is not None:
+            spans.append((name, (time.perf_counter() - start) * 1000))
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware that emits the stages recorded with span() as a Server-Timing header.
+
+    Spans with the same name are summed. Concurrent stages (e.g. the Places
+    fan-out running beside a Gemini call) are measured independently, so their
+    durations may add up to more than "total". Requests slower than
+    SLOW_REQUEST_THRESHOLD_MS are logged with their full breakdown.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        spans = []
+        token = _spans.set(spans)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _spans.reset(token)
+        return self.finish(request, response, spans, start)
+
+    async def __acall__(self, request):
+        spans = []
+        token = _spans.set(spans)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _spans.reset(token)
+        return self.finish(request, response, spans, start)
+
+    def finish(self, request, response, spans, start):
+        total = (time.perf_counter() - start) * 1000
+
+        stages = {}
+        for name, duration in spans:
+            stages[name] = stages.get(name, 0) + duration
+        stages["total"] = total
+
+        response["Server-Timing"] = ", ".join(
+            f"{name};dur={duration:.1f}" for name, duration in stages.items()
+        )
+        response["Timing-Allow-Origin"] = "*"
+
+        threshold = getattr(settings, "SLOW_REQUEST_THRESHOLD_MS", 5000)
+        if total >= threshold:
+            logger.warning(
+                json.dumps(
+                    {
+                        "event": "slow_request",
+                        "method": request.method,
+                        "path": request.path,
+                        "status": response.status_code,
+                        "stages_ms": {
+                            name: round(duration, 1) for name, duration in stages.items()
+                        },
+                    }
+                )
+            )
+        return response
@@ -4,15 +4,20 @@ from rest_framework import routers
 from .views import (
     Preplan,
     GenerateFinalPlan,
+    FetchGenerationJob,
     FetchTripDetails,
     FetchPlan,
     UpdateUserTripProgress,
     FetchUserTripProgress,
     AddFinanceLog,
+    AddFinanceLogs,
+    FetchFinanceSummary,
+    ExportData,
     GeminiSuggestions,
     UpdateTrip,
     GenerateMessageView,
-    GetPhotosForLocations
+    GetPhotosForLocations,
+    MetricsView,
 )
 
 router = routers.DefaultRouter()
@@ -21,6 +26,11 @@ urlpatterns = [
     path("", include(router.urls)),
     path("pre-plan-trip/", Preplan.as_view(), name="pre-plan-trip"),
     path("generate-trip/", GenerateFinalPlan.as_view(), name="generate-trip"),
+    path(
+        "fetch-generation-job/",
+        FetchGenerationJob.as_view(),
+        name="fetch-generation-job",
+    ),
     path("fetch-trip-details/", FetchTripDetails.as_view(), name="fetch-trip-details"),
     path("fetch-plan/", FetchPlan.as_view(), name="fetch-plan"),
     path("update-progress/", UpdateUserTripProgress.as_view(), name="update-progress"),
@@ -32,6 +42,23 @@ urlpatterns = [
     path("gemini-suggestions/", GeminiSuggestions.as_view(), name="gemini-suggestions"),
     path("update-plan/", UpdateTrip.as_view(), name="update-plan"),
     path("add-finance-log/", AddFinanceLog.as_view(), name="add_finance_log"),
+    path("add-finance-logs/", AddFinanceLogs.as_view(), name="add_finance_logs"),
+    path(
+        "fetch-finance-summary/",
+        FetchFinanceSummary.as_view(),
+        name="fetch-finance-summary",
+    ),
+    path(
+        "export-trips/",
+        ExportData.as_view(export="trips"),
+        name="export-trips",
+    ),
+    path(
+        "export-finance-logs/",
+        ExportData.as_view(export="finance-logs"),
+        name="export-finance-logs",
+    ),
     path("generate-message/", GenerateMessageView.as_view(), name="generate-message"),
      path('get-photos-for-locations/', GetPhotosForLocations.as_view(), name='get_photos_for_locations'),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
@@ -1,24 +1,112 @@
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
+from adrf.views import APIView as AsyncAPIView
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework import status
-import google.generativeai as genai
+import asyncio
+import base64
+import httpx
 import os
-import requests
 import re
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from supabase import create_client, Client  # type: ignore
-from .models import UserTripInfo, UserTripProgressInfo, MessageLog
+from .models import (
+    FinanceLog,
+    UserTripInfo,
+    UserTripProgressInfo,
+    TripProgress,
+    MessageLog,
+    TripGenerationJob,
+)
 from .serializers import (
-    UserTripInfoSerializer,
-    GeneratedPlanSerializer,
-    UserTripProgressSerializer,
+    FastFinanceLogSerializer,
+    FastTripSummarySerializer,
+    FastUserTripInfoSerializer,
+    TripSummarySerializer,
     FinanceLogSerializer,
+    TripGenerationJobSerializer,
+)
+from .gemini import generative_model, record_retry
+from . import (
+    caching,
+    conditional,
+    exports,
+    fastjson,
+    finance,
+    itinerary,
+    llm_output,
+    metrics,
+    plan_cache,
+    replicas,
+    timing,
 )
+from .llm_output import LLMOutputError
+from .prefetch import start_restaurant_prefetch, take_prefetched_restaurants
 from asgiref.sync import sync_to_async
-import json
 
+# Timeout (seconds) applied to every outbound Google Places request.
+PLACES_TIMEOUT = 30
+
+# Extra Gemini calls allowed when a response does not match its schema.
+LLM_OUTPUT_RETRIES = 1
+
+
+def parse_flag(value):
+    """
+    Parses an optional boolean request parameter: a JSON boolean, or "1",
+    "true", "0" or "false" in any case.
+
+    Returns:
+    - True or False (False when absent or empty), or None if the value is not
+      a boolean
+    """
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    return {"1": True, "true": True, "0": False, "false": False, "": False}.get(
+        str(value).lower()
+    )
 
-class Preplan(APIView):
+
+async def cached_places_request(parts, send):
+    """
+    Sends a Places request through the PLACES cache namespace.
+
+    Parameters:
+    - parts: Cache key parts identifying the request, without the API key
+    - send: Coroutine function making the request and returning the httpx response
+
+    Returns:
+    - (status_code, JSON body or None). Only 200 responses are cached.
+    """
+    status_code = 200
+
+    async def load():
+        nonlocal status_code
+        response = await send()
+        status_code = response.status_code
+        return response.json() if response.status_code == 200 else None
+
+    body = await caching.PLACES.aget_or_set(parts, load)
+    return status_code, body
+
+
+# Request fields stored on a TripGenerationJob and replayed by the job runner.
+GENERATION_JOB_FIELDS = (
+    "user_id",
+    "stay_details",
+    "number_of_days",
+    "budget",
+    "additional_preferences",
+    "response_data",
+    "prefetch_token",
+)
+
+
+class Preplan(AsyncAPIView):
     """
     API view for generating an itinerary based on user information.
 
@@ -35,20 +123,36 @@ class Preplan(APIView):
     - number_of_days
     - budget
     - additional_preferences
+    - prefetch (optional): when true, nearby restaurants for the plan are fetched
+      in the background and a prefetch_token is returned for generate-trip
 
     """
 
-    def post(self, request):
+    async def post(self, request):
         try:
             user_id = request.data.get("user_id")
             stay_details = request.data.get("stay_details")
             number_of_days = request.data.get("number_of_days")
             budget = request.data.get("budget")
             additional_preferences = request.data.get("additional_preferences")
+            prefetch = parse_flag(request.data.get("prefetch"))
+            if prefetch is None:
+                return Response(
+                    {"error": "prefetch must be true, false, 1 or 0"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             places_api_key = os.environ.get("GOOGLE_PLACES")
-            places_url = f"https://maps.googleapis.com/maps/api/place/textsearch/json?query={stay_details}&key={places_api_key}&type=tourist_attraction"
-            places_response = requests.get(places_url)
-            places_data = places_response.json()
+            places_url = f"{settings.GOOGLE_PLACES_URL}/maps/api/place/textsearch/json?query={stay_details}&key={places_api_key}&type=tourist_attraction"
+
+            async def textsearch():
+                async with httpx.AsyncClient(timeout=PLACES_TIMEOUT) as client:
+                    return await client.get(places_url)
+
+            with timing.span("places.textsearch"):
+                _, places_data = await cached_places_request(
+                    ("textsearch", stay_details), textsearch
+                )
+            places_data = places_data or {}
 
             tourist_attractions = []
             for result in places_data.get("results", []):
@@ -69,8 +173,6 @@ class Preplan(APIView):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
-            genai.configure(api_key=api_key)
-
             generation_config = {
                 "temperature": 0.7,
                 "top_p": 0.95,
@@ -79,7 +181,10 @@ class Preplan(APIView):
                 "response_mime_type": "application/json",
             }
 
-            model = genai.GenerativeModel(
+            model = generative_model(
+                api_key,
+                endpoint="pre-plan-trip",
+                operation="itinerary",
                 model_name="gemini-1.5-pro",
                 generation_config=generation_config,
                 # safety_settings = Adjust safety settings
@@ -88,8 +193,16 @@ class Preplan(APIView):
             )
 
             concatenated_input = f"Stay Details: {stay_details}\nNumber of Days: {number_of_days}\nBudget: {budget}\nAdditional Preferences: {additional_preferences}"
-            response = model.generate_content(concatenated_input)
-            response_data = response.text
+            for attempt in range(LLM_OUTPUT_RETRIES + 1):
+                response = await model.generate_content_async(concatenated_input)
+                try:
+                    itinerary = llm_output.parse(response.text, llm_output.ITINERARY)
+                    break
+                except LLMOutputError:
+                    if attempt == LLM_OUTPUT_RETRIES:
+                        raise
+                    record_retry(model)
+            response_data = fastjson.dumps(itinerary)
 
             response = {
                 "user_id": user_id,
@@ -99,14 +212,33 @@ class Preplan(APIView):
                 "additional_preferences": additional_preferences,
                 "response_data": response_data,
             }
+            if prefetch:
+                response["prefetch_token"] = await self.prefetch_restaurants(
+                    itinerary, budget
+                )
             return Response(response, status=status.HTTP_201_CREATED)
+        except LLMOutputError as e:
+            return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
-class GenerateFinalPlan(APIView):
+    async def prefetch_restaurants(self, itinerary, budget):
+        """
+        Kicks off the restaurant lookup for the pre-plan while the user reviews it.
+
+        Returns:
+        - str: Prefetch token for generate-trip
+        """
+        lat_long_values = GenerateFinalPlan().extract_lat_long(itinerary)
+        return await sync_to_async(start_restaurant_prefetch)(
+            GenerateFinalPlan().fetch_nearby_restaurants, lat_long_values, budget
+        )
+
+
+class GenerateFinalPlan(AsyncAPIView):
     """
     API view for generating an itinerary based on user information.
 
@@ -138,16 +270,20 @@ class GenerateFinalPlan(APIView):
         - generated_plan: The generated plan for the trip
         - nearby_restaurants: Details of nearby restaurants for each place
         """
-        UserTripInfo.objects.create(
-            user_id=user_id,
-            stay_details=stay_details,
-            number_of_days=number_of_days,
-            budget=budget,
-            additional_preferences=additional_preferences,
-            generated_plan=generated_plan,
-            nearby_restaurants=nearby_restaurants,
-            places_descriptions=places_description_response,
-        )
+        with transaction.atomic():
+            trip = UserTripInfo.objects.create(
+                user_id=user_id,
+                stay_details=stay_details,
+                number_of_days=number_of_days,
+                budget=budget,
+                additional_preferences=additional_preferences,
+                generated_plan=generated_plan,
+                nearby_restaurants=nearby_restaurants,
+                places_descriptions=places_description_response,
+            )
+            itinerary.sync_plan(trip.trip_id, generated_plan)
+            plan_cache.invalidate(trip.trip_id)
+            replicas.mark_written(user_id=user_id, trip_id=trip.trip_id)
 
     def extract_lat_long(self, data):
         """
@@ -172,10 +308,12 @@ class GenerateFinalPlan(APIView):
                 )
         return lat_long_values
 
-    def fetch_nearby_restaurants(self, lat_long_values, budget):
+    async def fetch_nearby_restaurants(self, lat_long_values, budget):
         """
         Fetches nearby restaurants for given latitude and longitude values.
 
+        The Places requests for all stops are issued concurrently.
+
         Parameters:
         - lat_long_values: List of dictionaries containing lat/long values for each place
         - budget: Budget type for filtering restaurants (1: frugal, 2: moderate, 3: expensive)
@@ -187,50 +325,25 @@ class GenerateFinalPlan(APIView):
         radius = 1500
         results = {}
 
-        # The updated budget mapping for filtering restaurants
-        budget_mapping = {
-            1: {0, 1},  # Frugal: price_level 0 or 1
-            2: {2, 3},  # Moderate: price_level 2 or 3
-            3: {4},  # Expensive: price_level 4
-        }
-
-        for place in lat_long_values:
-            day_index = place["day_index"]
-            place_name = place["place_name"]
-            lat_long = place["lat_long"]
+        async def fetch(client, lat_long):
             lat, lng = lat_long.split(",")
-            url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location={lat},{lng}&radius={radius}&type=restaurant&key={api_key}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()  # Parse response content as JSON
+            url = f"{settings.GOOGLE_PLACES_URL}/maps/api/place/nearbysearch/json?location={lat},{lng}&radius={radius}&type=restaurant&key={api_key}"
+            return await cached_places_request(
+                ("nearbysearch", lat.strip(), lng.strip(), radius),
+                lambda: client.get(url),
+            )
 
-                # Filter restaurants based on the budget
-                names_with_details = [
-                    {
-                        "name": result["name"],
-                        "latitude": result["geometry"]["location"]["lat"],
-                        "longitude": result["geometry"]["location"]["lng"],
-                        "rating": result.get("rating", "N/A"),
-                        "price_level": result.get("price_level", "N/A"),
-                    }
-                    for result in data["results"]
-                    if "price_level" in result
-                    and result["price_level"] in budget_mapping[budget]
-                ]
+        with timing.span("places.nearby"):
+            async with httpx.AsyncClient(timeout=PLACES_TIMEOUT) as client:
+                responses = await asyncio.gather(
+                    *(fetch(client, place["lat_long"]) for place in lat_long_values)
+                )
 
-                # If no restaurants found in the preferred budget range, fetch restaurants with price_level N/A
-                if not names_with_details:
-                    names_with_details = [
-                        {
-                            "name": result["name"],
-                            "latitude": result["geometry"]["location"]["lat"],
-                            "longitude": result["geometry"]["location"]["lng"],
-                            "rating": result.get("rating", "N/A"),
-                            "price_level": result.get("price_level", "N/A"),
-                        }
-                        for result in data["results"]
-                        if result.get("price_level") is None
-                    ]
+        for place, (status_code, data) in zip(lat_long_values, responses):
+            day_index = place["day_index"]
+            place_name = place["place_name"]
+            if status_code == 200:
+                names_with_details = self.filter_restaurants(data["results"], budget)
 
                 if day_index not in results:
                     results[day_index] = {}
@@ -238,83 +351,303 @@ class GenerateFinalPlan(APIView):
             else:
                 if day_index not in results:
                     results[day_index] = {}
-                results[day_index][place_name] = {"error": response.status_code}
+                results[day_index][place_name] = {"error": status_code}
 
         return results
 
-    def post(self, request):
-        try:
-            user_id = request.data.get("user_id")
-            stay_details = request.data.get("stay_details")
-            number_of_days = request.data.get("number_of_days")
-            budget = request.data.get("budget")
-            additional_preferences = request.data.get("additional_preferences")
-            response_raw = request.data.get("response_data")
+    def filter_restaurants(self, places_results, budget):
+        """
+        Filters a Places nearbysearch result list down to restaurants in the user's budget.
 
-            response_raw_dict = json.loads(response_raw)
-            lat_long_values = self.extract_lat_long(response_raw_dict)
-            nearby_restaurants = self.fetch_nearby_restaurants(lat_long_values, budget)
+        Parameters:
+        - places_results: "results" list of a nearbysearch response
+        - budget: Budget type for filtering restaurants (1: frugal, 2: moderate, 3: expensive)
 
-            response_raw = {
-                "nearby_restaurants": nearby_restaurants,
-                "response_data": response_raw_dict,
-            }
+        Returns:
+        - List of restaurant details in the budget, or the restaurants without a
+          price level when none match
+        """
+        # The updated budget mapping for filtering restaurants
+        budget_mapping = {
+            1: {0, 1},  # Frugal: price_level 0 or 1
+            2: {2, 3},  # Moderate: price_level 2 or 3
+            3: {4},  # Expensive: price_level 4
+        }
 
-            genai.configure(api_key=os.environ["GOOGLE_GENERATE_PLAN_API_KEY"])
-            generation_config = {
-                "temperature": 0.5,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "application/json",
+        # Filter restaurants based on the budget
+        names_with_details = [
+            {
+                "name": result["name"],
+                "latitude": result["geometry"]["location"]["lat"],
+                "longitude": result["geometry"]["location"]["lng"],
+                "rating": result.get("rating", "N/A"),
+                "price_level": result.get("price_level", "N/A"),
             }
+            for result in places_results
+            if "price_level" in result
+            and result["price_level"] in budget_mapping[budget]
+        ]
+
+        # If no restaurants found in the preferred budget range, fetch restaurants with price_level N/A
+        if not names_with_details:
+            names_with_details = [
+                {
+                    "name": result["name"],
+                    "latitude": result["geometry"]["location"]["lat"],
+                    "longitude": result["geometry"]["location"]["lng"],
+                    "rating": result.get("rating", "N/A"),
+                    "price_level": result.get("price_level", "N/A"),
+                }
+                for result in places_results
+                if result.get("price_level") is None
+            ]
 
-            model = genai.GenerativeModel(
-                model_name="gemini-1.5-pro",
-                generation_config=generation_config,
-                # safety_settings = Adjust safety settings
-                # See https://ai.google.dev/gemini-api/docs/safety-settings
-                system_instruction='Role: You are an intelligent travel planner.\n\nObjective: Integrate the best matching restaurants from a provided list of nearby options into an existing itinerary based on user preferences. You will receive two JSON objects: "nearby_restaurants" and "response_data". Always suggest unique restaurants only.\n\n### Input Details: ###\n\n1. nearby_restaurants: A JSON object containing lists of restaurants near each place the user is visiting. Each restaurant has a description, TOE (Time of Exploration), and latitude and longitude information.\n\n2. response_data: A JSON object representing the user\'s itinerary, where you will integrate the best matching restaurants.\n\n### Task: ###\n\n1. Select Restaurants:\nBy default, recommend the best-rated and cheapest restaurant.\nIntegrate the selected restaurants into the appropriate places in the "response_data".\n\n\nOutput: Provide only the updated "response_data" JSON. Ensure that the JSON is correctly structured without any bad escaped characters.\n\n### GENERAL STRUCTURE ###\n\n{\n  "response_data": {\n    "1": [\n      {\n        "place_name": <Place_one>,\n        "description": "val1",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n      {\n        "restaurant_name": <Restaurant near to the Place_one>,\n        "description": "<A short description related to the restaurant>",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n      {\n        "place_name": <Place_two>,\n        "description": "val1",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n{\n        "place_name": <Place_three>,\n        "description": "val1",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n{\n        "restaurant_name": <Restaurant near to the Place_three>,\n        "description": "<A short description related to the restaurant",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n\n    ],\n    "day_2": [\n      ...\n    ]\n  }\n}\n\n\n### Guidelines: ###\n\n1. Ensure the selected restaurants are close to the places in the itinerary.\n2. Maintain the correct structure and format of the JSON.\n3. Avoid any bad escaped characters.\n\n### EXAMPLE INPUT ###\n\n{\n"nearby_restaurants": {\n"1": {\n"Gateway of India": [\n{\n"name": "Shamiana",\n"latitude": 18.9220554,\n"longitude": 72.8330387,\n"rating": 4.7,\n"price_level": 3\n},\n{\n"name": "Golden Dragon",\n"latitude": 18.9218167,\n"longitude": 72.8334331,\n"rating": 4.6,\n"price_level": 4\n},\n{\n"name": "Wasabi by Morimoto",\n"latitude": 18.9225215,\n"longitude": 72.83322919999999,\n"rating": 4.6,\n"price_level": 4\n},\n{\n"name": "Souk",\n"latitude": 18.9220554,\n"longitude": 72.8330387,\n"rating": 4.6,\n"price_level": 4\n},\n{\n"name": "Sea Lounge",\n"latitude": 18.921611,\n"longitude": 72.83330509999999,\n"rating": 4.5,\n"price_level": 4\n}\n],\n"Elephanta Caves": [],\n"Dhobi Ghat": [\n{\n"name": "Saikrupa Hotel",\n"latitude": 18.9618653,\n"longitude": 72.8350256,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "ZAS Kitchen",\n"latitude": 18.95548879999999,\n"longitude": 72.83328929999999,\n"rating": 4.6,\n"price_level": "N/A"\n},\n{\n"name": "Bon Appetit",\n"latitude": 18.9545604,\n"longitude": 72.8332453,\n"rating": 4.5,\n"price_level": "N/A"\n},\n{\n"name": "Arrakis Cafe",\n"latitude": 18.9583136,\n"longitude": 72.83748969999999,\n"rating": 4.4,\n"price_level": 1\n},\n{\n"name": "Cafe Shaheen",\n"latitude": 18.9576754,\n"longitude": 72.83133800000002,\n"rating": 4.2,\n"price_level": "N/A"\n}\n]\n},\n"2": {\n"Chhatrapati Shivaji Maharaj Terminus": [\n{\n"name": "Super Taste",\n"latitude": 18.9533807,\n"longitude": 72.8348168,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "Hotel Grant House",\n"latitude": 18.945688,\n"longitude": 72.8350631,\n"rating": 4.6,\n"price_level": 2\n},\n{\n"name": "Bon Appetit",\n"latitude": 18.9545604,\n"longitude": 72.8332453,\n"rating": 4.5,\n"price_level": "N/A"\n},\n{\n"name": "Royal China",\n"latitude": 18.9384896,\n"longitude": 72.8328156,\n"rating": 4.4,\n"price_level": 3\n},\n{\n"name": "Ustaadi",\n"latitude": 18.9456713,\n"longitude": 72.8341837,\n"rating": 4.3,\n"price_level": 3\n}\n],\n"Kanheri Caves": [\n{\n"name": "Famous Chinese",\n"latitude": 19.1353643,\n"longitude": 72.8995789,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "Mumbai Vadapav - मुंबई वडापाव",\n"latitude": 19.1358904,\n"longitude": 72.90076499999999,\n"rating": 4.9,\n"price_level": "N/A"\n},\n{\n"name": "Anna\'s Kitchen",\n"latitude": 19.1351649,\n"longitude": 72.89989829999999,\n"rating": 4.8,\n"price_level": "N/A"\n},\n{\n"name": "chandshah wali garib nawaz hotel",\n"latitude": 19.1393675,\n"longitude": 72.9046766,\n"rating": 4.5,\n"price_level": 1\n},\n{\n"name": "Skky - Ramada",\n"latitude": 19.1358383,\n"longitude": 72.8985196,\n"rating": 4.3,\n"price_level": "N/A"\n}\n],\n"Marine Drive": [\n{\n"name": "All Seasons Banquets",\n"latitude": 18.938381,\n"longitude": 72.824679,\n"rating": 4.9,\n"price_level": "N/A"\n},\n{\n"name": "The Gourmet Restaurant",\n"latitude": 18.9389568,\n"longitude": 72.8287517,\n"rating": 4.7,\n"price_level": "N/A"\n},\n{\n"name": "Joss Chinoise Jaan Joss Banquets",\n"latitude": 18.93289,\n"longitude": 72.83127999999999,\n"rating": 4.7,\n"price_level": "N/A"\n},\n{\n"name": "Royal China",\n"latitude": 18.9384896,\n"longitude": 72.8328156,\n"rating": 4.4,\n"price_level": 3\n},\n{\n"name": "Castle Hotel",\n"latitude": 18.9447236,\n"longitude": 72.8289277,\n"rating": 4.3,\n"price_level": "N/A"\n}\n]\n},\n"3": {\n"Juhu Beach": [\n{\n"name": "Hakkasan Mumbai",\n"latitude": 19.0608636,\n"longitude": 72.834589,\n"rating": 4.7,\n"price_level": 4\n},\n{\n"name": "Bonobo",\n"latitude": 19.0655221,\n"longitude": 72.8340542,\n"rating": 4.3,\n"price_level": 3\n},\n{\n"name": "Candies",\n"latitude": 19.0610866,\n"longitude": 72.8266907,\n"rating": 4.3,\n"price_level": 2\n},\n{\n"name": "Escobar",\n"latitude": 19.0600351,\n"longitude": 72.8363962,\n"rating": 4.2,\n"price_level": 3\n},\n{\n"name": "Joseph’s Tandoori Kitchen",\n"latitude": 19.0617858,\n"longitude": 72.8303955,\n"rating": 4.2,\n"price_level": 2\n}\n],\n"Mani Bhavan": [\n{\n"name": "MAYUR HOSPITALITY",\n"latitude": 18.9552008,\n"longitude": 72.8281485,\n"rating": 4.8,\n"price_level": "N/A"\n},\n{\n"name": "Bon Appetit",\n"latitude": 18.9545604,\n"longitude": 72.8332453,\n"rating": 4.5,\n"price_level": "N/A"\n},\n{\n"name": "Haji Tikka - The Kabab Corner",\n"latitude": 18.9599894,\n"longitude": 72.8306206,\n"rating": 4.3,\n"price_level": 2\n},\n{\n"name": "Kings Shawarma",\n"latitude": 18.9617761,\n"longitude": 72.82895789999999,\n"rating": 4.3,\n"price_level": 2\n},\n{\n"name": "Cafe Shaheen",\n"latitude": 18.9576754,\n"longitude": 72.83133800000002,\n"rating": 4.2,\n"price_level": "N/A"\n}\n],\n"Siddhivinayak Temple": [\n{\n"name": "Food Corp",\n"latitude": 18.969915,\n"longitude": 72.82032509999999,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "Food Box",\n"latitude": 18.9752524,\n"longitude": 72.82382179999999,\n"rating": 4.4,\n"price_level": "N/A"\n},\n{\n"name": "Natural Ice Cream",\n"latitude": 18.9677866,\n"longitude": 72.82051009999999,\n"rating": 4.4,\n"price_level": 2\n},\n{\n"name": "Sarvi Restaurant",\n"latitude": 18.9668207,\n"longitude": 72.8291165,\n"rating": 4.2,\n"price_level": 2\n},\n{\n"name": "Grills & Wok",\n"latitude": 18.9707473,\n"longitude": 72.8323569,\n"rating": 4.2,\n"price_level": 2\n}\n]\n}\n},\n"response_data": {\n"1": [\n{\n"place_name": "Gateway of India",\n"description": "The Gateway of India is an arch monument built in 1924. It is a popular tourist destination, especially during the evening.",\n"TOE": "1.5 hours",\n"lat_long": "18.9220, 72.8347"\n},\n{\n"place_name": "Elephanta Caves",\n"description": "The Elephanta Caves are a UNESCO World Heritage Site located on an island near Mumbai. The caves are dedicated to the Hindu god Shiva and are known for their intricate carvings. It is recommended to visit in the morning or afternoon.",\n"TOE": "2.5 hours",\n"lat_long": "18.9843, 72.8777"\n},\n{\n"place_name": "Dhobi Ghat",\n"description": "Dhobi Ghat is an open-air laundry in Mumbai. It is a unique and fascinating place to visit. It is recommended to visit in the morning or afternoon.",\n"TOE": "1 hour",\n"lat_long": "18.9583, 72.8343"\n}\n],\n"2": [\n{\n"place_name": "Chhatrapati Shivaji Maharaj Terminus",\n"description": "Chhatrapati Shivaji Maharaj Terminus is a UNESCO World Heritage Site located in Mumbai. It is a beautiful example of Victorian Gothic Revival architecture. It is recommended to visit in the morning or afternoon.",\n"TOE": "2 hours",\n"lat_long": "18.9491, 72.8335"\n},\n{\n"place_name": "Kanheri Caves",\n"description": "The Kanheri Caves are a group of ancient Buddhist cave temples located in the Sanjay Gandhi National Park. It is recommended to visit in the morning or afternoon.",\n"TOE": "3 hours",\n"lat_long": "19.1426, 72.9018"\n},\n{\n"place_name": "Marine Drive",\n"description": "Marine Drive is a beautiful promenade located along the coast of Mumbai. It is a popular spot for evening walks and strolls.",\n"TOE": "1 hour",\n"lat_long": "18.9392, 72.8247"\n}\n],\n"3": [\n{\n"place_name": "Juhu Beach",\n"description": "Juhu Beach is a popular beach in Mumbai. It is a great place to relax and enjoy the sunset. It is recommended to visit in the evening.",\n"TOE": "2 hours",\n"lat_long": "19.0646, 72.8379"\n},\n{\n"place_name": "Mani Bhavan",\n"description": "Mani Bhavan is a historic building in Mumbai that was once the home of Mahatma Gandhi. It is a popular destination for history buffs. It is recommended to visit in the morning or afternoon.",\n"TOE": "1.5 hours",\n"lat_long": "18.9582, 72.8291"\n},\n{\n"place_name": "Siddhivinayak Temple",\n"description": "Siddhivinayak Temple is a popular Hindu temple dedicated to Lord Ganesha. It is a popular destination for devotees and tourists alike. It is recommended to visit in the morning or afternoon.",\n"TOE": "1 hour",\n"lat_long": "18.9727, 72.8252"\n}\n]\n}\n}\n\n\n\n### EXAMPLE OUTPUT ###\n{\n    "1": [\n      {\n        "place_name": "Gateway of India",\n        "description": "The Gateway of India is an arch monument built in 1924. It is a popular tourist destination, especially during the evening.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9220, 72.8347"\n      },\n      {\n        "restaurant_name": "Shamiana",\n        "description": "A fine dining restaurant serving Indian, Asian, and Continental cuisines.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9220554, 72.8330387"\n      },\n      {\n        "place_name": "Elephanta Caves",\n        "description": "The Elephanta Caves are a UNESCO World Heritage Site located on an island near Mumbai. The caves are dedicated to the Hindu god Shiva and are known for their intricate carvings. It is recommended to visit in the morning or afternoon.",\n        "TOE": "2.5 hours",\n        "lat_long": "18.9843, 72.8777"\n      },\n      {\n        "place_name": "Dhobi Ghat",\n        "description": "Dhobi Ghat is an open-air laundry in Mumbai. It is a unique and fascinating place to visit. It is recommended to visit in the morning or afternoon.",\n        "TOE": "1 hour",\n        "lat_long": "18.9583, 72.8343"\n      },\n      {\n        "restaurant_name": "Arrakis Cafe",\n        "description": "A cafe offering a casual dining experience with a variety of options.",\n        "TOE": "1 hour",\n        "lat_long": "18.9583136, 72.83748969999999"\n      }\n    ],\n    "2": [\n      {\n        "place_name": "Chhatrapati Shivaji Maharaj Terminus",\n        "description": "Chhatrapati Shivaji Maharaj Terminus is a UNESCO World Heritage Site located in Mumbai. It is a beautiful example of Victorian Gothic Revival architecture. It is recommended to visit in the morning or afternoon.",\n        "TOE": "2 hours",\n        "lat_long": "18.9491, 72.8335"\n      },\n      {\n        "restaurant_name": "Super Taste",\n        "description": "A local restaurant known for its delicious and affordable food.",\n        "TOE": "2 hours",\n        "lat_long": "18.9533807, 72.8348168"\n      },\n      {\n        "place_name": "Kanheri Caves",\n        "description": "The Kanheri Caves are a group of ancient Buddhist cave temples located in the Sanjay Gandhi National Park. It is recommended to visit in the morning or afternoon.",\n        "TOE": "3 hours",\n        "lat_long": "19.1426, 72.9018"\n      },\n      {\n        "restaurant_name": "Famous Chinese",\n        "description": "A local restaurant serving authentic Chinese dishes.",\n        "TOE": "3 hours",\n        "lat_long": "19.1353643, 72.8995789"\n      },\n      {\n        "place_name": "Marine Drive",\n        "description": "Marine Drive is a beautiful promenade located along the coast of Mumbai. It is a popular spot for evening walks and strolls.",\n        "TOE": "1 hour",\n        "lat_long": "18.9392, 72.8247"\n      },\n      {\n        "restaurant_name": "All Seasons Banquets",\n        "description": "A banquet hall offering a wide selection of cuisines.",\n        "TOE": "1 hour",\n        "lat_long": "18.938381, 72.824679"\n      }\n    ],\n    "3": [\n      {\n        "place_name": "Juhu Beach",\n        "description": "Juhu Beach is a popular beach in Mumbai. It is a great place to relax and enjoy the sunset. It is recommended to visit in the evening.",\n        "TOE": "2 hours",\n        "lat_long": "19.0646, 72.8379"\n      },\n      {\n        "restaurant_name": "Hakkasan Mumbai",\n        "description": "A fine dining restaurant offering modern Cantonese cuisine.",\n        "TOE": "2 hours",\n        "lat_long": "19.0608636, 72.834589"\n      },\n      {\n        "place_name": "Mani Bhavan",\n        "description": "Mani Bhavan is a historic building in Mumbai that was once the home of Mahatma Gandhi. It is a popular destination for history buffs. It is recommended to visit in the morning or afternoon.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9582, 72.8291"\n      },\n      {\n        "restaurant_name": "MAYUR HOSPITALITY",\n        "description": "A restaurant offering a variety of cuisines and a casual dining experience.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9552008, 72.8281485"\n      },\n      {\n        "place_name": "Siddhivinayak Temple",\n        "description": "Siddhivinayak Temple is a popular Hindu temple dedicated to Lord Ganesha. It is a popular destination for devotees and tourists alike. It is recommended to visit in the morning or afternoon.",\n        "TOE": "1 hour",\n        "lat_long": "18.9727, 72.8252"\n      },\n      {\n        "restaurant_name": "Food Corp",\n        "description": "A restaurant known for its quick and affordable food.",\n        "TOE": "1 hour",\n        "lat_long": "18.969915, 72.82032509999999"\n      }\n    ]\n}',
+        return names_with_details
+
+    async def validate_merged_plan(self, model, text, plan, nearby_restaurants):
+        """
+        Parses the merged itinerary, re-merging only the days that came back invalid.
+
+        Parameters:
+        - model: The Gemini model used for the merge
+        - text: Raw merge response
+        - plan: The pre-plan itinerary the merge was based on
+        - nearby_restaurants: Restaurants fetched for each place, keyed by day
+
+        Returns:
+        - Dictionary of day -> stops, keyed exactly like the pre-plan. A day that
+          is still invalid after its retry keeps its pre-plan stops.
+        """
+        try:
+            days, _ = llm_output.parse_days(text, llm_output.MERGED_STOP)
+        except LLMOutputError:
+            days = {}
+
+        failed_days = [day for day in plan if day not in days]
+        retried_days = await asyncio.gather(
+            *(
+                self.merge_day(model, day, plan[day], nearby_restaurants.get(day, {}))
+                for day in failed_days
             )
-            response_merged = model.generate_content(str(response_raw))
+        )
+        days.update(zip(failed_days, retried_days))
 
-            response_data_unmerged = response_merged.text
-            generation_config_places_description = {
-                "temperature": 0.5,
-                "top_p": 0.95,
-                "top_k": 64,
-                "max_output_tokens": 8192,
-                "response_mime_type": "text/plain",
-            }
-            places_description = genai.GenerativeModel(
-                model_name="gemini-1.5-flash",
-                generation_config=generation_config_places_description,
-                # safety_settings = Adjust safety settings
-                # See https://ai.google.dev/gemini-api/docs/safety-settings
-                system_instruction="You will receive the places name, your job is to write a short description about it. It will be used to give a overview of the city. The description should be under 40 words and just one sentence.",
+        return {day: days[day] for day in plan}
+
+    async def merge_day(self, model, day, stops, restaurants):
+        """
+        Merges restaurants into a single day of the itinerary.
+
+        Returns:
+        - List of stops for the day, or the unmerged stops if Gemini's output is
+          still invalid
+        """
+        day_input = {
+            "nearby_restaurants": {day: restaurants},
+            "response_data": {day: stops},
+        }
+        for _ in range(LLM_OUTPUT_RETRIES):
+            record_retry(model)
+            response = await model.generate_content_async(str(day_input))
+            try:
+                days, _ = llm_output.parse_days(response.text, llm_output.MERGED_STOP)
+            except LLMOutputError:
+                continue
+            if day in days:
+                return days[day]
+            if len(days) == 1:
+                return next(iter(days.values()))
+        return stops
+
+    async def generate_plan(self, data, on_stage=None):
+        """
+        Runs the full generate-trip pipeline and stores the resulting trip.
+
+        Parameters:
+        - data: Mapping with user_id, stay_details, number_of_days, budget,
+          additional_preferences, response_data (the pre-plan JSON string) and
+          optionally prefetch_token returned by pre-plan-trip
+        - on_stage: Optional async callable invoked with the name of each stage
+          as it starts, used by the background job runner to report progress
+
+        Returns:
+        - The merged plan JSON string returned by Gemini
+        """
+
+        async def report(stage):
+            if on_stage is not None:
+                await on_stage(stage)
+
+        user_id = data.get("user_id")
+        stay_details = data.get("stay_details")
+        number_of_days = data.get("number_of_days")
+        budget = data.get("budget")
+        additional_preferences = data.get("additional_preferences")
+        response_raw = data.get("response_data")
+
+        response_raw_dict = fastjson.loads(response_raw)
+        lat_long_values = self.extract_lat_long(response_raw_dict)
+        await report("places.nearby")
+        # Use restaurants prefetched after the pre-plan when they are ready
+        with timing.span("db.prefetch"):
+            nearby_restaurants = await sync_to_async(take_prefetched_restaurants)(
+                data.get("prefetch_token"), lat_long_values, budget
+            )
+        if nearby_restaurants is None:
+            nearby_restaurants = await self.fetch_nearby_restaurants(
+                lat_long_values, budget
             )
 
-            places_description_response = places_description.generate_content(
-                stay_details
-            ).text
+        response_raw = {
+            "nearby_restaurants": nearby_restaurants,
+            "response_data": response_raw_dict,
+        }
 
-            self.insert_trip_details(
+        api_key = os.environ["GOOGLE_GENERATE_PLAN_API_KEY"]
+        generation_config = {
+            "temperature": 0.5,
+            "top_p": 0.95,
+            "top_k": 64,
+            "max_output_tokens": 8192,
+            "response_mime_type": "application/json",
+        }
+
+        model = generative_model(
+            api_key,
+            endpoint="generate-trip",
+            operation="merge",
+            model_name="gemini-1.5-pro",
+            generation_config=generation_config,
+            # safety_settings = Adjust safety settings
+            # See https://ai.google.dev/gemini-api/docs/safety-settings
+            system_instruction='Role: You are an intelligent travel planner.\n\nObjective: Integrate the best matching restaurants from a provided list of nearby options into an existing itinerary based on user preferences. You will receive two JSON objects: "nearby_restaurants" and "response_data". Always suggest unique restaurants only.\n\n### Input Details: ###\n\n1. nearby_restaurants: A JSON object containing lists of restaurants near each place the user is visiting. Each restaurant has a description, TOE (Time of Exploration), and latitude and longitude information.\n\n2. response_data: A JSON object representing the user\'s itinerary, where you will integrate the best matching restaurants.\n\n### Task: ###\n\n1. Select Restaurants:\nBy default, recommend the best-rated and cheapest restaurant.\nIntegrate the selected restaurants into the appropriate places in the "response_data".\n\n\nOutput: Provide only the updated "response_data" JSON. Ensure that the JSON is correctly structured without any bad escaped characters.\n\n### GENERAL STRUCTURE ###\n\n{\n  "response_data": {\n    "1": [\n      {\n        "place_name": <Place_one>,\n        "description": "val1",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n      {\n        "restaurant_name": <Restaurant near to the Place_one>,\n        "description": "<A short description related to the restaurant>",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n      {\n        "place_name": <Place_two>,\n        "description": "val1",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n{\n        "place_name": <Place_three>,\n        "description": "val1",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n{\n        "restaurant_name": <Restaurant near to the Place_three>,\n        "description": "<A short description related to the restaurant",\n        "TOE": "val2",\n        "lat_long": "lat,long"\n      },\n\n    ],\n    "day_2": [\n      ...\n    ]\n  }\n}\n\n\n### Guidelines: ###\n\n1. Ensure the selected restaurants are close to the places in the itinerary.\n2. Maintain the correct structure and format of the JSON.\n3. Avoid any bad escaped characters.\n\n### EXAMPLE INPUT ###\n\n{\n"nearby_restaurants": {\n"1": {\n"Gateway of India": [\n{\n"name": "Shamiana",\n"latitude": 18.9220554,\n"longitude": 72.8330387,\n"rating": 4.7,\n"price_level": 3\n},\n{\n"name": "Golden Dragon",\n"latitude": 18.9218167,\n"longitude": 72.8334331,\n"rating": 4.6,\n"price_level": 4\n},\n{\n"name": "Wasabi by Morimoto",\n"latitude": 18.9225215,\n"longitude": 72.83322919999999,\n"rating": 4.6,\n"price_level": 4\n},\n{\n"name": "Souk",\n"latitude": 18.9220554,\n"longitude": 72.8330387,\n"rating": 4.6,\n"price_level": 4\n},\n{\n"name": "Sea Lounge",\n"latitude": 18.921611,\n"longitude": 72.83330509999999,\n"rating": 4.5,\n"price_level": 4\n}\n],\n"Elephanta Caves": [],\n"Dhobi Ghat": [\n{\n"name": "Saikrupa Hotel",\n"latitude": 18.9618653,\n"longitude": 72.8350256,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "ZAS Kitchen",\n"latitude": 18.95548879999999,\n"longitude": 72.83328929999999,\n"rating": 4.6,\n"price_level": "N/A"\n},\n{\n"name": "Bon Appetit",\n"latitude": 18.9545604,\n"longitude": 72.8332453,\n"rating": 4.5,\n"price_level": "N/A"\n},\n{\n"name": "Arrakis Cafe",\n"latitude": 18.9583136,\n"longitude": 72.83748969999999,\n"rating": 4.4,\n"price_level": 1\n},\n{\n"name": "Cafe Shaheen",\n"latitude": 18.9576754,\n"longitude": 72.83133800000002,\n"rating": 4.2,\n"price_level": "N/A"\n}\n]\n},\n"2": {\n"Chhatrapati Shivaji Maharaj Terminus": [\n{\n"name": "Super Taste",\n"latitude": 18.9533807,\n"longitude": 72.8348168,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "Hotel Grant House",\n"latitude": 18.945688,\n"longitude": 72.8350631,\n"rating": 4.6,\n"price_level": 2\n},\n{\n"name": "Bon Appetit",\n"latitude": 18.9545604,\n"longitude": 72.8332453,\n"rating": 4.5,\n"price_level": "N/A"\n},\n{\n"name": "Royal China",\n"latitude": 18.9384896,\n"longitude": 72.8328156,\n"rating": 4.4,\n"price_level": 3\n},\n{\n"name": "Ustaadi",\n"latitude": 18.9456713,\n"longitude": 72.8341837,\n"rating": 4.3,\n"price_level": 3\n}\n],\n"Kanheri Caves": [\n{\n"name": "Famous Chinese",\n"latitude": 19.1353643,\n"longitude": 72.8995789,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "Mumbai Vadapav - मुंबई वडापाव",\n"latitude": 19.1358904,\n"longitude": 72.90076499999999,\n"rating": 4.9,\n"price_level": "N/A"\n},\n{\n"name": "Anna\'s Kitchen",\n"latitude": 19.1351649,\n"longitude": 72.89989829999999,\n"rating": 4.8,\n"price_level": "N/A"\n},\n{\n"name": "chandshah wali garib nawaz hotel",\n"latitude": 19.1393675,\n"longitude": 72.9046766,\n"rating": 4.5,\n"price_level": 1\n},\n{\n"name": "Skky - Ramada",\n"latitude": 19.1358383,\n"longitude": 72.8985196,\n"rating": 4.3,\n"price_level": "N/A"\n}\n],\n"Marine Drive": [\n{\n"name": "All Seasons Banquets",\n"latitude": 18.938381,\n"longitude": 72.824679,\n"rating": 4.9,\n"price_level": "N/A"\n},\n{\n"name": "The Gourmet Restaurant",\n"latitude": 18.9389568,\n"longitude": 72.8287517,\n"rating": 4.7,\n"price_level": "N/A"\n},\n{\n"name": "Joss Chinoise Jaan Joss Banquets",\n"latitude": 18.93289,\n"longitude": 72.83127999999999,\n"rating": 4.7,\n"price_level": "N/A"\n},\n{\n"name": "Royal China",\n"latitude": 18.9384896,\n"longitude": 72.8328156,\n"rating": 4.4,\n"price_level": 3\n},\n{\n"name": "Castle Hotel",\n"latitude": 18.9447236,\n"longitude": 72.8289277,\n"rating": 4.3,\n"price_level": "N/A"\n}\n]\n},\n"3": {\n"Juhu Beach": [\n{\n"name": "Hakkasan Mumbai",\n"latitude": 19.0608636,\n"longitude": 72.834589,\n"rating": 4.7,\n"price_level": 4\n},\n{\n"name": "Bonobo",\n"latitude": 19.0655221,\n"longitude": 72.8340542,\n"rating": 4.3,\n"price_level": 3\n},\n{\n"name": "Candies",\n"latitude": 19.0610866,\n"longitude": 72.8266907,\n"rating": 4.3,\n"price_level": 2\n},\n{\n"name": "Escobar",\n"latitude": 19.0600351,\n"longitude": 72.8363962,\n"rating": 4.2,\n"price_level": 3\n},\n{\n"name": "Joseph’s Tandoori Kitchen",\n"latitude": 19.0617858,\n"longitude": 72.8303955,\n"rating": 4.2,\n"price_level": 2\n}\n],\n"Mani Bhavan": [\n{\n"name": "MAYUR HOSPITALITY",\n"latitude": 18.9552008,\n"longitude": 72.8281485,\n"rating": 4.8,\n"price_level": "N/A"\n},\n{\n"name": "Bon Appetit",\n"latitude": 18.9545604,\n"longitude": 72.8332453,\n"rating": 4.5,\n"price_level": "N/A"\n},\n{\n"name": "Haji Tikka - The Kabab Corner",\n"latitude": 18.9599894,\n"longitude": 72.8306206,\n"rating": 4.3,\n"price_level": 2\n},\n{\n"name": "Kings Shawarma",\n"latitude": 18.9617761,\n"longitude": 72.82895789999999,\n"rating": 4.3,\n"price_level": 2\n},\n{\n"name": "Cafe Shaheen",\n"latitude": 18.9576754,\n"longitude": 72.83133800000002,\n"rating": 4.2,\n"price_level": "N/A"\n}\n],\n"Siddhivinayak Temple": [\n{\n"name": "Food Corp",\n"latitude": 18.969915,\n"longitude": 72.82032509999999,\n"rating": 5,\n"price_level": "N/A"\n},\n{\n"name": "Food Box",\n"latitude": 18.9752524,\n"longitude": 72.82382179999999,\n"rating": 4.4,\n"price_level": "N/A"\n},\n{\n"name": "Natural Ice Cream",\n"latitude": 18.9677866,\n"longitude": 72.82051009999999,\n"rating": 4.4,\n"price_level": 2\n},\n{\n"name": "Sarvi Restaurant",\n"latitude": 18.9668207,\n"longitude": 72.8291165,\n"rating": 4.2,\n"price_level": 2\n},\n{\n"name": "Grills & Wok",\n"latitude": 18.9707473,\n"longitude": 72.8323569,\n"rating": 4.2,\n"price_level": 2\n}\n]\n}\n},\n"response_data": {\n"1": [\n{\n"place_name": "Gateway of India",\n"description": "The Gateway of India is an arch monument built in 1924. It is a popular tourist destination, especially during the evening.",\n"TOE": "1.5 hours",\n"lat_long": "18.9220, 72.8347"\n},\n{\n"place_name": "Elephanta Caves",\n"description": "The Elephanta Caves are a UNESCO World Heritage Site located on an island near Mumbai. The caves are dedicated to the Hindu god Shiva and are known for their intricate carvings. It is recommended to visit in the morning or afternoon.",\n"TOE": "2.5 hours",\n"lat_long": "18.9843, 72.8777"\n},\n{\n"place_name": "Dhobi Ghat",\n"description": "Dhobi Ghat is an open-air laundry in Mumbai. It is a unique and fascinating place to visit. It is recommended to visit in the morning or afternoon.",\n"TOE": "1 hour",\n"lat_long": "18.9583, 72.8343"\n}\n],\n"2": [\n{\n"place_name": "Chhatrapati Shivaji Maharaj Terminus",\n"description": "Chhatrapati Shivaji Maharaj Terminus is a UNESCO World Heritage Site located in Mumbai. It is a beautiful example of Victorian Gothic Revival architecture. It is recommended to visit in the morning or afternoon.",\n"TOE": "2 hours",\n"lat_long": "18.9491, 72.8335"\n},\n{\n"place_name": "Kanheri Caves",\n"description": "The Kanheri Caves are a group of ancient Buddhist cave temples located in the Sanjay Gandhi National Park. It is recommended to visit in the morning or afternoon.",\n"TOE": "3 hours",\n"lat_long": "19.1426, 72.9018"\n},\n{\n"place_name": "Marine Drive",\n"description": "Marine Drive is a beautiful promenade located along the coast of Mumbai. It is a popular spot for evening walks and strolls.",\n"TOE": "1 hour",\n"lat_long": "18.9392, 72.8247"\n}\n],\n"3": [\n{\n"place_name": "Juhu Beach",\n"description": "Juhu Beach is a popular beach in Mumbai. It is a great place to relax and enjoy the sunset. It is recommended to visit in the evening.",\n"TOE": "2 hours",\n"lat_long": "19.0646, 72.8379"\n},\n{\n"place_name": "Mani Bhavan",\n"description": "Mani Bhavan is a historic building in Mumbai that was once the home of Mahatma Gandhi. It is a popular destination for history buffs. It is recommended to visit in the morning or afternoon.",\n"TOE": "1.5 hours",\n"lat_long": "18.9582, 72.8291"\n},\n{\n"place_name": "Siddhivinayak Temple",\n"description": "Siddhivinayak Temple is a popular Hindu temple dedicated to Lord Ganesha. It is a popular destination for devotees and tourists alike. It is recommended to visit in the morning or afternoon.",\n"TOE": "1 hour",\n"lat_long": "18.9727, 72.8252"\n}\n]\n}\n}\n\n\n\n### EXAMPLE OUTPUT ###\n{\n    "1": [\n      {\n        "place_name": "Gateway of India",\n        "description": "The Gateway of India is an arch monument built in 1924. It is a popular tourist destination, especially during the evening.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9220, 72.8347"\n      },\n      {\n        "restaurant_name": "Shamiana",\n        "description": "A fine dining restaurant serving Indian, Asian, and Continental cuisines.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9220554, 72.8330387"\n      },\n      {\n        "place_name": "Elephanta Caves",\n        "description": "The Elephanta Caves are a UNESCO World Heritage Site located on an island near Mumbai. The caves are dedicated to the Hindu god Shiva and are known for their intricate carvings. It is recommended to visit in the morning or afternoon.",\n        "TOE": "2.5 hours",\n        "lat_long": "18.9843, 72.8777"\n      },\n      {\n        "place_name": "Dhobi Ghat",\n        "description": "Dhobi Ghat is an open-air laundry in Mumbai. It is a unique and fascinating place to visit. It is recommended to visit in the morning or afternoon.",\n        "TOE": "1 hour",\n        "lat_long": "18.9583, 72.8343"\n      },\n      {\n        "restaurant_name": "Arrakis Cafe",\n        "description": "A cafe offering a casual dining experience with a variety of options.",\n        "TOE": "1 hour",\n        "lat_long": "18.9583136, 72.83748969999999"\n      }\n    ],\n    "2": [\n      {\n        "place_name": "Chhatrapati Shivaji Maharaj Terminus",\n        "description": "Chhatrapati Shivaji Maharaj Terminus is a UNESCO World Heritage Site located in Mumbai. It is a beautiful example of Victorian Gothic Revival architecture. It is recommended to visit in the morning or afternoon.",\n        "TOE": "2 hours",\n        "lat_long": "18.9491, 72.8335"\n      },\n      {\n        "restaurant_name": "Super Taste",\n        "description": "A local restaurant known for its delicious and affordable food.",\n        "TOE": "2 hours",\n        "lat_long": "18.9533807, 72.8348168"\n      },\n      {\n        "place_name": "Kanheri Caves",\n        "description": "The Kanheri Caves are a group of ancient Buddhist cave temples located in the Sanjay Gandhi National Park. It is recommended to visit in the morning or afternoon.",\n        "TOE": "3 hours",\n        "lat_long": "19.1426, 72.9018"\n      },\n      {\n        "restaurant_name": "Famous Chinese",\n        "description": "A local restaurant serving authentic Chinese dishes.",\n        "TOE": "3 hours",\n        "lat_long": "19.1353643, 72.8995789"\n      },\n      {\n        "place_name": "Marine Drive",\n        "description": "Marine Drive is a beautiful promenade located along the coast of Mumbai. It is a popular spot for evening walks and strolls.",\n        "TOE": "1 hour",\n        "lat_long": "18.9392, 72.8247"\n      },\n      {\n        "restaurant_name": "All Seasons Banquets",\n        "description": "A banquet hall offering a wide selection of cuisines.",\n        "TOE": "1 hour",\n        "lat_long": "18.938381, 72.824679"\n      }\n    ],\n    "3": [\n      {\n        "place_name": "Juhu Beach",\n        "description": "Juhu Beach is a popular beach in Mumbai. It is a great place to relax and enjoy the sunset. It is recommended to visit in the evening.",\n        "TOE": "2 hours",\n        "lat_long": "19.0646, 72.8379"\n      },\n      {\n        "restaurant_name": "Hakkasan Mumbai",\n        "description": "A fine dining restaurant offering modern Cantonese cuisine.",\n        "TOE": "2 hours",\n        "lat_long": "19.0608636, 72.834589"\n      },\n      {\n        "place_name": "Mani Bhavan",\n        "description": "Mani Bhavan is a historic building in Mumbai that was once the home of Mahatma Gandhi. It is a popular destination for history buffs. It is recommended to visit in the morning or afternoon.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9582, 72.8291"\n      },\n      {\n        "restaurant_name": "MAYUR HOSPITALITY",\n        "description": "A restaurant offering a variety of cuisines and a casual dining experience.",\n        "TOE": "1.5 hours",\n        "lat_long": "18.9552008, 72.8281485"\n      },\n      {\n        "place_name": "Siddhivinayak Temple",\n        "description": "Siddhivinayak Temple is a popular Hindu temple dedicated to Lord Ganesha. It is a popular destination for devotees and tourists alike. It is recommended to visit in the morning or afternoon.",\n        "TOE": "1 hour",\n        "lat_long": "18.9727, 72.8252"\n      },\n      {\n        "restaurant_name": "Food Corp",\n        "description": "A restaurant known for its quick and affordable food.",\n        "TOE": "1 hour",\n        "lat_long": "18.969915, 72.82032509999999"\n      }\n    ]\n}',
+        )
+        generation_config_places_description = {
+            "temperature": 0.5,
+            "top_p": 0.95,
+            "top_k": 64,
+            "max_output_tokens": 8192,
+            "response_mime_type": "text/plain",
+        }
+        places_description = generative_model(
+            api_key,
+            endpoint="generate-trip",
+            operation="places_description",
+            cached=True,
+            model_name="gemini-1.5-flash",
+            generation_config=generation_config_places_description,
+            # safety_settings = Adjust safety settings
+            # See https://ai.google.dev/gemini-api/docs/safety-settings
+            system_instruction="You will receive the places name, your job is to write a short description about it. It will be used to give a overview of the city. The description should be under 40 words and just one sentence.",
+        )
+
+        await report("gemini.merge")
+        # The merge and the city description are independent, so run them together
+        response_merged, places_description_response = await asyncio.gather(
+            model.generate_content_async(str(response_raw)),
+            places_description.generate_content_async(stay_details),
+        )
+        merged_plan = await self.validate_merged_plan(
+            model, response_merged.text, response_raw_dict, nearby_restaurants
+        )
+        places_description_response = places_description_response.text
+
+        await report("db.insert")
+        with timing.span("db.insert"):
+            await sync_to_async(self.insert_trip_details)(
                 user_id,
                 stay_details,
                 number_of_days,
                 budget,
                 additional_preferences,
-                response_data_unmerged,
+                merged_plan,
                 nearby_restaurants,
                 places_description_response,
             )
 
+        return fastjson.dumps(merged_plan)
+
+    async def post(self, request):
+        job = parse_flag(request.data.get("job"))
+        if job is None:
+            return Response(
+                {"error": "job must be true, false, 1 or 0"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if job:
+            return await self.enqueue_job(request)
+
+        try:
+            response_data_unmerged = await self.generate_plan(request.data)
             return Response(response_data_unmerged, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    async def enqueue_job(self, request):
+        """
+        Validates the request and queues it for the background job runner.
+
+        Returns:
+        - Response: 202 with the job_id to poll through fetch-generation-job/
+        """
+        payload = {field: request.data.get(field) for field in GENERATION_JOB_FIELDS}
+
+        try:
+            response_data = fastjson.loads(payload["response_data"])
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "response_data must be a JSON encoded plan"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not isinstance(response_data, dict):
+            return Response(
+                {"error": "response_data must be a JSON encoded plan"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        job = await TripGenerationJob.objects.acreate(
+            user_id=payload["user_id"], payload=payload
+        )
+        return Response(
+            {"job_id": job.job_id, "status": job.status},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class FetchGenerationJob(APIView):
+    """
+    API view to poll a background generate-trip job.
+
+    Handles the POST request to fetch the stage and outcome of a job created by
+    posting to generate-trip/ with "job": true.
+
+    Parameters:
+    - job_id: ID of the job
+
+    Returns:
+    - Response: Job status, current stage, and the generated plan once finished
+    """
+
+    def post(self, request):
+        try:
+            job_id = request.data.get("job_id")
+            job = TripGenerationJob.objects.filter(job_id=job_id).first()
+
+            if not job:
+                return Response(
+                    {"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+
+            serializer = TripGenerationJobSerializer(job)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 
 class FetchTripDetails(APIView):
     """
@@ -324,33 +657,126 @@ class FetchTripDetails(APIView):
 
     Parameters:
     - user_id: ID of the user
+    - list (optional): Return a page of trip summaries instead of every trip
+      in full. In list mode:
+      - cursor: next_cursor of the previous page
+      - limit: Trips per page, at most MAX_LIMIT
+      - fields: Extra columns to include, from TripSummarySerializer.EXTRA_FIELDS
 
     Returns:
-    - Response: Serialized trip details as JSON or an error message
+    - Response: Serialized trip details as JSON or an error message.
+      In list mode {"results": [...], "next_cursor": ...}, newest trip first,
+      with next_cursor null on the last page.
 
     """
 
-    def post(self, request):
-        try:
-            user_id = request.data.get("user_id")
-            # Fetch all records where user_id matches
-            trip_details = UserTripInfo.objects.filter(user_id=user_id)
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
 
-            # Serialize the queryset
-            serializer = UserTripInfoSerializer(trip_details, many=True)
-            serialized_data = serializer.data
+    def get(self, request):
+        return self.post(request)
 
-            # Return the serialized data as JSON response
-            return Response(serialized_data, status=status.HTTP_200_OK)
+    def post(self, request):
+        try:
+            params = request.query_params if request.method == "GET" else request.data
+            user_id = params.get("user_id")
+            list_mode = parse_flag(params.get("list"))
+            if list_mode is None:
+                return Response(
+                    {"error": "list must be true, false, 1 or 0"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            with replicas.reads(user_id=user_id):
+                if list_mode:
+                    return self.list_trips(request, params, user_id)
+                return self.all_trips(request, user_id)
 
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def all_trips(self, request, user_id):
+        # Fetch all records where user_id matches
+        trip_details = UserTripInfo.objects.filter(user_id=user_id)
 
-class GetPhotosForLocations(APIView):
-    def post(self, request):
+        # Compare versions before reading any plan
+        if request.headers.get("If-None-Match"):
+            etag = conditional.list_etag(
+                trip_details.order_by("id").values_list("id", "plan_version")
+            )
+            if conditional.is_fresh(request, etag):
+                return conditional.not_modified(etag)
+
+        # Serialize the queryset from its values, as UserTripInfoSerializer would
+        serialized_data = FastUserTripInfoSerializer(trip_details.order_by("id")).data
+        etag = conditional.list_etag(
+            (trip["id"], trip["plan_version"]) for trip in serialized_data
+        )
+
+        # Return the serialized data as JSON response
+        return conditional.with_etag(
+            Response(serialized_data, status=status.HTTP_200_OK), etag
+        )
+
+    def list_trips(self, request, params, user_id):
+        fields = params.get("fields") or []
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        unknown = set(fields) - set(TripSummarySerializer.EXTRA_FIELDS)
+        if unknown:
+            return Response(
+                {"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = min(int(params.get("limit", self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+            cursor = params.get("cursor")
+            last_id = int(base64.urlsafe_b64decode(cursor)) if cursor else None
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Invalid limit or cursor"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit < 1:
+            return Response(
+                {"error": "Invalid limit or cursor"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Keyset pagination on the (user_id, id) index: each page starts right
+        # after the last id of the previous one instead of counting past an offset
+        trips = UserTripInfo.objects.filter(user_id=user_id).only(
+            "id", "plan_version", *TripSummarySerializer.SUMMARY_FIELDS, *fields
+        )
+        if last_id is not None:
+            trips = trips.filter(id__lt=last_id)
+        with timing.span("db.fetch"):
+            page = list(trips.order_by("-id")[: limit + 1])
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = base64.urlsafe_b64encode(str(page[-1].id).encode()).decode()
+
+        etag = conditional.list_etag(
+            [(trip.id, trip.plan_version) for trip in page], sorted(fields), next_cursor
+        )
+        if conditional.is_fresh(request, etag):
+            return conditional.not_modified(etag)
+
+        serializer = FastTripSummarySerializer(
+            page, fields=[*TripSummarySerializer.SUMMARY_FIELDS, *fields]
+        )
+        return conditional.with_etag(
+            Response(
+                {"results": serializer.data, "next_cursor": next_cursor},
+                status=status.HTTP_200_OK,
+            ),
+            etag,
+        )
+
+
+class GetPhotosForLocations(AsyncAPIView):
+    async def post(self, request):
         try:
             locations = request.data.get("locations", [])
             photo_map = {}
@@ -361,13 +787,27 @@ class GetPhotosForLocations(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Fetch photos for each location
-            for location in locations:
-                location_name = location.get("stay_details")
-                if location_name:
-                    photo_reference = self.get_photo_reference(location_name)
-                    if photo_reference:
-                        photo_map[location_name] = photo_reference
+            location_names = [
+                location.get("stay_details")
+                for location in locations
+                if location.get("stay_details")
+            ]
+
+            # Fetch photos for all locations concurrently
+            with timing.span("places.photos"):
+                async with httpx.AsyncClient(timeout=PLACES_TIMEOUT) as client:
+                    photo_references = await asyncio.gather(
+                        *(
+                            self.get_photo_reference(client, location_name)
+                            for location_name in location_names
+                        )
+                    )
+
+            for location_name, photo_reference in zip(
+                location_names, photo_references
+            ):
+                if photo_reference:
+                    photo_map[location_name] = photo_reference
 
             return Response(photo_map)
 
@@ -376,24 +816,27 @@ class GetPhotosForLocations(APIView):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def get_photo_reference(self, location_name):
-        url = "https://places.googleapis.com/v1/places:searchText"
+    async def get_photo_reference(self, client, location_name):
+        url = f"{settings.GOOGLE_PLACES_NEW_URL}/v1/places:searchText"
         headers = {
             "X-Goog-Api-Key": os.environ.get("GOOGLE_PLACES"),
             "X-Goog-FieldMask": "places.displayName,places.photos",
         }
         body = {"textQuery": location_name, "pageSize": 1}
 
-        response = requests.post(url, headers=headers, json=body)
-        response_data = response.json()
+        async def load():
+            response = await client.post(url, headers=headers, json=body)
+            response_data = response.json()
+
+            if response_data.get("places"):
+                photos = response_data["places"][0].get("photos", [])
+                if photos:
+                    photo_reference = photos[0]["name"].split("/photos/")[1]
+                    return photo_reference
 
-        if response_data.get("places"):
-            photos = response_data["places"][0].get("photos", [])
-            if photos:
-                photo_reference = photos[0]["name"].split("/photos/")[1]
-                return photo_reference
+            return None
 
-        return None
+        return await caching.PHOTOS.aget_or_set((location_name,), load)
 
 
 class FetchPlan(APIView):
@@ -404,62 +847,79 @@ class FetchPlan(APIView):
 
     Parameters:
     - trip_id: ID of the trip
+    - day (optional): Only return this day of the plan, read from the
+      database without loading the rest of it
+    - raw (optional): true or 1 to return {"generated_plan": <plan>} with
+      the plan as a JSON value instead of a JSON-encoded string. Its stored
+      text is spliced into the body as is, without being parsed or
+      re-encoded.
 
     Returns:
     - Response: Serialized generated plan as JSON or an error message
     """
 
+    def get(self, request):
+        return self.post(request)
+
     def post(self, request):
         try:
-            trip_id = request.data.get("trip_id")
+            params = request.query_params if request.method == "GET" else request.data
+            trip_id = params.get("trip_id")
+            day = params.get("day")
+            raw = parse_flag(params.get("raw"))
+            if raw is None:
+                return Response(
+                    {"error": "raw must be true, false, 1 or 0"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            trip_details = UserTripInfo.objects.filter(
-                trip_id=trip_id
-            ).first()  # Assuming trip_id is unique
+            if day is not None:
+                with timing.span("db.fetch"), replicas.reads(trip_id=trip_id):
+                    found = UserTripInfo.objects.filter(trip_id=trip_id).plan_day(day)
+                if found is None:
+                    return Response(
+                        {"error": "Trip or day not found"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                stops, plan_version = found
+                etag = conditional.plan_etag(trip_id, plan_version, "day", day)
+                if conditional.is_fresh(request, etag):
+                    return conditional.not_modified(etag)
+                return conditional.with_etag(
+                    Response({"day": day, "stops": stops}, status=status.HTTP_200_OK),
+                    etag,
+                )
 
-            if not trip_details:
+            # Served from the plan cache, already serialized
+            cached = plan_cache.get_plan(trip_id)
+
+            if not cached:
                 return Response(
                     {"error": "Trip details not found"},
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-            serializer = GeneratedPlanSerializer(trip_details)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except Exception as e:
-            return Response(
-                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            etag = conditional.plan_etag(
+                trip_id, cached["plan_version"], *(["raw"] if raw else [])
             )
-
-
-class UpdateUserTripProgress(APIView):
-    """
-    API view to update the progress of a user's trip.
-
-    Handles the POST request to update the progress of a user's trip.
-
-    Parameters:
-    - trip_id: ID of the trip
-    - user_id: ID of the user
-    - day: Day of the trip being updated
-
-    Returns:
-    - Response: Confirmation of the update or an error message
-    """
-
-    def post(self, request):
-        try:
-            trip_id = request.data.get("trip_id")
-            user_id = request.data.get("user_id")
-            day = request.data.get("day")
-
-            UserTripProgressInfo.objects.create(
-                user_id=user_id, trip_id=trip_id, day=day
+            if conditional.is_fresh(request, etag):
+                return conditional.not_modified(etag)
+            if raw:
+                return conditional.with_etag(
+                    HttpResponse(
+                        b'{"generated_plan":' + cached["plan_json"].encode() + b"}",
+                        content_type="application/json",
+                    ),
+                    etag,
+                )
+            return conditional.with_etag(
+                Response(
+                    {"generated_plan": plan_cache.generated_plan(cached)},
+                    status=status.HTTP_200_OK,
+                ),
+                etag,
             )
 
-            response = {"user_id": user_id, "trip_id": trip_id, "day": day}
-
-            return Response(response, status=status.HTTP_201_CREATED)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -476,21 +936,45 @@ class UpdateUserTripProgress(APIView):
     - user_id: ID of the user
     - day: Day of the trip being updated
 
+    The update is appended to the UserTripProgressInfo history and upserted
+    into the trip's TripProgress in the same transaction.
+
     Returns:
-    - Response: Confirmation of the update or an error message
+    - Response: Confirmation of the update, 400 if trip_id is not a UUID, 404
+      if the trip does not exist, or an error message
     """
 
     def post(self, request):
         try:
-            trip_id = request.data.get("trip_id")
             user_id = request.data.get("user_id")
             day = request.data.get("day")
+            try:
+                trip_id = uuid.UUID(str(request.data.get("trip_id")))
+            except ValueError:
+                return Response(
+                    {"error": "trip_id must be a UUID."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if not UserTripInfo.objects.filter(trip_id=trip_id).exists():
+                return Response(
+                    {"error": "Trip not found."}, status=status.HTTP_404_NOT_FOUND
+                )
 
-            UserTripProgressInfo.objects.create(
-                user_id=user_id, trip_id=trip_id, day=day
-            )
+            with transaction.atomic():
+                UserTripProgressInfo.objects.create(
+                    user_id=user_id, trip_id=str(trip_id), trip_info_id=trip_id, day=day
+                )
+                if day is not None:
+                    progress, _ = TripProgress.objects.select_for_update().get_or_create(
+                        trip_info_id=trip_id, user_id=user_id
+                    )
+                    if int(day) not in progress.completed_days:
+                        progress.completed_days.append(int(day))
+                    progress.last_completed_day = int(day)
+                    progress.save()
+                replicas.mark_written(user_id=user_id, trip_id=trip_id)
 
-            response = {"user_id": user_id, "trip_id": trip_id, "day": day}
+            response = {"user_id": user_id, "trip_id": str(trip_id), "day": day}
 
             return Response(response, status=status.HTTP_201_CREATED)
         except Exception as e:
@@ -506,17 +990,31 @@ class FetchUserTripProgress(APIView):
 
     Parameters:
     - trip_id: ID of the trip
+    - user_id (optional): ID of the user
 
     Returns:
-    - Response: Serialized trip progress as JSON or an error message
+    - Response: The days completed by the user, or by any user of the trip
+      without user_id, as [{"day": ...}] in the order they were completed,
+      or an error message
     """
 
     def post(self, request):
         try:
             trip_id = request.data.get("trip_id")
-            trip_details = UserTripProgressInfo.objects.filter(trip_id=trip_id)
-            serializer = UserTripProgressSerializer(trip_details, many=True)
-            serialized_data = serializer.data
+            user_id = request.data.get("user_id")
+
+            # One row per (trip, user), found through its unique index
+            progress = TripProgress.objects.filter(trip_info_id=trip_id)
+            if user_id:
+                progress = progress.filter(user_id=user_id)
+            with replicas.reads(user_id=user_id, trip_id=trip_id):
+                rows = list(
+                    progress.order_by("id").values_list("completed_days", flat=True)
+                )
+
+            # Each day once, even when several users completed it
+            completed_days = dict.fromkeys(day for days in rows for day in days)
+            serialized_data = [{"day": day} for day in completed_days]
 
             # Return the serialized data as JSON response
             return Response(serialized_data, status=status.HTTP_200_OK)
@@ -526,7 +1024,7 @@ class FetchUserTripProgress(APIView):
             )
 
 
-class GeminiSuggestions(APIView):
+class GeminiSuggestions(AsyncAPIView):
     """
     API view to generate suggestions using Gemini based on user input.
 
@@ -568,20 +1066,17 @@ class GeminiSuggestions(APIView):
                     )
         return lat_long_values
 
-    def fetch_nearby_preferences(self, lat_long_values, preferences):
+    async def fetch_nearby_preferences(self, lat_long_values, preferences):
         preferences = preferences.strip()
 
         api_key = os.environ.get("GOOGLE_PLACES")
         radius = 1500
         results = {}
 
-        for place in lat_long_values:
-            day_index = place["day_index"]
-            place_name = place["place_name"]
-            lat_long = place["lat_long"]
+        async def fetch(client, lat_long):
             lat, lng = lat_long.split(",")
 
-            url = "https://places.googleapis.com/v1/places:searchNearby"
+            url = f"{settings.GOOGLE_PLACES_NEW_URL}/v1/places:searchNearby"
             headers = {
                 "X-Goog-Api-Key": api_key,
                 "X-Goog-FieldMask": "places.displayName,places.formattedAddress,places.types,places.websiteUri,places.priceLevel,places.location",
@@ -599,10 +1094,22 @@ class GeminiSuggestions(APIView):
                 },
             }
 
-            response = requests.post(url, headers=headers, json=payload)
+            return await cached_places_request(
+                ("searchNearby", lat.strip(), lng.strip(), radius, preferences),
+                lambda: client.post(url, headers=headers, json=payload),
+            )
 
-            if response.status_code == 200:
-                data = response.json()  # Parse response content as JSON
+        with timing.span("places.nearby"):
+            async with httpx.AsyncClient(timeout=PLACES_TIMEOUT) as client:
+                responses = await asyncio.gather(
+                    *(fetch(client, place["lat_long"]) for place in lat_long_values)
+                )
+
+        for place, (status_code, data) in zip(lat_long_values, responses):
+            day_index = place["day_index"]
+            place_name = place["place_name"]
+
+            if status_code == 200:
                 places = data.get("places", [])
                 place_details = [
                     {
@@ -620,18 +1127,29 @@ class GeminiSuggestions(APIView):
                     results[day_index] = {}
                 results[day_index][place_name] = place_details
             else:
-                print(f"Error: {response.status_code}, {response.text}")
+                print(f"Error: {status_code}")
 
         return results
 
-    def post(self, request):
+    async def post(self, request):
         try:
-            genai.configure(api_key=os.environ["GOOGLE_SUGGESTION_API_KEY"])
+            api_key = os.environ["GOOGLE_SUGGESTION_API_KEY"]
             trip_id = request.data.get("trip_id")
             current_day = request.data.get("current_day")
             original_plan = request.data.get("original_plan")
             user_changes = request.data.get("user_changes")
             budget = request.data.get("budget")
+
+            # Only the trip's existence is checked; its row is never loaded
+            with timing.span("db.fetch"):
+                trip_exists = await UserTripInfo.objects.filter(
+                    trip_id=trip_id
+                ).aexists()
+            if not trip_exists:
+                return Response(
+                    {"error": "Trip not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+
             # Budget mapping
             if budget == 1:
                 user_budget = "Places with price_index: PRICE_LEVEL_FREE or PRICE_LEVEL_INEXPENSIVE is recommended."
@@ -649,7 +1167,11 @@ class GeminiSuggestions(APIView):
                 "response_mime_type": "text/plain",
             }
 
-            places_type_extractor = genai.GenerativeModel(
+            places_type_extractor = generative_model(
+                api_key,
+                endpoint="gemini-suggestions",
+                operation="place_types",
+                cached=True,
                 model_name="gemini-1.5-flash",
                 generation_config=generation_config_places_type_extractor,
                 # safety_settings = Adjust safety settings
@@ -657,14 +1179,14 @@ class GeminiSuggestions(APIView):
                 system_instruction="You are an intelligent intent extractor. You will receive a change request from user. You have to extract the intent in the user's query and output the types mentioned below which are based on it. Basically your job is to output the type which belongs to the user's query so that that particular place could be fetched from the google maps places API.\n\nPLACES API TYPES\nchurch\nhindu_temple\nmosque\nsynagogue\nart_gallery\nmuseum\nshopping_mall\nperforming_arts_theater\namusement_center\namusement_park\nstadium\nlibrary\naquarium\nbanquet_hall\nbowling_alley\ncasino\ncommunity_center\nconvention_center\ncultural_center\ndog_park\nevent_venue\nhiking_area\nhistorical_landmark\nmarina\nmovie_rental\nmovie_theater\nnational_park\nnight_club\npark\ntourist_attraction\nvisitor_center\nwedding_venue\nzoo\namerican_restaurant\nbakery\nbar\nbarbecue_restaurant\nbrazilian_restaurant\nbreakfast_restaurant\nbrunch_restaurant\ncafe\nchinese_restaurant\ncoffee_shop\nfast_food_restaurant\nfrench_restaurant\ngreek_restaurant\nhamburger_restaurant\nice_cream_shop\nindian_restaurant\nindonesian_restaurant\nitalian_restaurant\njapanese_restaurant\nkorean_restaurant\tlebanese_restaurant\nmeal_delivery\nmeal_takeaway\nmediterranean_restaurant\nmexican_restaurant\nmiddle_eastern_restaurant\npizza_restaurant\nramen_restaurant\nrestaurant\nsandwich_shop\nseafood_restaurant\nspanish_restaurant\nsteak_house\nsushi_restaurant\nthai_restaurant\nturkish_restaurant\nvegan_restaurant\nvegetarian_restaurant\nvietnamese_restaurant\n\n\n### EXAMPLES ###\nUser: Can you add any indian resto in the trip?\nModel: italian_restaurant\n\nUser: Can you add cafe and bars to the trip?\nModel: cafe, bar\n\nUser: I want to eat some desserts could you please add in a place for eating desserts in the itinerary?\nModel: bakery\n",
             )
 
-            places_type_extractor_response = places_type_extractor.generate_content(
-                user_changes
+            places_type_extractor_response = (
+                await places_type_extractor.generate_content_async(user_changes)
             )
             places_types = places_type_extractor_response.text
-            trip_info = get_object_or_404(UserTripInfo, trip_id=trip_id)
-            serializer = UserTripInfoSerializer(trip_info)
             lat_long_values = self.extract_lat_long(original_plan)
-            nearby_places = self.fetch_nearby_preferences(lat_long_values, places_types)
+            nearby_places = await self.fetch_nearby_preferences(
+                lat_long_values, places_types
+            )
 
             generation_config = {
                 "temperature": 0.5,
@@ -674,7 +1196,10 @@ class GeminiSuggestions(APIView):
                 "response_mime_type": "application/json",
             }
 
-            model_2 = genai.GenerativeModel(
+            model_2 = generative_model(
+                api_key,
+                endpoint="gemini-suggestions",
+                operation="suggestions",
                 model_name="gemini-1.5-pro",
                 generation_config=generation_config,
                 # safety_settings = Adjust safety settings
@@ -1083,8 +1608,22 @@ In the above JSON you forgort to enclose the  'A magnificent Mughal-era mausoleu
 
             concatenated_input = f"Original Details: {original_plan}\nCurrent day: {current_day}\Changes/Problems the user is currently facing with the original plan: {user_changes}\n"
 
-            response = chat_session.send_message(concatenated_input)
-            response_data = response.text
+            response = await chat_session.send_message_async(concatenated_input)
+            for attempt in range(LLM_OUTPUT_RETRIES + 1):
+                try:
+                    suggestions = llm_output.parse(
+                        response.text, llm_output.SUGGESTIONS
+                    )
+                    break
+                except LLMOutputError as e:
+                    if attempt == LLM_OUTPUT_RETRIES:
+                        raise
+                    record_retry(model_2)
+                    # Ask for a corrected reply within the same chat
+                    response = await chat_session.send_message_async(
+                        f"Your previous reply was invalid ({e}). Reply again with only the corrected JSON."
+                    )
+            response_data = fastjson.dumps(suggestions)
 
             response = {
                 "user_changes": user_changes,
@@ -1093,6 +1632,8 @@ In the above JSON you forgort to enclose the  'A magnificent Mughal-era mausoleu
             }
 
             return Response(response, status=status.HTTP_201_CREATED)
+        except LLMOutputError as e:
+            return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -1107,6 +1648,9 @@ class UpdateTrip(APIView):
     Parameters:
     - trip_id: ID of the trip
     - new_plan: New itinerary plan
+    - day, stops (optional): Instead of new_plan, replace only this day of
+      the plan with stops. The day is the plan's key, or its index when the
+      plan is stored as a list. The update is done in place in the database.
 
     Returns:
     - Response: Confirmation of the update or an error message
@@ -1117,10 +1661,13 @@ class UpdateTrip(APIView):
             trip_id = request.data.get("trip_id")
             new_plan = request.data.get("new_plan")
 
-            restructured_plan_str = json.dumps(new_plan)
+            if request.data.get("day") is not None:
+                return self.update_day(
+                    trip_id, request.data.get("day"), request.data.get("stops")
+                )
 
-            # Fetch the trip details using the trip_id
-            trip_details = UserTripInfo.objects.filter(trip_id=trip_id).first()
+            # Fetch the trip details using the trip_id; the old plan is not needed
+            trip_details = UserTripInfo.objects.filter(trip_id=trip_id).metadata().first()
 
             if not trip_details:
                 return Response(
@@ -1129,8 +1676,15 @@ class UpdateTrip(APIView):
                 )
 
             # Update the generated_plan with the new_plan
-            trip_details.generated_plan = restructured_plan_str
-            trip_details.save()
+            with transaction.atomic():
+                trip_details.generated_plan = new_plan
+                trip_details.plan_version = F("plan_version") + 1
+                trip_details.save(update_fields=["generated_plan", "plan_version"])
+                itinerary.sync_plan(trip_details.trip_id, new_plan)
+                plan_cache.invalidate(trip_details.trip_id)
+                replicas.mark_written(
+                    user_id=trip_details.user_id, trip_id=trip_details.trip_id
+                )
 
             return Response(
                 {"message": "Trip details updated successfully"},
@@ -1142,6 +1696,32 @@ class UpdateTrip(APIView):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def update_day(self, trip_id, day, stops):
+        if not isinstance(stops, list):
+            return Response(
+                {"error": "stops must be a list"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            updated = UserTripInfo.objects.filter(trip_id=trip_id).set_plan_day(day, stops)
+            if not updated:
+                return Response(
+                    {"error": "Trip or day not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            itinerary.sync_plan_day(trip_id, day, stops)
+            plan_cache.invalidate(trip_id)
+            replicas.mark_written(
+                user_id=UserTripInfo.objects.filter(trip_id=trip_id)
+                .values_list("user_id", flat=True)
+                .first(),
+                trip_id=trip_id,
+            )
+
+        return Response(
+            {"message": "Trip details updated successfully"},
+            status=status.HTTP_200_OK,
+        )
+
 
 class AddFinanceLog(APIView):
     """
@@ -1155,6 +1735,9 @@ class AddFinanceLog(APIView):
     - amount: Amount of the financial entry
     - description: Description of the financial entry
     - trip_place: Place where the user visited
+
+    The entry is added to its FinanceRollup in the same transaction.
+
     Returns:
     - Response: Serialized financial log entry data or an error message
     """
@@ -1163,9 +1746,9 @@ class AddFinanceLog(APIView):
         data = request.data
         trip_id = data.get("trip_id")
 
-        # Fetch stay_details from UserTripInfo
+        # Fetch stay_details from UserTripInfo, without the plan columns
         try:
-            trip_info = UserTripInfo.objects.get(trip_id=trip_id)
+            trip_info = UserTripInfo.objects.metadata().get(trip_id=trip_id)
             stay_details = trip_info.stay_details
         except UserTripInfo.DoesNotExist:
             return Response(
@@ -1177,12 +1760,229 @@ class AddFinanceLog(APIView):
 
         serializer = FinanceLogSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                log = serializer.save(trip_info=trip_info)
+                finance.record_expenses([log])
+                replicas.mark_written(user_id=log.user_id, trip_id=trip_id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class GenerateMessageView(APIView):
+class AddFinanceLogs(APIView):
+    """
+    API view to add a batch of financial log entries, such as expenses
+    recorded offline and synced later.
+
+    Handles the POST request to add the entries. Every entry is validated,
+    the trip locations of the whole batch are read with one query, and the
+    valid entries are inserted with a single bulk_create and added to their
+    FinanceRollup rows in one transaction.
+
+    Parameters:
+    - entries: List of entries, each with the fields of add-finance-log. The
+      body may also be the list itself.
+    - user_id (optional): Default user_id of the entries
+    - trip_id (optional): Default trip_id of the entries
+
+    Returns:
+    - Response: {"created": <count>, "results": [...]} with, for each entry in
+      order, its index, its status and either the saved entry as "data" or
+      its "errors". The status is 201 when every entry was added and 207
+      otherwise.
+    """
+
+    MAX_ENTRIES = 500
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        entries = data.get("entries", request.data)
+        if not isinstance(entries, list) or not entries:
+            return Response(
+                {"error": "entries must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(entries) > self.MAX_ENTRIES:
+            return Response(
+                {"error": f"At most {self.MAX_ENTRIES} entries per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        defaults = {
+            field: data[field] for field in ("user_id", "trip_id") if field in data
+        }
+        results = [None] * len(entries)
+        valid = []
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                results[index] = {
+                    "index": index,
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": {"non_field_errors": ["Expected an object."]},
+                }
+                continue
+            serializer = FinanceLogSerializer(data={**defaults, **entry})
+            if not serializer.is_valid():
+                results[index] = {
+                    "index": index,
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": serializer.errors,
+                }
+                continue
+            try:
+                trip_id = uuid.UUID(str(serializer.validated_data["trip_id"]))
+            except ValueError:
+                trip_id = None
+            valid.append((index, trip_id, serializer.validated_data))
+
+        # stay_details of every trip in the batch, in one narrow query
+        with timing.span("db.fetch"):
+            locations = UserTripInfo.objects.filter(
+                trip_id__in={trip_id for _, trip_id, _ in valid if trip_id}
+            ).stay_details()
+
+        pending = []
+        for index, trip_id, data in valid:
+            if trip_id not in locations:
+                results[index] = {
+                    "index": index,
+                    "status": status.HTTP_404_NOT_FOUND,
+                    "errors": {"trip_id": ["Trip not found."]},
+                }
+                continue
+            log = FinanceLog(
+                **{**data, "trip_location": locations[trip_id]}, trip_info_id=trip_id
+            )
+            pending.append((index, log))
+
+        if pending:
+            with timing.span("db.insert"), transaction.atomic():
+                logs = FinanceLog.objects.bulk_create(log for _, log in pending)
+                finance.record_expenses(logs)
+                written = {(log.user_id, log.trip_info_id) for log in logs}
+                for user_id, trip_id in written:
+                    replicas.mark_written(user_id=user_id, trip_id=trip_id)
+            saved = FastFinanceLogSerializer(logs).data
+            for (index, _), data in zip(pending, saved):
+                results[index] = {
+                    "index": index,
+                    "status": status.HTTP_201_CREATED,
+                    "data": data,
+                }
+
+        return Response(
+            {"created": len(pending), "results": results},
+            status=(
+                status.HTTP_201_CREATED
+                if len(pending) == len(entries)
+                else status.HTTP_207_MULTI_STATUS
+            ),
+        )
+
+
+class FetchFinanceSummary(APIView):
+    """
+    API view to fetch the totals and breakdowns of a user's expenses.
+
+    Handles the GET and POST requests to fetch the summary, read from the
+    FinanceRollup rows instead of every FinanceLog entry.
+
+    Parameters:
+    - user_id: ID of the user
+    - trip_id (optional): Only summarize this trip
+
+    Returns:
+    - Response: total_amount, entry_count, by_day, by_category and the
+      (trip, day, category) breakdown, or an error message
+    """
+
+    def get(self, request):
+        return self.post(request)
+
+    def post(self, request):
+        try:
+            params = request.query_params if request.method == "GET" else request.data
+            user_id = params.get("user_id")
+            trip_id = params.get("trip_id") or None
+
+            if not user_id:
+                return Response(
+                    {"error": "user_id is required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            with timing.span("db.fetch"), replicas.reads(
+                user_id=user_id, trip_id=trip_id
+            ):
+                summary = finance.summary(user_id, trip_id)
+            return Response(summary, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ExportData(APIView):
+    """
+    API view to download every trip or expense of a user, for account
+    exports.
+
+    Handles the GET request for the export named by the view's export
+    attribute (see exports.EXPORTS). The rows are streamed as they are read,
+    a chunk at a time, so the response never holds the whole table; under
+    ASGI through an async iterator, which Django does not buffer.
+
+    Parameters:
+    - user_id: ID of the user
+    - output (optional): "ndjson" (default) or "csv"
+
+    Returns:
+    - StreamingHttpResponse: One JSON object per line, or CSV with a header
+      line, with the same fields as the API's responses
+    """
+
+    export = None
+
+    def get(self, request):
+        try:
+            user_id = request.query_params.get("user_id")
+            output = request.query_params.get("output", "ndjson")
+            if not user_id:
+                return Response(
+                    {"error": "user_id is required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if output not in exports.FORMATS:
+                return Response(
+                    {"error": f"output must be one of {', '.join(exports.FORMATS)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            with replicas.reads(user_id=user_id):
+                # The rows are read after the view returns, so the database
+                # is chosen now
+                rows = exports.queryset(self.export, user_id=user_id)
+                rows = rows.using(rows.db)
+
+            stream = (
+                exports.astream
+                if isinstance(request._request, ASGIRequest)
+                else exports.stream
+            )
+            response = StreamingHttpResponse(
+                stream(self.export, output, rows),
+                content_type=exports.CONTENT_TYPES[output],
+            )
+            response["Content-Disposition"] = (
+                f'attachment; filename="{self.export}.{output}"'
+            )
+            return response
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class GenerateMessageView(AsyncAPIView):
     """
     API view to handle message generation using Gemini AI and Supabase.
 
@@ -1201,16 +2001,15 @@ class GenerateMessageView(APIView):
         key = os.environ.get("SUPABASE_KEY")
         return create_client(url, key)
 
-    def post(self, request):
+    async def post(self, request):
         user_id = request.data.get("user_id")
         message = request.data.get("message")
         print("Empty",message)
         chat_history = request.data.get("chat_history")
-        chat_history = json.loads(chat_history)
+        chat_history = fastjson.loads(chat_history)
         if (len(chat_history)) != 0:
             chat_history = chat_history["contents"]
-        # Configure the genai API
-        genai.configure(api_key=os.environ["GOOGLE_FINANCE_API_KEY"])
+        api_key = os.environ["GOOGLE_FINANCE_API_KEY"]
 
         generation_config = {
             "temperature": 0,
@@ -1220,7 +2019,10 @@ class GenerateMessageView(APIView):
         }
 
         # Generate AI response using Gemini
-        intent_classifier = genai.GenerativeModel(
+        intent_classifier = generative_model(
+            api_key,
+            endpoint="generate-message",
+            operation="intent",
             model_name="gemini-1.5-flash",
             generation_config=generation_config,
             system_instruction='You are an intent classifier, you need to classify and divide in the user\'s questions in two different parts. The user questions will contain the information regarding the information the user wants to extract from the SQL database and the chart or visual the user wants to see that data. You also need to classify whether the questions asked is a follow-up questions based on the chat history given below. If there is no visual_type specified leave the field as blank.\n\n\n### OUTPUT ###\nYour output should be a JSON containing two entities namely,\n{\n"information_needed": " ",\n"visual_type": " "\n}\n\n### For example ###\nUser: Show me the day wise breakdown of my spendings in line chart\nModel: \n{\n"information_needed": "Show me the day wise breakdown of my spendings"\n"visual_type": "line chart"\n}\n\nUser: Show me the day wise breakdown of my spendings.\nModel: \n{\n"information_needed": "Show me the day wise breakdown of my spendings"\n"visual_type": ""\n}\n',
@@ -1228,52 +2030,46 @@ class GenerateMessageView(APIView):
         intent_classifer_chat_session = intent_classifier.start_chat(
             history=chat_history
         )
-        response = intent_classifer_chat_session.send_message(message)
-        # Check if the response text contains ```json```
-        if "```json" in response.text:
-            json_response = self.extract_json_data(response.text)
-        else:
-            json_response = response.text
-
-        if json_response:
-            try:
-                intent_response = json.loads(json_response)
-            except json.JSONDecodeError as e:
-                return Response(
-                    {"error": "Failed to parse JSON response"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        else:
+        response = await intent_classifer_chat_session.send_message_async(message)
+        try:
+            intent_response = llm_output.parse(
+                response.text, llm_output.FINANCE_INTENT
+            )
+        except LLMOutputError as e:
             return Response(
-                {"error": "Empty response from intent classifier"},
+                {"error": "Failed to parse JSON response", "details": e.errors},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        information_needed = intent_response.get("information_needed")
-        visual_type = intent_response.get("visual_type")
+        information_needed = intent_response["information_needed"]
+        visual_type = intent_response.get("visual_type", "")
 
         # Generate visual response using Gemini
-        model = genai.GenerativeModel(
+        model = generative_model(
+            api_key,
+            endpoint="generate-message",
+            operation="visual_type",
             model_name="gemini-1.5-flash",
             generation_config=generation_config,
             system_instruction="You are an intelligent data analyst. You have to extract the information from the user's question and identify if there a need of creating a visual if needed you need to output the ID of the visual that would be best suited else just output 0. The output should be the corresponding Id belonging to the chart. Your output should only be the ID and nothing else.\n\n ###When will you create a visual?\n\n You will only create a visual if there is a comparison between more than 1 fields.\nList of charts:\n1. Area Chart = 1\n2. Bar Chart = 2\n5. Line Chart = 3\n9. Pie Charts = 4\n\nFor example:\nUser: I want to see the distribution of cost based on categories.\nModel: 3\n User: Where did I spent the most in Goa?\nModel:0\n User: Give me a detailed breakdown of my spendings in Goa\n Model: 1",
         )
-        if visual_type == "":
-            visual_response_type = model.generate_content(information_needed)
-        else:
-            visual_response_type = model.generate_content(visual_type)
-
-        visual_response = visual_response_type.text
         # Placeholder SQL query (update as needed)
         sql_response = f"""SELECT trip_location,place,category,day,amount FROM "frugalooAPI_financelog" WHERE user_id = '{user_id}'
         """
 
-        # Query Supabase with the SQL response
-        query_result = self.execute_sql_query(sql_response)
+        # The visual classification and the Supabase query are independent
+        visual_response_type, query_result = await asyncio.gather(
+            model.generate_content_async(
+                information_needed if visual_type == "" else visual_type
+            ),
+            sync_to_async(self.execute_sql_query)(sql_response),
+        )
+
+        visual_response = visual_response_type.text
         print(query_result)
         # Log the message and response asynchronously
-        self.log_message_sync(user_id, message, sql_response)
-        genai.configure(api_key=os.environ["GOOGLE_FINANCE_INSIGHTS_API_KEY"])
+        with timing.span("db.insert"):
+            await sync_to_async(self.log_message_sync)(user_id, message, sql_response)
 
         # Generate insights using Gemini
         insights_model_generation_config = {
@@ -1284,7 +2080,10 @@ class GenerateMessageView(APIView):
             "response_mime_type": "text/plain",
         }
 
-        insights_model = genai.GenerativeModel(
+        insights_model = generative_model(
+            os.environ["GOOGLE_FINANCE_INSIGHTS_API_KEY"],
+            endpoint="generate-message",
+            operation="insights",
             model_name="gemini-1.5-pro",
             generation_config=insights_model_generation_config,
             # safety_settings = Adjust safety settings
@@ -1335,24 +2134,20 @@ class GenerateMessageView(APIView):
             + information_needed
         )
         insights_model_session = insights_model.start_chat(history=chat_history)
-        insights_model_response = insights_model_session.send_message(
-            finance_input_formulation
+        insights_model_response = (
+            await insights_model_session.send_message_async(finance_input_formulation)
         ).text
 
-        # Clean the insights model response
-        insights_model_response_cleaned = self.extract_json_data(
-            insights_model_response
-        )
-        # Parse the cleaned JSON response
         try:
-            response_json = json.loads(insights_model_response_cleaned)
-            insights = response_json.get("insights", "")
+            response_json = llm_output.parse(
+                insights_model_response, llm_output.FINANCE_INSIGHTS
+            )
+            insights = response_json["insights"]
             extracted_data = response_json.get("extracted_data", "")
-        except json.JSONDecodeError as e:
+        except LLMOutputError:
             insights = ""
             extracted_data = ""
         react_visual_component = ""
-        genai.configure(api_key=os.environ["GOOGLE_FINANCE_REACT_API_KEY"])
 
         if visual_response.strip() != "0":
 
@@ -1364,7 +2159,10 @@ class GenerateMessageView(APIView):
                 "max_output_tokens": 8192,
             }
 
-            model3 = genai.GenerativeModel(
+            model3 = generative_model(
+                os.environ["GOOGLE_FINANCE_REACT_API_KEY"],
+                endpoint="generate-message",
+                operation="react_component",
                 model_name="gemini-1.5-pro",
                 generation_config=generation_config_model3,
                 system_instruction="You are a ReactJS Expert, you need to create a static component with proper labeling based on the data received from the JSON input and the user question given to you by the user.\nYour output should **ONLY** be the static react component. \n\n### DATA INFORMATION ###\n1. Categories are divided into three main types: Shopping, Restaurant and Others\n2. Amount contains the information regarding the spendings of the user.\n3. day contains the information regarding the day on which the user spent the amount in his entire trip.\n4. place contains the information regarding the place where the user spent the amount.\n5. trip_location contains the information about different places the user went. \n\n\n\n### COMPONENT ID MAPPING ###\nList of charts:\n1. Area Chart = 1\n2. Bar Chart = 2\n3. Line Chart = 3\n4. Pie Charts = 4\n\n\nRemember you might need to dynamically change the below components based on the data used to.\n\n### AREA CHART REACT COMPONENT ###\nlabels: data.map((item) => truncateLabel(`<Based on the input JSON>`)),\n    datasets: [\n      {\n        label:  <Based on the input JSON>,\n        data: data.map((item) => item.<Based on the input JSON>),\n        fill: true,\n        backgroundColor: \"rgba(75, 192, 192, 0.2)\",\n        borderColor: \"rgba(75, 192, 192, 1)\",\n        tension: 0.1,\n      },\n    ],\n\n### BAR CHART REACT COMPONENT ###\nlabels: data.map((item) =>  truncateLabel(`<Based on the input JSON>`)),\n    datasets: [\n        {\n        label: `<Based on the input JSON>`,\n        data: data.map((item) => item.<Based on the input JSON>),\n        backgroundColor: 'rgba(75, 192, 192, 0.2)',\n        borderColor: 'rgba(75, 192, 192, 1)',\n        borderWidth: 1,\n        },\n    ],\n\n### LINE CHART REACT COMPONENT ###\n\n    labels: data.map((item) =>  truncateLabel(`<Based on the input JSON>`)),\n    datasets: [\n      {\n        label: <Based on the input JSON>,\n        data: data.map((item) => item.<Based on the input JSON>),\n        borderColor: \"rgba(75, 192, 192, 1)\",\n        backgroundColor: \"rgba(75, 192, 192, 0.2)\",\n        borderWidth: 1,\n        tension: 0.4,\n      },\n    ],\n\n\n### PIE CHART REACT COMPONENT ###\n\nlabels:  truncateLabel(`<Based on the input JSON>`)),\ndatasets: [\n    {\n    label: <Based on the input JSON>,\n    data: data.map((item) => item.<Based on the input JSON>),\n    backgroundColor: [\n        'rgba(255, 99, 132, 0.2)',\n        'rgba(54, 162, 235, 0.2)',\n        'rgba(255, 206, 86, 0.2)',\n        'rgba(75, 192, 192, 0.2)',\n        'rgba(153, 102, 255, 0.2)',\n        'rgba(255, 159, 64, 0.2)',\n    ],\n    borderColor: [\n        'rgba(255, 99, 132, 1)',\n        'rgba(54, 162, 235, 1)',\n        'rgba(255, 206, 86, 1)',\n        'rgba(75, 192, 192, 1)',\n        'rgba(153, 102, 255, 1)',\n        'rgba(255, 159, 64, 1)',\n    ],\n    borderWidth: 1,\n    },\n],\n\nYou will receive a JSON object in the below structure with the component ID.\n\n[{'id': 24, 'user_id': 'da034663-9c37-4c0f-8f86-7f63c2ed9471', 'trip_id': '3243a3d8-2622-4115-8312-74ca252ec97f', 'amount': 5000, 'place': 'Joss Chinoise Jaan Joss Banquets', 'category': 'Restaurant', 'day': 1}, {'id': 25, 'user_id': 'da034663-9c37-4c0f-8f86-7f63c2ed9471', 'trip_id': '3243a3d8-2622-4115-8312-74ca252ec97f', 'amount': 100, 'place': 'Chhatrapati Shivaji Maharaj Vastu Sangrahalaya', 'category': 'Others', 'day': 1}, {'id': 26, 'user_id': 'da034663-9c37-4c0f-8f86-7f63c2ed9471', 'trip_id': '3243a3d8-2622-4115-8312-74ca252ec97f', 'amount': 15000, 'place': 'Juhu Beach', 'category': 'Restaurant', 'day': 2}, {'id': 27, 'user_id': 'da034663-9c37-4c0f-8f86-7f63c2ed9471', 'trip_id': '3243a3d8-2622-4115-8312-74ca252ec97f', 'amount': 5000, 'place': 'Elephanta Caves', 'category': 'Shopping', 'day': 2}, {'id': 28, 'user_id': 'da034663-9c37-4c0f-8f86-7f63c2ed9471', 'trip_id': '3243a3d8-2622-4115-8312-74ca252ec97f', 'amount': 100, 'place': 'Sanjay Gandhi National Park', 'category': 'Restaurant', 'day': 3}, {'id': 29, 'user_id': 'da034663-9c37-4c0f-8f86-7f63c2ed9471', 'trip_id': '3243a3d8-2622-4115-8312-74ca252ec97f', 'amount': 1005, 'place': 'Midtown Restaurant Family Wine & Dine', 'category': 'Restaurant', 'day': 3}]\n\nComponent Id = 3\n\nYou need to identify the way the data is been named. And then generate the static react component with the appropriate labels and datasets mapping based on the component Id.\n\nFor the above JSON your static react component should be like:\n\nlabels: data.map((item) =>truncateLabel(`${item.category}`)),\n    datasets: [\n      {\n        label: \"Category wise Spending\",\n        data: data.map((item) => item.amount),\n        borderColor: \"rgba(75, 192, 192, 1)\",\n        backgroundColor: \"rgba(75, 192, 192, 0.2)\",\n        borderWidth: 1,\n        tension: 0.4,\n      },\n    ],",
@@ -1376,7 +2174,9 @@ class GenerateMessageView(APIView):
                 + "\nUser_question:"
                 + information_needed
             )
-            react_visual_response = model3.generate_content(model3_input_formulation)
+            react_visual_response = await model3.generate_content_async(
+                model3_input_formulation
+            )
             react_visual_raw = react_visual_response.text
             react_visual_component = self.extract_chart_data(react_visual_raw)
 
@@ -1391,25 +2191,6 @@ class GenerateMessageView(APIView):
 
         return Response(response_data, status=status.HTTP_200_OK)
 
-    def extract_json_data(self, json_component_raw: str) -> str:
-        """
-        Extract JSON data from the raw response text.
-
-        Args:
-        - json_component_raw: Raw response text containing JSON data
-
-        Returns:
-        - str: Extracted JSON data as a string
-        """
-        pattern = r"```json\n(.*?)\n```"
-        match = re.search(pattern, json_component_raw, re.DOTALL)
-
-        if match:
-            extracted_data = match.group(1)
-            return extracted_data.strip()
-
-        return json_component_raw.strip()
-
     def extract_chart_data(self, react_component_raw: str) -> str:
         """
         Extract chart data from the raw response text.
@@ -1456,7 +2237,8 @@ class GenerateMessageView(APIView):
         """
         try:
             # Execute the RPC function
-            result = self.supabase.rpc("execute_sql", {"query": sql_query}).execute()
+            with timing.span("supabase.query"):
+                result = self.supabase.rpc("execute_sql", {"query": sql_query}).execute()
 
             # Check if result contains errors or data
             if hasattr(result, "error"):
@@ -1489,3 +2271,17 @@ class GenerateMessageView(APIView):
             user_id=user_id, question=question, sql_query=response_text
         )
         print("Successfully inserted the logs in the MessageLog Database")
+
+
+class MetricsView(APIView):
+    """
+    API view exposing this process's metrics in the Prometheus text format.
+
+    Handles the GET request used by the Prometheus scraper. Each worker process
+    keeps its own counters, so scrape every worker rather than a load balancer.
+    """
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
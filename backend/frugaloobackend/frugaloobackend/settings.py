@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,13 +41,19 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'adrf',
     'frugalooAPI',
     'corsheaders'
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
+# Lets the frontend revalidate plans it already has (see frugalooAPI.conditional)
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag"]
 
 MIDDLEWARE = [
+    'frugalooAPI.timing.ServerTimingMiddleware',
+    'frugalooAPI.conditional.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +66,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'frugaloobackend.urls'
 
+# JSON goes through orjson (frugalooAPI.fastjson), or the json module without it
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'frugalooAPI.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'frugalooAPI.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -80,16 +100,90 @@ WSGI_APPLICATION = 'frugaloobackend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+# Port 6543 is Supabase's transaction-mode pooler, so nothing may rely on
+# session state surviving a transaction: server-side cursors are disabled.
+#
+# With DATABASE_POOL_SIZE set, each worker process keeps a pool of up to that
+# many connections (frugalooAPI.db_pool), returned to it after every request.
+# Otherwise a connection is opened per request, or kept by its thread for
+# DATABASE_CONN_MAX_AGE seconds. Only set that under WSGI: under ASGI every
+# request gets a new thread, whose connection is never reused or closed.
+
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '0'))
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'frugalooAPI.db_pool' if DATABASE_POOL_SIZE
+            else 'django.db.backends.postgresql'
+        ),
         'NAME': "postgres",
         'USER': os.getenv('DATABASE_USER'),
         'PASSWORD':os.getenv('DATABASE_PASSWORD'),
         'HOST': os.getenv('DATABASE_HOST'),
-        'POST':"6543",
+        'PORT': os.getenv('DATABASE_PORT', '6543'),
+        'CONN_MAX_AGE': (
+            0 if DATABASE_POOL_SIZE
+            else int(os.getenv('DATABASE_CONN_MAX_AGE', '0'))
+        ),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DATABASE_CONNECT_TIMEOUT', '10')),
+        },
+        'POOL': {
+            'MAX_SIZE': DATABASE_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DATABASE_POOL_TIMEOUT', '10')),
+        },
+    }
+}
+
+# Read replicas, one alias per host in DATABASE_REPLICA_HOSTS (comma separated).
+# frugalooAPI.replicas sends lag-tolerant reads to them, except for users and
+# trips written in the last REPLICA_STICKY_SECONDS; without any, every read
+# uses the primary.
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.getenv('DATABASE_REPLICA_HOSTS', '').split(',')), start=1
+):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['frugalooAPI.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Cache
+# The shared tier of frugalooAPI.caching. Redis when REDIS_URL is set,
+# otherwise an in-process cache: nothing is shared between workers, cached
+# plans are skipped, and replica stickiness only covers the worker that wrote.
+# Set REDIS_URL in production.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'frugaloo',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
+# Seconds entries of each frugalooAPI.caching namespace stay cached, overriding
+# the defaults in caching.py
+CACHE_TTLS = {
+    'plans': int(os.getenv('PLAN_CACHE_TTL', '300')),
 }
 
 # Password validation
@@ -130,6 +224,33 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Logging
+# Structured per-call logs from the Gemini instrumentation (frugalooAPI.gemini)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'frugalooAPI': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Fraction of successful Gemini calls that are logged; failed calls are always logged
+LLM_LOG_SAMPLE_RATE = float(os.getenv('LLM_LOG_SAMPLE_RATE', '0.1'))
+
+# Upstream base URLs. Point these and SUPABASE_URL at `manage.py replay_server`
+# to run against recorded responses instead of the live services.
+GOOGLE_PLACES_URL = os.getenv('GOOGLE_PLACES_URL', 'https://maps.googleapis.com')
+GOOGLE_PLACES_NEW_URL = os.getenv('GOOGLE_PLACES_NEW_URL', 'https://places.googleapis.com')
+# When set, Gemini is called over REST at this base URL instead of the SDK's gRPC endpoint
+GEMINI_URL = os.getenv('GEMINI_URL')
+
+# Requests slower than this are logged with their Server-Timing stage breakdown
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '5000'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
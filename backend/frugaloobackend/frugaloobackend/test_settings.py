@@ -0,0 +1,29 @@
+"""
+Settings for running the test suite without PostgreSQL, Redis or replicas:
+
+    python manage.py test frugalooAPI --settings=frugaloobackend.test_settings
+
+Tests needing PostgreSQL, such as jsonb_set, are skipped. To run every test,
+point the DATABASE_* variables at a PostgreSQL server and use the default
+settings (python manage.py test frugalooAPI); the test database is created
+next to the configured one.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # The test runner uses an in-memory database for SQLite
+        'NAME': ':memory:',
+    }
+}
+
+# No replica aliases: the router sends every read to default
+DATABASE_REPLICAS = []
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}